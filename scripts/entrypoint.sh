@@ -16,7 +16,7 @@ DEV_FLAGS=(
 start() {
   if [[ "$ENV_STATE" == "production" || "$ENV_STATE" == "staging" ]]; then
     log_message INFO "Starting service in ${GREEN}$ENV_STATE mode${NO_COLOR}..."
-    uvicorn "$BASE_COMMAND" "${BASE_FLAGS[@]}"
+    exec python /scripts/server.py
   else
     log_message WARNING "Starting service in ${YELLOW}development mode${NO_COLOR}..."
     uvicorn "$BASE_COMMAND" "${BASE_FLAGS[@]}" "${DEV_FLAGS[@]}"
@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+"""
+Builds the fingerprint index of the stored images.
+
+Walks `{BASE_DIR}/{user_id}/{session_id}/original` with `os.scandir`, the
+files directories of the sessions are listed in a thread pool, and hashes
+the stored files in a process pool: SHA-256 of the content, dhash and
+pHash of the same reduced-scale decode as on upload (so the dhash matches
+the one in the file name). The fingerprints are appended to a
+`FingerprintStore`: a memory-mappable array of packed records and a path
+table.
+
+The index is checkpointed every `--checkpoint-interval` seconds and on
+interruption. A build is resumed from the last checkpoint (the files
+already indexed are skipped, so a finished index only gets the files
+stored since), `--rebuild` starts it over.
+
+Usage:
+    PYTHONPATH=src python scripts/fingerprints.py --workers 8 --index /mnt/efs/images/.fingerprints
+"""
+
+import argparse
+import hashlib
+import io
+import logging
+import logging.config
+import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+import numpy as np
+from PIL import Image
+
+from core.config.executor import executor_settings
+from core.config.image import image_settings
+from core.config.log import LOGGING
+from services.executor import available_cpus
+from services.fingerprint import FILE_NAME_PATTERN, FINGERPRINT_DTYPE, FingerprintStore
+from validators import ImageFileValidator
+from validators.codecs import image_hash, load_codecs, perceptual_hash
+
+T = TypeVar("T")
+Result = TypeVar("Result")
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def scan_dirs(directory: Path) -> Iterator[Path]:
+    """Yields the subdirectories of the directory (but the hidden ones)."""
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False):
+                yield Path(entry.path)
+
+
+def files_dirs(base_dir: Path) -> Iterator[Path]:
+    """Yields the files directories of the sessions."""
+    for user_dir in scan_dirs(base_dir):
+        for session_dir in scan_dirs(user_dir):
+            yield session_dir / "original"
+
+
+def list_files(files_dir: Path) -> list[Path]:
+    """Returns the stored files of the files directory (blocking)."""
+    try:
+        with os.scandir(files_dir) as it:
+            return [
+                Path(entry.path)
+                for entry in it
+                if FILE_NAME_PATTERN.match(entry.name) and entry.is_file(follow_symlinks=False)
+            ]
+    except FileNotFoundError:
+        return []
+
+
+def bounded_map(executor: Executor, func: Callable[[T], Result], items: Iterable[T], limit: int) -> Iterator[Result]:
+    """Maps the function over the items in the executor with at most `limit` calls in flight, in order."""
+    futures: deque[Future[Result]] = deque()
+
+    for item in items:
+        futures.append(executor.submit(func, item))
+        if len(futures) >= limit:
+            yield futures.popleft().result()
+
+    while futures:
+        yield futures.popleft().result()
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Yields the items in lists of the size (the last one may be shorter)."""
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def fingerprint_files(paths: list[Path]) -> tuple[np.ndarray, list[Path], list[tuple[Path, str]]]:
+    """Hashes the files (blocking), returns the records and the paths of the hashed files and the failed ones."""
+    load_codecs()
+    records = np.zeros(len(paths), FINGERPRINT_DTYPE)
+    hashed: list[Path] = []
+    failed: list[tuple[Path, str]] = []
+
+    for path in paths:
+        try:
+            data = path.read_bytes()  # read once for the digest and the decode
+            with Image.open(io.BytesIO(data)) as img:
+                ImageFileValidator.reduce_image(img)
+                dhash, phash = image_hash(img), perceptual_hash(img)
+        except (Image.DecompressionBombError, OSError) as e:  # UnidentifiedImageError is an OSError
+            failed.append((path, str(e)))
+            continue
+
+        records[len(hashed)] = (int(dhash, 16), int(phash, 16), hashlib.sha256(data).digest(), len(data), 0)
+        hashed.append(path)
+
+    return records[: len(hashed)], hashed, failed
+
+
+class IndexBuilder:
+    """Fingerprints the stored files that are not in the index yet and appends them to it."""
+
+    __slots__ = (
+        "args",
+        "store",
+        "indexed",
+        "hashed",
+        "skipped",
+        "failed",
+        "_start",
+        "_last_report",
+        "_last_checkpoint",
+    )
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.store = FingerprintStore(args.index)
+        self.indexed: set[str] = set()  # relative paths of the files in the index
+        self.hashed = 0
+        self.skipped = 0
+        self.failed = 0
+        self._start = self._last_report = self._last_checkpoint = perf_counter()
+
+    @property
+    def params(self) -> dict[str, Any]:
+        """Returns the parameters of the fingerprints, an index built with others is rebuilt."""
+        return {
+            "base_dir": str(self.args.base_dir),
+            "hashes": ["dhash", "phash", "sha256"],
+            "decode_size": ImageFileValidator.hash_decode_size,
+        }
+
+    def pending_files(self, scanner: Executor) -> Iterator[Path]:
+        """Yields the stored files that are not in the index, the session directories are listed by the scanner."""
+        base_dir = self.args.base_dir
+        dirs = files_dirs(base_dir)
+
+        for paths in bounded_map(scanner, list_files, dirs, self.args.scan_workers * 4):
+            for path in paths:
+                if str(path.relative_to(base_dir)) in self.indexed:
+                    self.skipped += 1
+                else:
+                    yield path
+
+    def run(self) -> None:
+        """Builds the index, checkpointing it on the way and at the end."""
+        self.indexed = set(self.store.open(self.params, self.args.rebuild))
+        logger.info(f"Indexing {self.args.base_dir}: {len(self.indexed)} files already indexed")
+
+        try:
+            with (
+                ThreadPoolExecutor(self.args.scan_workers, thread_name_prefix="scanner") as scanner,
+                ProcessPoolExecutor(self.args.workers, mp_context=get_context("spawn")) as pool,
+            ):
+                batches = batched(self.pending_files(scanner), self.args.batch_size)
+                for records, hashed, failed in bounded_map(pool, fingerprint_files, batches, self.args.workers * 2):
+                    self.add(records, hashed, failed)
+
+            self.store.checkpoint(complete=True)
+        finally:
+            if not self.store.meta.get("complete"):
+                self.store.checkpoint(complete=False)
+            self.store.close()
+            self.report()
+
+    def add(self, records: np.ndarray, hashed: list[Path], failed: list[tuple[Path, str]]) -> None:
+        """Appends the fingerprints to the index, checkpoints it and reports the progress when they are due."""
+        self.store.append(records, [str(path.relative_to(self.args.base_dir)) for path in hashed])
+        self.hashed += len(hashed)
+        self.failed += len(failed)
+
+        for path, error in failed:
+            logger.warning(f"Failed to fingerprint {path}: {error}")
+
+        now = perf_counter()
+        if now - self._last_checkpoint >= self.args.checkpoint_interval:
+            self.store.checkpoint(complete=False)
+            self._last_checkpoint = now
+        if now - self._last_report >= self.args.report_interval:
+            self.report()
+            self._last_report = now
+
+    def report(self) -> None:
+        """Logs the progress of the build."""
+        elapsed = perf_counter() - self._start
+        logger.info(
+            f"Indexed {self.store.count} files: {self.hashed} hashed ({self.hashed / elapsed:.1f} files/s), "
+            f"{self.skipped} already indexed, {self.failed} failed, {elapsed:.0f}s"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-dir", type=Path, default=image_settings.BASE_DIR)
+    parser.add_argument("--index", type=Path, help="index directory, `.fingerprints` in the base directory by default")
+    parser.add_argument("--workers", type=int, default=available_cpus(), help="hashing processes")
+    parser.add_argument("--scan-workers", type=int, default=executor_settings.IO_WORKERS, help="scanning threads")
+    parser.add_argument("--batch-size", type=int, default=32, help="files per hashing job")
+    parser.add_argument("--checkpoint-interval", type=float, default=30.0, help="seconds")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="seconds")
+    parser.add_argument("--rebuild", action="store_true", help="index all the files again")
+    args = parser.parse_args()
+    args.index = args.index or args.base_dir / ".fingerprints"
+
+    logging.config.dictConfig(LOGGING)
+    logger.setLevel(logging.INFO)  # set by uvicorn for the server
+    IndexBuilder(args).run()
+
+
+if __name__ == "__main__":
+    main()
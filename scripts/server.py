@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""
+Production entrypoint for `file-receiver` project.
+
+This script runs the FastAPI application in several Uvicorn worker
+processes, sized to the CPUs available to the container (affinity mask and
+cgroup quota), with uvloop and httptools when they are installed. With
+SO_REUSEPORT every worker listens on its own socket and the kernel balances
+the connections between them.
+
+On SIGTERM (or SIGINT) a worker stops listening, rejects new uploads and
+lets the uploads in progress finish for up to `DRAIN_TIMEOUT` seconds
+before its connections are closed. A second signal stops it at once.
+Crashed workers are restarted.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import socket
+from importlib.util import find_spec
+from multiprocessing import get_context
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from types import FrameType
+
+import uvicorn
+
+from core.config.log import LOGGING
+from core.config.server import server_settings
+from services.admission import admission_controller
+from services.executor import available_cpus
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class DrainingServer(uvicorn.Server):
+    """Uvicorn server that drains the uploads in progress before its connections are closed."""
+
+    def __init__(self, config: uvicorn.Config) -> None:
+        super().__init__(config)
+        self.drain_signal: int | None = None
+        self.drain_task: asyncio.Task | None = None
+
+    def handle_exit(self, sig: int, frame: FrameType | None) -> None:
+        # The first signal starts draining on the next tick of the server loop
+        if self.drain_signal is None:
+            self.drain_signal = sig
+        else:
+            super().handle_exit(sig, frame)
+
+    async def on_tick(self, counter: int) -> bool:
+        if self.drain_signal is not None and self.drain_task is None:
+            self.drain_task = asyncio.create_task(self.drain(self.drain_signal))
+        return await super().on_tick(counter)
+
+    async def drain(self, sig: int) -> None:
+        """Stops listening, waits for the active uploads and shuts the server down."""
+        for server in self.servers:
+            server.close()
+
+        logger.info(f"Draining {admission_controller.active_uploads} active uploads...")
+        if not await admission_controller.drain(server_settings.DRAIN_TIMEOUT):
+            logger.warning(f"Drain timeout: closing {admission_controller.active_uploads} active uploads")
+
+        super().handle_exit(sig, None)
+
+
+def create_socket(reuse_port: bool) -> socket.socket:
+    """Creates the listening socket of the server."""
+    family = socket.AF_INET6 if ":" in server_settings.SERVER_HOST else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+    sock.bind((server_settings.SERVER_HOST, server_settings.SERVER_PORT))
+    sock.listen(server_settings.SERVER_BACKLOG)
+    sock.set_inheritable(True)
+    return sock
+
+
+def create_config() -> uvicorn.Config:
+    """Returns the Uvicorn config with the fastest available event loop and HTTP parser."""
+    config = uvicorn.Config(
+        app="main:app",
+        loop="uvloop" if find_spec("uvloop") else "asyncio",
+        http="httptools" if find_spec("httptools") else "h11",
+        backlog=server_settings.SERVER_BACKLOG,
+        timeout_graceful_shutdown=server_settings.SHUTDOWN_TIMEOUT,
+        log_config=LOGGING,
+        log_level=logging.INFO,
+        use_colors=True,
+    )
+    logger.info(f"Event loop: {config.loop}, HTTP parser: {config.http}")
+    return config
+
+
+def run_worker(config: uvicorn.Config, sock: socket.socket | None) -> None:
+    """Runs the server in a worker process, on its own SO_REUSEPORT socket if no socket is shared."""
+    # Only the supervisor receives the terminal signals, so a worker is signalled once
+    os.setpgid(0, 0)
+    config.configure_logging()
+    DrainingServer(config).run(sockets=[sock or create_socket(reuse_port=True)])
+
+
+class Supervisor:
+    """Starts the worker processes, restarts the crashed ones and forwards the shutdown signals to them."""
+
+    __slots__ = (
+        "config",
+        "sock",
+        "workers",
+        "processes",
+        "stopping",
+    )
+
+    def __init__(self, config: uvicorn.Config, workers: int, sock: socket.socket | None) -> None:
+        self.config = config
+        self.sock = sock
+        self.workers = workers
+        self.processes: list[BaseProcess] = []
+        self.stopping = False
+
+    def run(self) -> None:
+        """Runs the workers until all of them exit after a shutdown signal."""
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self.handle_signal)
+
+        self.processes = [self.start_worker() for _ in range(self.workers)]
+
+        while self.processes:
+            wait([process.sentinel for process in self.processes])
+            self.reap_workers()
+
+    def start_worker(self) -> BaseProcess:
+        """Starts a worker process."""
+        process = get_context("spawn").Process(target=run_worker, args=(self.config, self.sock))
+        process.start()
+        logger.info(f"Started worker process [{process.pid}]")
+        return process
+
+    def reap_workers(self) -> None:
+        """Removes the exited workers, restarts them unless the server is stopping."""
+        for process in [process for process in self.processes if not process.is_alive()]:
+            self.processes.remove(process)
+            if self.stopping:
+                continue
+
+            logger.error(f"Worker process [{process.pid}] exited with code {process.exitcode}, restarting...")
+            self.processes.append(self.start_worker())
+
+    def handle_signal(self, sig: int, frame: FrameType | None) -> None:
+        """Forwards the signal to the workers (the first one drains them, the next one stops them)."""
+        self.stopping = True
+        for process in self.processes:
+            if process.pid is not None:
+                os.kill(process.pid, sig)
+
+
+def main() -> None:
+    config = create_config()
+    cpus = available_cpus()
+    workers = server_settings.SERVER_WORKERS or cpus
+    reuse_port = server_settings.SERVER_REUSE_PORT and hasattr(socket, "SO_REUSEPORT")
+
+    # The image decoding pools of the workers share the CPUs
+    os.environ.setdefault("CPU_WORKERS", str(max(1, cpus // workers)))
+
+    # With SO_REUSEPORT the socket is bound here only to fail fast if the address is in use
+    sock = create_socket(reuse_port)
+    if reuse_port:
+        sock.close()
+
+    logger.info(f"Starting {workers} workers on {server_settings.SERVER_HOST}:{server_settings.SERVER_PORT}")
+    Supervisor(config, workers, None if reuse_port else sock).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 from fastapi import APIRouter
 
-from .routes import receiver
+from .routes import metrics, receiver
 
 main_router = APIRouter()
 
 main_router.include_router(receiver.router, prefix="/image", tags=["Image Receiver"])
+main_router.include_router(metrics.router, tags=["Metrics"])
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from services.exporter import metrics_exporter
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_handler() -> PlainTextResponse:
+    """Prometheus metrics of the uploads, connections and executors."""
+    return PlainTextResponse(metrics_exporter.render(), media_type=metrics_exporter.content_type)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, WebSocket
 
-from handlers import ImageFileHandler
+from handlers import ImageFileHandler, MultiplexImageFileHandler
 
 router = APIRouter()
 
@@ -10,3 +10,10 @@ async def image_upload_handler(ws: WebSocket) -> None:
     """WebSocket image upload handler."""
     handler = ImageFileHandler(ws)
     await handler.accept()
+
+
+@router.websocket("/upload/multiplex")
+async def image_multiplex_upload_handler(ws: WebSocket) -> None:
+    """WebSocket image upload handler, several files are uploaded at once (framed binary protocol)."""
+    handler = MultiplexImageFileHandler(ws)
+    await handler.accept()
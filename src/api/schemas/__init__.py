@@ -1,2 +1,4 @@
+from .receiver import FileCandidate as FileCandidate
+from .receiver import FileCheck as FileCheck
 from .receiver import ProgressStatus as ProgressStatus
 from .receiver import UploadData as UploadData
@@ -1,21 +1,51 @@
 from typing import TypedDict
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 
 from enums import FileAction
 
 
+class FileCandidate(BaseModel):
+    file_idx: int
+    file_size: int = Field(ge=0)
+    sha256: str = Field(pattern=r"^[0-9a-f]{64}$")
+    file_hash: str | None = Field(default=None, pattern=r"^[0-9a-f]{16}$")  # dhash computed by the client
+
+
 class UploadData(BaseModel):
     action: FileAction
-    file_idx: int
-    file_name: str
+    file_idx: int = 0  # required except to check files
+    file_name: str = "default"
     user_id: UUID
     session_id: UUID
+    resume: bool = False
+    file_size: int | None = Field(default=None, ge=0)
+    files: list[FileCandidate] = Field(default=[], max_length=256)  # files to check before the upload
+
+    @model_validator(mode="after")
+    def check_file(self) -> "UploadData":
+        """Requires the file of the action, except to check files."""
+        if self.action != FileAction.CHECK and not {"file_idx", "file_name"} <= self.model_fields_set:
+            raise ValueError("file_idx and file_name are required")
+        return self
+
+
+class FileCheck(TypedDict, total=False):
+    file_idx: int
+    status: str
+    message: str
+    file_name: str
 
 
 class ProgressStatus(TypedDict, total=False):
     status: str
     progress: int
+    offset: int
+    chunk_size: int
+    retry_after: int
     message: str
     file_name: str
+    file_idx: int
+    variant: str
+    files: list[FileCheck]
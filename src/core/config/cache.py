@@ -0,0 +1,9 @@
+from pydantic.v1 import BaseSettings
+
+
+class CacheSettings(BaseSettings):
+    SESSION_MANIFEST_TTL: int = 600
+    SESSION_MANIFEST_MAX_SESSIONS: int = 10_000
+
+
+cache_settings = CacheSettings()
@@ -11,6 +11,9 @@ class DefaultSettings(BaseSettings):
 
     MAX_FILE_COUNT: int = 0
     MAX_FILE_SIZE: int = 0
+    MAX_MEGAPIXELS: int = 0
+
+    DIMENSIONS_SCAN_LIMIT: int = 1024 * 1024  # bytes of the file searched for the image dimensions
 
 
 DEFAULTS = DefaultSettings()
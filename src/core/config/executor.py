@@ -0,0 +1,17 @@
+from pydantic.v1 import BaseSettings
+
+from enums import ExecutorType
+
+
+class ExecutorSettings(BaseSettings):
+    CPU_EXECUTOR: ExecutorType = ExecutorType.PROCESS
+    CPU_WORKERS: int = 0  # 0 - number of available CPUs
+    CPU_QUEUE_SIZE: int = 32
+    CPU_JOB_TIMEOUT: int = 30
+    CPU_WARMUP: bool = True  # start the workers and load the image codecs in the background on startup
+
+    IO_WORKERS: int = 16
+    IO_SLOW_OPERATION: float = 1.0  # seconds, slower filesystem calls are logged
+
+
+executor_settings = ExecutorSettings()
@@ -8,6 +8,14 @@ class ImageSettings(DefaultSettings):
 
     MAX_FILE_COUNT: int = 10
     MAX_FILE_SIZE: int = 5
+    MAX_MEGAPIXELS: int = 90
+
+    HASH_DECODE_SIZE: int = 128
+
+    DERIVATIVES: str = ""  # variants of the stored images "name=format:size[:quality],...", e.g. "thumb=webp:320"
+    DERIVATIVE_QUALITY: int = 80
+    DERIVATIVE_QUEUE_SIZE: int = 64  # stored images waiting for their variants, the next uploads wait when it is full
+    DERIVATIVE_CONCURRENCY: int = 2  # images rendered at once (in the CPU executor)
 
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
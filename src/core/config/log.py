@@ -1,11 +1,108 @@
+import json
 import logging
+from datetime import datetime, timezone
+from io import TextIOWrapper
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from queue import Queue
+from random import random
 from typing import Any, Literal
 
 from pydantic.v1 import BaseSettings
 from uvicorn.logging import AccessFormatter, DefaultFormatter
 
 
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """Rotating file handler that creates the log directory and opens the file on the first record."""
+
+    def __init__(self, filename: str | Path, **kwargs: Any) -> None:
+        super().__init__(filename, delay=True, **kwargs)
+
+    def _open(self) -> TextIOWrapper:
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
+
+
+class QueuedHandler(QueueHandler):
+    """
+    Handler that writes the records with its target handler in a background thread.
+
+    The records are formatted by the caller and put in a bounded queue. When
+    the queue is full the record is dropped (and counted) rather than
+    blocking the event loop. On close the queued records are written.
+    """
+
+    def __init__(self, handler_class: type[logging.Handler], queue_size: int = 10_000, **kwargs: Any) -> None:
+        # One more slot is kept for the stop sentinel of the listener
+        self.records: Queue[logging.LogRecord | None] = Queue(queue_size + 1)
+        self.queue_size = queue_size
+        super().__init__(self.records)
+        self.target = handler_class(**kwargs)
+        self.dropped = 0
+        self.listener: QueueListener | None = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # Called under the handler lock, so the size cannot change but by the listener taking records
+        if self.records.qsize() >= self.queue_size:
+            self.dropped += 1
+        else:
+            self.records.put_nowait(record)
+
+    def close(self) -> None:
+        # Handlers are closed on reconfiguration and again at exit
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
+
+
+class AccessSampler(logging.Filter):
+    """
+    Passes a sample of the access lines: HTTP requests, WebSocket handshakes and actions of the file managers.
+
+    Warnings, errors and the other records always pass.
+    """
+
+    access_messages = ('%s - "WebSocket %s', "connection open", "connection closed")
+
+    def __init__(self, rate: float = 1.0) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def is_access(self, record: logging.LogRecord) -> bool:
+        """Checks if the record is an access line."""
+        if record.name == "uvicorn.access" or hasattr(record, "action"):
+            return True
+        return isinstance(record.msg, str) and record.msg.startswith(self.access_messages)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1 or record.levelno >= logging.WARNING or not self.is_access(record):
+            return True
+        return random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats the record as a JSON line with the upload context (action, file, user, session, stage timings)."""
+
+    context_fields = ("action", "file_name", "user_id", "session_id", "timings_ms")
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        data.update((name, value) for name in self.context_fields if (value := getattr(record, name, None)) is not None)
+
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(data, default=str)
+
+
 class LoggingSettings(BaseSettings):
     LOGGING_LEVEL_CONSOLE: int | str = logging.INFO
     LOGGING_LEVEL_FILE: int | str = logging.WARNING
@@ -15,6 +112,10 @@ class LoggingSettings(BaseSettings):
     LOG_FILE_MAX_SIZE: int = 10
     LOG_FILE_BACKUP_COUNT: int = 5
 
+    LOG_FORMAT: Literal["text", "json"] = "text"
+    LOG_QUEUE_SIZE: int = 10_000  # records waiting to be written, the next ones are dropped
+    LOG_ACCESS_SAMPLE_RATE: float = 1.0  # fraction of the access lines logged
+
     DEFAULT_HANDLERS = Literal[
         "console",
         "access",
@@ -38,18 +139,41 @@ class LoggingSettings(BaseSettings):
             for handler in logger.handlers:
                 handler.setFormatter(self.DEFAULT_FORMATTER)
 
-    def file_handler(self, file_name: str, level: int | str | None = None) -> dict:
+    def formatter(self, formatter: str) -> str:
+        """Returns the formatter of the handlers, the text formatter unless the JSON format is set."""
+        return "json" if self.LOG_FORMAT == "json" else formatter
+
+    def queued_handler(
+        self, handler_class: type[logging.Handler], formatter: str, level: int | str, **kwargs: Any
+    ) -> dict:
         return {
-            "formatter": "file",
-            "class": "logging.handlers.RotatingFileHandler",
-            "filename": self.LOG_PATH / file_name,
-            "backupCount": self.LOG_FILE_BACKUP_COUNT,
-            "maxBytes": self.LOG_FILE_MAX_SIZE * 1024**2,
-            "level": level or self.LOGGING_LEVEL_FILE,
+            "()": QueuedHandler,
+            "formatter": self.formatter(formatter),
+            "level": level,
+            "handler_class": handler_class,
+            "queue_size": self.LOG_QUEUE_SIZE,
+            **kwargs,
         }
 
+    def stream_handler(self, formatter: str) -> dict:
+        return self.queued_handler(
+            logging.StreamHandler,
+            formatter,
+            self.LOGGING_LEVEL_CONSOLE,
+            stream="ext://sys.stdout",
+        )
+
+    def file_handler(self, file_name: str, level: int | str | None = None) -> dict:
+        return self.queued_handler(
+            LazyRotatingFileHandler,
+            "file",
+            level or self.LOGGING_LEVEL_FILE,
+            filename=self.LOG_PATH / file_name,
+            backupCount=self.LOG_FILE_BACKUP_COUNT,
+            maxBytes=self.LOG_FILE_MAX_SIZE * 1024**2,
+        )
+
     def configure(self) -> dict:
-        self.LOG_PATH.mkdir(parents=True, exist_ok=True)
         self.set_default_formatter_to_loggers()
         return {
             "version": 1,
@@ -70,27 +194,26 @@ class LoggingSettings(BaseSettings):
                     "fmt": '%(levelprefix)s %(client_addr)s - "%(request_line)s" %(status_code)s',
                     "use_colors": True,
                 },
-            },
-            "handlers": {
-                "console": {
-                    "formatter": "default",
-                    "class": "logging.StreamHandler",
-                    "stream": "ext://sys.stdout",
-                    "level": self.LOGGING_LEVEL_CONSOLE,
+                "json": {
+                    "()": JSONFormatter,
                 },
-                "access": {
-                    "formatter": "access",
-                    "class": "logging.StreamHandler",
-                    "stream": "ext://sys.stdout",
-                    "level": self.LOGGING_LEVEL_CONSOLE,
+            },
+            "filters": {
+                "access_sampler": {
+                    "()": AccessSampler,
+                    "rate": self.LOG_ACCESS_SAMPLE_RATE,
                 },
+            },
+            "handlers": {
+                "console": self.stream_handler("default"),
+                "access": self.stream_handler("access"),
                 "file_access": self.file_handler("access.log", logging.INFO),
                 "file_errors": self.file_handler("errors.log"),
             },
             "loggers": {
                 "uvicorn": self.to_handlers(["console"]),
-                "uvicorn.access": self.to_handlers(["access", "file_access"]),
-                "uvicorn.error": self.to_handlers(["console", "file_errors"]),
+                "uvicorn.access": self.to_handlers(["access", "file_access"], filters=["access_sampler"]),
+                "uvicorn.error": self.to_handlers(["console", "file_errors"], filters=["access_sampler"]),
             },
         }
 
@@ -0,0 +1,14 @@
+from pydantic.v1 import BaseSettings
+
+
+class MonitorSettings(BaseSettings):
+    LOOP_LAG_INTERVAL: float = 0.5  # seconds between the event loop lag samples, 0 - disabled
+    LOOP_BLOCKED_THRESHOLD: float = 0.1  # seconds, the code blocking the loop longer is logged, 0 - disabled
+
+    PROFILE_THRESHOLD: float = 0  # seconds, the profiled uploads taking longer are dumped, 0 - disabled
+    PROFILE_SAMPLE_RATE: float = 0.05  # fraction of the uploads profiled
+    PROFILE_INTERVAL: float = 0.005  # seconds between the stack samples of the profiled uploads
+    PROFILE_DIR: str = "profiles"  # in the log directory
+
+
+monitor_settings = MonitorSettings()
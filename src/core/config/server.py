@@ -0,0 +1,15 @@
+from pydantic.v1 import BaseSettings
+
+
+class ServerSettings(BaseSettings):
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0  # 0 - number of available CPUs (affinity and cgroup quota)
+    SERVER_REUSE_PORT: bool = True  # every worker listens on its own socket, the kernel balances connections
+    SERVER_BACKLOG: int = 2048
+
+    DRAIN_TIMEOUT: int = 30  # seconds the uploads in progress get to finish on shutdown
+    SHUTDOWN_TIMEOUT: int = 5  # seconds the remaining connections get to close after draining
+
+
+server_settings = ServerSettings()
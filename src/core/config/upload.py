@@ -0,0 +1,31 @@
+from pydantic.v1 import BaseSettings
+
+
+class UploadSettings(BaseSettings):
+    PARTIAL_DIR: str = ".partial"
+
+    WRITE_BUFFER_SIZE: int = 1024 * 1024
+    WRITE_ALIGNMENT: int = 64 * 1024
+    PREALLOCATE: bool = False  # only for filesystems with native fallocate (glibc emulates it by writing zeros)
+
+    CONTENT_STORE: bool = False  # identical files are stored once, as hard links to a blob named by SHA-256
+    CONTENT_STORE_DIR: str = ".blobs"  # in the base directory (the links need the same filesystem)
+
+    RESUME_TTL: int = 3600  # 0 - interrupted uploads are deleted
+
+    GC_INTERVAL: int = 300  # seconds between the sweeps of expired partial files and empty sessions
+    GC_CONCURRENCY: int = 4  # sessions swept at once
+    GC_BATCH_SIZE: int = 256  # directory entries read per scandir call
+
+    MAX_ACTIVE_UPLOADS: int = 64  # 0 - unlimited
+    MAX_INFLIGHT_BYTES: int = 512 * 1024 * 1024  # declared (or maximum) sizes of the active uploads, 0 - unlimited
+    MAX_PENDING_CPU_JOBS: int = 64  # 0 - unlimited, the background renderings are not counted
+    BUSY_RETRY_AFTER: int = 1000  # ms
+
+    SESSION_LOCK_TIMEOUT: float = 10.0  # seconds to wait for the session lock held by another connection or worker
+
+    MULTIPLEX_MAX_STREAMS: int = 4
+    MULTIPLEX_QUEUE_SIZE: int = 16  # chunks buffered per stream, a stream with a full queue is aborted
+
+
+upload_settings = UploadSettings()
@@ -5,5 +5,14 @@ class WebsocketSettings(BaseSettings):
     TIMEOUT: int = 30
     DELAY: int = 10
 
+    PROGRESS_STEP: int = 5  # percent
+    PROGRESS_INTERVAL: float = 0.25  # seconds
+
+    CHUNK_SIZE: int = 256 * 1024  # suggested before the throughput of the connection is measured
+    CHUNK_SIZE_MIN: int = 64 * 1024  # range of the suggested chunk sizes
+    CHUNK_SIZE_MAX: int = 1024 * 1024
+    CHUNK_INTERVAL: float = 0.1  # seconds of upload per suggested chunk
+    CHUNK_SIZE_CAP: int = 8 * 1024 * 1024  # larger chunks are rejected, 0 - no limit
+
 
 websocket_settings = WebsocketSettings()
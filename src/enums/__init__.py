@@ -1,3 +1,4 @@
+from .executor import ExecutorType as ExecutorType
 from .file import FileAction as FileAction
 from .file import FileStatusMessage as FileStatusMessage
 from .websocket import WebSocketStatus as WebSocketStatus
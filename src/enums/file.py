@@ -4,6 +4,7 @@ from enum import StrEnum
 class FileAction(StrEnum):
     UPLOAD = "upload"
     DELETE = "delete"
+    CHECK = "check"
 
 
 class FileStatusMessage(StrEnum):
@@ -12,3 +13,10 @@ class FileStatusMessage(StrEnum):
     UPLOAD_LIMIT_EXCEEDED = "Upload limit exceeded"
     FILE_SIZE_EXCEEDED = "File size exceeded"
     INVALID_FILE_FORMAT = "Invalid file format"
+    IMAGE_TOO_LARGE = "Image dimensions exceeded"
+    PROCESSING_TIMEOUT = "File processing timed out"
+    TOO_MANY_STREAMS = "Too many concurrent uploads"
+    STREAM_IN_PROGRESS = "File is already being uploaded"
+    STREAM_OVERFLOW = "File chunks sent faster than processed"
+    SESSION_LOCKED = "Session is locked by another upload"
+    INVALID_CHUNK_SIZE = "Invalid chunk size"
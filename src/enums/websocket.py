@@ -6,6 +6,8 @@ class WebSocketStatus(StrEnum):
     UPLOADING = "uploading"
     SUCCESS = "success"
     TIMEOUT = "timeout"
+    BUSY = "busy"
+    VARIANT = "variant"
     ABORT = "abort"
     ERROR = "error"
 
@@ -15,6 +17,10 @@ class WebSocketStatusMessage(StrEnum):
     UPLOADING = "Uploading..."
     SUCCESS_UPLOAD = "Upload successful"
     SUCCESS_DELETE = "File deleted"
+    SUCCESS_CHECK = "Files checked"
+    VARIANT_READY = "Variant ready"
+    VARIANT_FAILED = "Variant failed"
     TIMEOUT = "Connection timed out"
+    BUSY = "Server is busy, retry later"
     ERROR = "Something went wrong"
     ABORT = "File upload aborted"
@@ -1 +1,3 @@
+from .base import BaseFileHandler as BaseFileHandler
 from .image import ImageFileHandler as ImageFileHandler
+from .image import MultiplexImageFileHandler as MultiplexImageFileHandler
@@ -0,0 +1,25 @@
+from starlette.status import WS_1013_TRY_AGAIN_LATER
+from starlette.websockets import WebSocket
+
+from managers import BaseFileManager, MultiplexFileManager
+from services.admission import admission_controller
+
+
+class BaseFileHandler:
+
+    manager_class: type[BaseFileManager | MultiplexFileManager] = BaseFileManager
+
+    __slots__ = ("ws",)
+
+    def __init__(self, ws: WebSocket) -> None:
+        self.ws = ws
+
+    async def accept(self) -> None:
+        await self.ws.accept()
+
+        # A draining worker closes new connections (once accepted, a close before is an HTTP 403),
+        # the client reconnects to another worker
+        if admission_controller.draining:
+            return await self.ws.close(WS_1013_TRY_AGAIN_LATER)
+
+        await self.manager_class(self.ws).handle_action()
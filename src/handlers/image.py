@@ -1,16 +1,13 @@
-from starlette.websockets import WebSocket
+from managers import ImageFileManager, MultiplexFileManager
 
-from managers import ImageFileManager
+from .base import BaseFileHandler
 
 
-class ImageFileHandler:
+class ImageFileHandler(BaseFileHandler):
 
-    __slots__ = ("manager", "ws")
+    manager_class = ImageFileManager
 
-    def __init__(self, ws: WebSocket) -> None:
-        self.manager = ImageFileManager(ws)
-        self.ws = ws
 
-    async def accept(self) -> None:
-        await self.ws.accept()
-        await self.manager.handle_action()
+class MultiplexImageFileHandler(BaseFileHandler):
+
+    manager_class = MultiplexFileManager
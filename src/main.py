@@ -1,11 +1,40 @@
 import logging.config
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
 from fastapi import FastAPI
 
 from api.routers import main_router
 from core.config.log import LOGGING
+from services.cleanup import session_collector
+from services.derivatives import derivative_pipeline
+from services.executor import cpu_executor
+from services.filesystem import filesystem
+from services.monitor import loop_monitor
+from services.profiler import upload_profiler
+from services.timeout import timeout_scheduler
+from validators.codecs import load_codecs
 
 logging.config.dictConfig(LOGGING)
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    """Starts the background services and releases the application resources on shutdown."""
+    session_collector.start()
+    loop_monitor.start()
+    upload_profiler.start()
+    derivative_pipeline.start()
+    cpu_executor.warmup(load_codecs)  # the codecs are loaded by the workers, not before the server starts
+    yield
+    session_collector.stop()
+    loop_monitor.stop()
+    upload_profiler.stop()
+    derivative_pipeline.stop()
+    timeout_scheduler.shutdown()
+    await cpu_executor.shutdown()
+    await filesystem.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(main_router)
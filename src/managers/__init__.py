@@ -1,3 +1,6 @@
 from .base import BaseFileManager as BaseFileManager
 from .image import ImageFileManager as ImageFileManager
+from .multiplex import ImageStreamManager as ImageStreamManager
+from .multiplex import MultiplexFileManager as MultiplexFileManager
+from .websocket import StreamWebSocketManager as StreamWebSocketManager
 from .websocket import WebSocketManager as WebSocketManager
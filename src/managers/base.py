@@ -1,19 +1,27 @@
 from abc import abstractmethod
-from contextlib import suppress
+from contextlib import asynccontextmanager, suppress
 from logging import getLogger
 from pathlib import Path
-from typing import Any
+from time import perf_counter
+from typing import Any, AsyncIterator
 from uuid import UUID
 
-import aiofiles
-from aiofiles.threadpool.binary import AsyncBufferedIOBase
 from pydantic import ValidationError
 from starlette.websockets import WebSocket, WebSocketDisconnect
 
-from api.schemas import UploadData
+from api.schemas import FileCandidate, FileCheck, UploadData
 from core.config.defaults import DEFAULTS
-from enums import FileAction, WebSocketStatus
-from validators import BaseFileValidator
+from core.config.upload import upload_settings
+from enums import FileAction, WebSocketStatus, WebSocketStatusMessage
+from services.admission import admission_controller
+from services.content import ContentStore
+from services.filesystem import filesystem
+from services.locks import SessionLock
+from services.manifest import SessionManifest, session_manifests
+from services.metrics import upload_metrics
+from services.profiler import upload_profiler
+from services.writer import BufferedFileWriter
+from validators import BaseFileValidator, DimensionSniffer
 
 from .websocket import WebSocketManager
 
@@ -24,6 +32,8 @@ class BaseFileManager:
 
     base_dir = DEFAULTS.BASE_DIR
     validator = BaseFileValidator()
+    content_store = ContentStore(base_dir)
+    upload_settings = upload_settings
 
     __slots__ = (
         "ws",
@@ -31,15 +41,20 @@ class BaseFileManager:
         "action",
         "user_id",
         "session_id",
+        "resume",
+        "file_size",
+        "files",
         "file_idx",
         "file_name",
         "file_hash",
+        "file_digest",
         "file_dir",
         "file_path",
+        "timings",
     )
 
-    def __init__(self, websocket: WebSocket) -> None:
-        self.ws_manager = WebSocketManager(websocket)
+    def __init__(self, websocket: WebSocket, ws_manager: WebSocketManager | None = None) -> None:
+        self.ws_manager = ws_manager or WebSocketManager(websocket)
         self.ws = websocket
 
         self.file_dir: Path = Path()
@@ -47,36 +62,52 @@ class BaseFileManager:
 
         self.file_idx: int = 0
         self.file_name: str = "default"
-        self.file_hash: Any | None = None
+        self.file_hash: Any = None
+        self.file_digest: str | None = None  # SHA-256 of the content
 
         self.user_id: UUID | None = None
         self.session_id: UUID | None = None
+        self.resume: bool = False
+        self.file_size: int | None = None
+        self.files: list[FileCandidate] = []
+        self.timings: dict[str, float] = {}  # durations of the upload stages, seconds
 
         self.action: FileAction | str = FileAction.UPLOAD
 
+    @property
+    def session_dir(self) -> Path:
+        """Returns the directory of the session."""
+        return self.file_dir.parent
+
+    @property
+    def partial_dir(self) -> Path:
+        """Returns the directory of the files being uploaded."""
+        return self.session_dir / self.upload_settings.PARTIAL_DIR
+
+    @property
+    def log_context(self) -> dict[str, Any]:
+        """Returns the fields of the action for the structured log records."""
+        return {
+            "action": str(self.action),
+            "file_name": self.file_name,
+            "user_id": str(self.user_id),
+            "session_id": str(self.session_id),
+            "timings_ms": {stage: round(seconds * 1000, 3) for stage, seconds in self.timings.items()},
+        }
+
     async def handle_action(self) -> None:
         """Processes received actions (upload/delete)."""
         while True:
             try:
-                data = await self.ws.receive_json()
-                validated_data = UploadData(**data)
-
-                for key, value in validated_data:
-                    setattr(self, key, value)
-
-                await self.generate_file_path()
-                await getattr(self, f"perform_{self.action}")()
+                # The action is parsed and validated at once by the compiled pydantic-core JSON parser
+                data = UploadData.model_validate_json(await self.ws.receive_text())
+                await self.process_action(data)
 
             except (ValidationError, ValueError) as e:
-                logger.debug(f"Validation error: {e}")
-                await self.ws_manager.send_abort(str(e))
-                await self.delete_file()
+                await self.abort(e)
 
             except WebSocketDisconnect:
-                self.ws_manager.timeout_task.cancel()
-                if self.ws_manager.state == WebSocketStatus.UPLOADING:
-                    logger.debug("Websocket disconnected. File state: uploading. Deleting the file...")
-                    await self.delete_file()
+                await self.handle_disconnect()
                 break
 
             except Exception as e:
@@ -84,95 +115,304 @@ class BaseFileManager:
                     f"[Action: '{self.action}'] | "
                     f"[file_name: {self.file_name}] | "
                     f"[user_id: {self.user_id}] | "
-                    f"[session_id: {self.session_id}]"
+                    f"[session_id: {self.session_id}]",
+                    extra=self.log_context,
                 )
-                self.ws_manager.timeout_task.cancel()
+                self.ws_manager.stop_timeout()
                 with suppress(RuntimeError):
                     await self.ws.close(reason=str(e))
                 break
 
+    async def process_action(self, data: UploadData) -> None:
+        """Performs the received action."""
+        for key, value in data:
+            setattr(self, key, value)
+        self.timings = {}
+
+        await self.generate_file_path()
+        await getattr(self, f"perform_{self.action}")()
+
+    async def abort(self, error: Exception) -> None:
+        """Aborts the action (the rejected upload is deleted by `discard_rejected`)."""
+        logger.debug(f"Validation error: {error}")
+        await self.ws_manager.send_abort(str(error))
+
+    @asynccontextmanager
+    async def discard_rejected(self) -> AsyncIterator[None]:
+        """Deletes the uploaded file if it is rejected by the validation."""
+        try:
+            yield
+        except ValueError:
+            await self.delete_file()
+            raise
+
+    async def handle_disconnect(self) -> None:
+        """Stops the timeout and keeps (to resume) or deletes the file being uploaded."""
+        self.ws_manager.stop_timeout()
+
+        if self.ws_manager.state != WebSocketStatus.UPLOADING:
+            return
+
+        if self.upload_settings.RESUME_TTL:
+            logger.debug("Websocket disconnected. File state: uploading. Keeping the file to resume...")
+            return
+
+        logger.debug("Websocket disconnected. File state: uploading. Deleting the file...")
+        await self.delete_file()
+
     async def generate_file_path(self) -> Path:
         """Generate a path to save files based on user and session."""
         self.file_dir = self.base_dir / str(self.user_id) / str(self.session_id) / "original"
-        self.file_dir.mkdir(parents=True, exist_ok=True)
         self.file_path = self.file_dir / self.file_name
         return self.file_path
 
+    async def generate_partial_path(self) -> int:
+        """Generate a staging path of the uploaded file, returns the written size of a partial file to resume."""
+        self.file_path = self.partial_dir / f"{self.file_idx}_{self.file_name}"
+        await filesystem.mkdir(self.file_dir)
+        await filesystem.mkdir(self.partial_dir)
+
+        if await filesystem.stat(self.file_path) is None:
+            return 0
+
+        # A partial file left by an earlier upload is claimed under the lock the storage sweeps delete it under
+        max_age = self.upload_settings.RESUME_TTL if self.resume else 0
+        async with SessionLock(self.session_dir):
+            return await filesystem.run("claim", BufferedFileWriter.claim, self.file_path, max_age)
+
     async def perform_upload(self) -> None:
-        """Processes file upload."""
-        await self.ws_manager.send_ready()
+        """Processes file upload if the worker admits it, otherwise asks the client to retry later."""
+        if self.file_size is not None:
+            self.validator.check_size_limits(self.file_size)
 
-        if not await self.save_file():
-            return
+        # The declared size is enforced on receive, so the reservation can't be exceeded
+        reservation = self.validator.max_size_bytes if self.file_size is None else self.file_size
+        if not admission_controller.admit(reservation):
+            return await self.ws_manager.send_busy(admission_controller.retry_after)
+
+        if profile := upload_profiler.open():
+            self.timings = profile.timings
+
+        try:
+            await self.upload_file()
+        finally:
+            admission_controller.release(reservation)
+            if profile:
+                await upload_profiler.close(profile, self.log_context)
+
+    async def upload_file(self) -> None:
+        """Receives the file, validates it and moves it to the files directory."""
+        offset = await self.generate_partial_path()
+        await self.ws_manager.send_ready(offset)
 
-        await self.validate_file()
-        await self.rename_file()
+        async with self.discard_rejected():
+            if not (output_file := await self.save_file(offset)):
+                return
+
+            self.file_size = output_file.position
+            self.file_digest = output_file.digest.hexdigest() if output_file.digest else None
+
+            with upload_metrics.measure("verify", self.timings):
+                await self.validate_file()
+
+        # Files uploaded in parallel (by any connection or worker) are checked against the stored files one at a time,
+        # a received file is kept to resume if the session stays locked
+        async with SessionLock(self.session_dir) as session, self.discard_rejected():
+            await self.commit_file(session)
 
         await self.ws_manager.send_success_upload(self.file_path.name)
+        logger.info(f"Uploaded file {self.file_path.name}", extra=self.log_context)
+
+        await self.create_derivatives()
+
+    async def commit_file(self, session: SessionLock) -> None:
+        """Checks the file against the session manifest, moves it to the files directory and adds it to the manifest."""
+        manifest = await session_manifests.get(self.file_dir, session.version)
+
+        with upload_metrics.measure("unique", self.timings):
+            self.validate_stored_files(manifest)
+        with upload_metrics.measure("rename", self.timings):
+            await self.rename_file()
+
+        manifest.add(self.file_path.name, self.file_size or 0, self.file_digest)
+        manifest.version = session.change()
 
     async def perform_delete(self) -> None:
         """Processes file deletion."""
-        await self.delete_file()
-        await self.ws_manager.send_success_delete(self.file_path.name)
+        async with SessionLock(self.session_dir) as session:
+            manifest = await session_manifests.get(self.file_dir, session.version)
 
-    async def save_file(self) -> AsyncBufferedIOBase | None:
-        """Saves file, checks format and size, sends progress."""
-        current_file_size = 0
+            await self.delete_derivatives()
+            if await self.delete_file():
+                manifest.remove(self.file_path.name)
+                manifest.version = session.change()
 
-        async with aiofiles.open(self.file_path, "wb") as output_file:
+        await self.ws_manager.send_success_delete(self.file_path.name)
+        logger.info(f"Deleted file {self.file_path.name}", extra=self.log_context)
+
+    async def perform_check(self) -> None:
+        """Answers which of the files to upload are already stored, would be rejected or have to be uploaded."""
+        async with SessionLock(self.session_dir) as session:
+            manifest = await session_manifests.get(self.file_dir, session.version)
+
+        results = self.check_files(manifest)
+
+        await self.ws_manager.send_success_check(results)
+        logger.info(f"Checked {len(results)} files", extra=self.log_context)
+
+    def check_files(self, manifest: SessionManifest) -> list[FileCheck]:
+        """Returns the status of each file to upload, the files answered `ready` are checked as stored by the next."""
+        batch = manifest.copy()
+        results: list[FileCheck] = []
+
+        for candidate in self.files:
+            result = self.check_file(candidate, manifest, batch)
+            if result["status"] == WebSocketStatus.READY:
+                batch.add(f"{candidate.file_idx}_{candidate.file_hash or ''}", candidate.file_size, candidate.sha256)
+            results.append(result)
+
+        return results
+
+    def check_file(self, candidate: FileCandidate, manifest: SessionManifest, batch: SessionManifest) -> FileCheck:
+        """Returns the status of the file to upload: stored (with its name), rejected (with the reason) or ready."""
+        file_name = batch.find_content(candidate.sha256)
+        if file_name in manifest.files:
+            return FileCheck(
+                file_idx=candidate.file_idx,
+                status=WebSocketStatus.SUCCESS,
+                message=WebSocketStatusMessage.SUCCESS_UPLOAD,
+                file_name=file_name,
+            )
+
+        try:
+            if file_name is not None:  # answered `ready` earlier in the batch
+                raise ValueError(self.validator.status_msg.UNIQUE_FILE)
+            self.validate_candidate(candidate, batch)
+        except ValueError as e:
+            return FileCheck(file_idx=candidate.file_idx, status=WebSocketStatus.ABORT, message=str(e))
+
+        return FileCheck(
+            file_idx=candidate.file_idx,
+            status=WebSocketStatus.READY,
+            message=WebSocketStatusMessage.READY,
+        )
+
+    async def save_file(self, offset: int = 0) -> BufferedFileWriter | None:
+        """Saves file (appending from the offset when resumed), checks format, dimensions and size, sends progress."""
+        current_file_size = offset
+        receive_time = write_time = 0.0
+        sniffer: DimensionSniffer | None = None
+
+        digest = self.content_store.new_digest()
+
+        # The stored part of a resumed upload is checked like the first chunks
+        if offset:
+            sniffer = await self.sniff_stored(offset)
+
+        async with BufferedFileWriter(self.file_path, offset, self.file_size, digest) as output_file:
             while True:
                 # Receiving chunk from a client
-                chunk = await self.ws.receive_bytes()
+                start = perf_counter()
+                chunk = await self.receive_chunk()
+                receive_time += perf_counter() - start
 
                 if chunk == b"EOF":
                     break
 
+                upload_metrics.received_bytes += len(chunk)
+                self.ws_manager.chunk_advisor.observe(len(chunk))
+
                 # Check a first chunk format
                 if current_file_size == 0:
-                    self.validator.validate_header(chunk[:12])
+                    sniffer = self.validator.create_sniffer(self.validator.validate_header(chunk[:12]))
+
+                # Check image dimensions as soon as the header is received
+                if sniffer is not None and sniffer.feed(chunk):
+                    self.validator.check_dimensions(sniffer.dimensions)
+                    sniffer = None
 
                 # Check file size
                 current_file_size += len(chunk)
-                self.validator.check_size_limits(current_file_size)
+                self.validator.check_size_limits(current_file_size, self.file_size)
 
-                # Sending upload progress
-                await self.ws_manager.send_progress(current_file_size, self.validator.max_size_bytes)
+                # Sending upload progress, relative to the declared size if any
+                await self.ws_manager.send_progress(current_file_size, self.file_size or self.validator.max_size_bytes)
 
                 # Saving chunk
+                start = perf_counter()
                 await output_file.write(chunk)
+                write_time += perf_counter() - start
+
+            start = perf_counter()  # the rest of the buffer is written on exit
+
+        upload_metrics.observe_stage("receive", receive_time, self.timings)
+        upload_metrics.observe_stage("write", write_time + perf_counter() - start, self.timings)
 
         return output_file
 
-    async def delete_file(self) -> None:
-        """Deletes the file"""
-        if not self.file_path.is_file():
-            return
+    async def sniff_stored(self, offset: int) -> DimensionSniffer | None:
+        """Checks the format and dimensions of the stored part of a resumed upload, returns the sniffer to go on."""
+        size = min(offset, self.validator.dimensions_scan_limit + DimensionSniffer.max_read)
+        header = await filesystem.read(self.file_path, size)
+        sniffer = self.validator.create_sniffer(self.validator.validate_header(header[:12]))
+
+        if sniffer is not None and sniffer.feed(header):
+            self.validator.check_dimensions(sniffer.dimensions)
+            sniffer = None
+
+        return sniffer
+
+    async def receive_chunk(self) -> bytes:
+        """Receives the next file chunk."""
+        return await self.ws.receive_bytes()
+
+    async def delete_file(self) -> bool:
+        """Deletes the file (and its blob if no other file references it), returns False if it does not exist."""
+        if not await self.content_store.unlink(self.file_path):
+            return False
 
-        self.file_path.unlink(missing_ok=True)
         await self.cleanup_dirs()
+        return True
 
     @abstractmethod
     async def validate_file(self) -> None:
         """Checks if the file is valid."""
         raise NotImplementedError("Subclasses must implement this method.")
 
+    def validate_stored_files(self, manifest: SessionManifest) -> None:
+        """Checks the file against the files already stored."""
+        self.validator.check_upload_limits(manifest, self.file_idx)
+
+    def validate_candidate(self, candidate: FileCandidate, manifest: SessionManifest) -> None:
+        """Checks the file to upload (by its description) against the limits and the files already stored."""
+        self.validator.check_size_limits(candidate.file_size)
+        self.validator.check_upload_limits(manifest, candidate.file_idx)
+
+    async def create_derivatives(self) -> None:
+        """Queues the stored file for rendering of its variants (none by default)."""
+
+    async def delete_derivatives(self) -> None:
+        """Deletes the variants of the stored file (none by default)."""
+
     async def rename_file(self) -> Path:
-        """Renames the file."""
+        """Moves the uploaded file to the files directory under its final name (as a link to its content blob)."""
         self.file_name = f"{self.file_idx}_{self.file_hash}{self.file_path.suffix}"
-        new_path = self.file_path.with_name(self.file_name)
+        new_path = self.file_dir / self.file_name
 
-        self.file_path.rename(new_path)
+        if self.file_digest is None:
+            await filesystem.rename(self.file_path, new_path)
+        else:
+            await self.content_store.store(self.file_path, self.file_digest, new_path)
         self.file_path = new_path
 
         return new_path
 
     async def cleanup_dirs(self) -> None:
-        """Cleans up the directories if they are empty."""
-        if not any(self.file_dir.iterdir()):  # files dir
-            self.file_dir.rmdir()
-
-        if not any(self.file_dir.parent.iterdir()):  # session dir
-            self.file_dir.parent.rmdir()
-
-        if not any(self.file_dir.parent.parent.iterdir()):  # user dir
-            self.file_dir.parent.parent.rmdir()
+        """
+        Cleans up the directories if they are empty (the files dir is kept while uploads are in progress).
+        The session dir keeps the session lock file, it is removed by the storage sweeps under the lock.
+        """
+        await filesystem.remove_empty_dirs(
+            self.partial_dir,  # partial files dir
+            self.file_dir,  # files dir
+        )
@@ -1,7 +1,10 @@
-from imagehash import ImageHash, dhash
-from PIL import Image
+from functools import partial
 
+from api.schemas import FileCandidate
 from core.config.image import image_settings
+from services.content import ContentStore
+from services.derivatives import derivative_pipeline
+from services.manifest import SessionManifest
 from validators import ImageFileValidator
 
 from .base import BaseFileManager
@@ -11,19 +14,33 @@ class ImageFileManager(BaseFileManager):
 
     base_dir = image_settings.BASE_DIR
     validator = ImageFileValidator()
-
-    async def generate_image_hash(self) -> ImageHash:
-        """Generates a hash for the file."""
-        return dhash(Image.open(self.file_path))
+    content_store = ContentStore(base_dir)
 
     async def validate_file(self) -> None:
         """Checks if the file is valid."""
-        # Check if the file is an image_uploader
-        await self.validator.validate_image(self.file_path)
+        # Check if the file is an image_uploader and generate its hash outside the event loop
+        self.file_hash = await self.validator.validate_image(self.file_path)
 
+    def validate_stored_files(self, manifest: SessionManifest) -> None:
+        """Checks the file against the files already stored."""
         # Check if the file is unique
-        self.file_hash = await self.generate_image_hash()
-        await self.validator.validate_unique(self.file_path, self.file_idx, self.file_hash)
+        self.validator.validate_unique(manifest, self.file_idx, self.file_hash)
 
         # Check upload limits
-        self.validator.check_upload_limits(self.file_dir)
+        super().validate_stored_files(manifest)
+
+    def validate_candidate(self, candidate: FileCandidate, manifest: SessionManifest) -> None:
+        """Checks the file to upload (by its description) against the limits and the files already stored."""
+        # Check if the file is unique, if the client computed its hash
+        if candidate.file_hash is not None:
+            self.validator.validate_unique(manifest, candidate.file_idx, candidate.file_hash)
+
+        super().validate_candidate(candidate, manifest)
+
+    async def create_derivatives(self) -> None:
+        """Queues the stored image for rendering of its variants, waits if too many images are queued."""
+        await derivative_pipeline.submit(self.file_path, partial(self.ws_manager.send_variant, self.file_path.name))
+
+    async def delete_derivatives(self) -> None:
+        """Deletes the variants of the stored image."""
+        await derivative_pipeline.remove(self.file_path)
@@ -0,0 +1,188 @@
+from asyncio import CancelledError, Queue, QueueFull, Task, create_task
+from contextlib import suppress
+from logging import getLogger
+from struct import Struct
+from time import time
+
+from pydantic import ValidationError
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from api.schemas import UploadData
+from core.config.upload import upload_settings
+from enums import FileStatusMessage
+
+from .image import ImageFileManager
+from .websocket import StreamWebSocketManager, WebSocketManager
+
+logger = getLogger("uvicorn.error")
+
+
+class ImageStreamManager(ImageFileManager):
+    """Processes one file of a multiplexed connection, its chunks are pushed by `MultiplexFileManager`."""
+
+    __slots__ = (
+        "chunks",
+        "receiving",
+    )
+
+    def __init__(self, websocket: WebSocket, connection: WebSocketManager, file_idx: int) -> None:
+        super().__init__(websocket, StreamWebSocketManager(websocket, connection, file_idx))
+        self.chunks: Queue[bytes] = Queue(self.upload_settings.MULTIPLEX_QUEUE_SIZE)
+        self.receiving = True
+
+    async def run(self, data: UploadData) -> None:
+        """Performs the action of the stream."""
+        try:
+            await self.process_action(data)
+
+        except ValueError as e:
+            self.receiving = False
+            await self.abort(e)
+
+        except Exception:
+            logger.exception(
+                f"[Action: '{self.action}'] | "
+                f"[file_name: {self.file_name}] | "
+                f"[user_id: {self.user_id}] | "
+                f"[session_id: {self.session_id}]",
+                extra=self.log_context,
+            )
+            self.receiving = False
+            await self.ws_manager.send_error()
+            await self.delete_file()
+
+        finally:
+            self.receiving = False
+
+    async def receive_chunk(self) -> bytes:
+        """Receives the next file chunk from the stream queue."""
+        chunk = await self.chunks.get()
+
+        if chunk == b"EOF":
+            self.receiving = False
+
+        return chunk
+
+
+class MultiplexFileManager:
+    """
+    Receives several files at once over one WebSocket.
+
+    Text frames carry the actions (`UploadData`), binary frames carry file
+    chunks prefixed with a 4-byte big-endian `file_idx` header. A chunk
+    with the `EOF` payload completes the file. Every status message has the
+    `file_idx` of its file, so files can be uploaded and validated in parallel.
+    """
+
+    header = Struct(">I")
+    settings = upload_settings
+    status_msg = FileStatusMessage
+    stream_class = ImageStreamManager
+
+    __slots__ = (
+        "ws",
+        "ws_manager",
+        "streams",
+        "tasks",
+    )
+
+    def __init__(self, websocket: WebSocket) -> None:
+        self.ws_manager = WebSocketManager(websocket)
+        self.ws = websocket
+
+        self.streams: dict[int, ImageStreamManager] = {}
+        self.tasks: dict[int, Task] = {}
+
+    async def handle_action(self) -> None:
+        """Dispatches received frames to the streams."""
+        try:
+            while True:
+                message = await self.ws.receive()
+                self.ws_manager.last_activity_time = time()
+
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+
+                if message.get("bytes") is not None:
+                    await self.dispatch_chunk(message["bytes"])
+                else:
+                    await self.open_stream(message.get("text") or "")
+
+        except WebSocketDisconnect:
+            await self.handle_disconnect()
+
+        except Exception as e:
+            logger.exception("Multiplexed connection failed")
+            await self.handle_disconnect()
+            with suppress(RuntimeError):
+                await self.ws.close(reason=str(e))
+
+    async def open_stream(self, text: str) -> None:
+        """Starts processing the action of a file in the background."""
+        try:
+            data = UploadData.model_validate_json(text)
+        except ValidationError as e:
+            await self.ws_manager.send_abort(str(e))
+            return
+
+        if data.file_idx in self.streams:
+            return await self.reject_stream(data.file_idx, self.status_msg.STREAM_IN_PROGRESS)
+
+        if len(self.streams) >= self.settings.MULTIPLEX_MAX_STREAMS:
+            return await self.reject_stream(data.file_idx, self.status_msg.TOO_MANY_STREAMS)
+
+        stream = self.stream_class(self.ws, self.ws_manager, data.file_idx)
+        self.streams[data.file_idx] = stream
+        task = self.tasks[data.file_idx] = create_task(stream.run(data))
+        task.add_done_callback(lambda _: self.close_stream(data.file_idx, stream))
+
+    async def reject_stream(self, file_idx: int, reason: str) -> None:
+        """Aborts the action of a file that cannot be processed now."""
+        await StreamWebSocketManager(self.ws, self.ws_manager, file_idx).send_abort(reason)
+
+    def close_stream(self, file_idx: int, stream: ImageStreamManager) -> None:
+        """Forgets the finished stream."""
+        if self.streams.get(file_idx) is stream:
+            del self.streams[file_idx]
+            del self.tasks[file_idx]
+
+    async def dispatch_chunk(self, frame: bytes) -> None:
+        """
+        Pushes the chunk to its stream, chunks of unknown or finished streams are dropped. The reader never
+        waits for a stream, a stream whose queue is full is aborted so that the other streams go on.
+        """
+        if len(frame) < self.header.size:
+            return
+
+        offset = self.header.size
+        (file_idx,) = self.header.unpack_from(frame)
+        stream = self.streams.get(file_idx)
+
+        if stream is None or not stream.receiving:
+            return
+
+        try:
+            stream.chunks.put_nowait(frame[offset:])
+        except QueueFull:
+            await self.abort_stream(file_idx, stream)
+
+    async def abort_stream(self, file_idx: int, stream: ImageStreamManager) -> None:
+        """Interrupts the stream that does not keep up with its chunks, its file is kept to resume (if enabled)."""
+        stream.receiving = False
+        await self.interrupt_stream(file_idx, stream)
+        await stream.ws_manager.send_abort(self.status_msg.STREAM_OVERFLOW)
+
+    async def interrupt_stream(self, file_idx: int, stream: ImageStreamManager) -> None:
+        """Cancels the stream task and keeps (to resume) or deletes the file being uploaded."""
+        task = self.tasks[file_idx]
+        task.cancel()
+        with suppress(CancelledError):
+            await task
+        await stream.handle_disconnect()
+
+    async def handle_disconnect(self) -> None:
+        """Stops the timeout and interrupts the streams in progress."""
+        self.ws_manager.stop_timeout()
+
+        for file_idx, stream in list(self.streams.items()):
+            await self.interrupt_stream(file_idx, stream)
@@ -1,37 +1,108 @@
-from asyncio import create_task, sleep
 from contextlib import suppress
-from functools import wraps
+from functools import lru_cache, wraps
 from time import time
 from typing import Any, Callable, TypeVar
 
 from starlette.exceptions import WebSocketException
-from starlette.websockets import WebSocket
+from starlette.websockets import WebSocket, WebSocketDisconnect
 
-from api.schemas import ProgressStatus
+from api.schemas import FileCheck, ProgressStatus
 from core.config.websocket import websocket_settings
-from enums import WebSocketStatus, WebSocketStatusMessage
+from enums import FileStatusMessage, WebSocketStatus, WebSocketStatusMessage
+from services.codec import JSONCodec, json_codec
+from services.metrics import upload_metrics
+from services.throughput import ChunkAdvisor
+from services.timeout import timeout_scheduler
 
 T = TypeVar("T", bound=Callable[..., Any])
 
 
+class StatusFrames:
+    """
+    Status messages that are the same for every upload, encoded once and sent as they are.
+
+    The fields of the tag (e.g. the `file_idx` of a multiplexed file) are
+    added to every message.
+    """
+
+    __slots__ = (
+        "codec",
+        "tag",
+        "uploading",
+        "_ready",
+        "_messages",
+    )
+
+    def __init__(self, codec: JSONCodec, tag: ProgressStatus | None = None) -> None:
+        self.codec = codec
+        self.tag = tag
+        self._ready: dict[int, str] = {}  # by the suggested chunk size, a power of two
+        self.uploading = tuple(
+            self.encode(
+                ProgressStatus(
+                    status=WebSocketStatus.UPLOADING, message=WebSocketStatusMessage.UPLOADING, progress=progress
+                )
+            )
+            for progress in range(101)
+        )
+        self._messages: dict[tuple[str, str], str] = {
+            (status, message): self.encode(ProgressStatus(status=status, message=message))
+            for status in (WebSocketStatus.ERROR, WebSocketStatus.ABORT, WebSocketStatus.TIMEOUT)
+            for message in (*WebSocketStatusMessage, *FileStatusMessage)
+        }
+
+    def ready(self, chunk_size: int) -> str:
+        """Returns the frame of the ready status with the suggested chunk size, encoded on first use."""
+        frame = self._ready.get(chunk_size)
+        if frame is None:
+            frame = self._ready[chunk_size] = self.encode(
+                ProgressStatus(
+                    status=WebSocketStatus.READY,
+                    message=WebSocketStatusMessage.READY,
+                    progress=0,
+                    offset=0,
+                    chunk_size=chunk_size,
+                )
+            )
+        return frame
+
+    def message(self, status: str, message: str) -> str:
+        """Returns the frame of the status with the message, pre-encoded if the message is a known one."""
+        frame = self._messages.get((status, message))
+        return frame if frame is not None else self.encode(ProgressStatus(status=status, message=message))
+
+    def encode(self, data: ProgressStatus) -> str:
+        """Encodes the status message with the fields of the tag."""
+        return self.codec.encode({**data, **self.tag} if self.tag else data)
+
+
 class WebSocketManager:
 
     status = WebSocketStatus
     status_msg = WebSocketStatusMessage
     settings = websocket_settings
+    codec = json_codec
+    frames = StatusFrames(json_codec)
 
     __slots__ = (
         "_ws",
         "state",
         "last_activity_time",
-        "timeout_task",
+        "last_progress",
+        "last_progress_time",
+        "chunk_advisor",
+        "chunk_size",
     )
 
     def __init__(self, websocket: WebSocket):
         self._ws = websocket
         self.state = self.status.READY
         self.last_activity_time = time()
-        self.timeout_task = create_task(self._set_timeout())
+        self.last_progress = 0
+        self.last_progress_time = 0.0
+        self.chunk_advisor = ChunkAdvisor()
+        self.chunk_size = self.chunk_advisor.chunk_size  # last suggested to the client
+        self.start_timeout()
 
     @staticmethod
     def last_activity(func: T) -> T:
@@ -42,27 +113,68 @@ class WebSocketManager:
 
         return wrapper  # type: ignore
 
+    async def send(self, data: ProgressStatus) -> None:
+        """Sending a status message."""
+        await self.send_frame(self.frames.encode(data))
+
+    async def send_frame(self, frame: str) -> None:
+        """Sending an encoded status message."""
+        await self._ws.send_text(frame)
+
     @last_activity
-    async def send_ready(self) -> None:
-        """Sending a ready message."""
-        data = ProgressStatus(
-            status=self.status.READY,
-            message=self.status_msg.READY,
-            progress=0,
-        )
-        await self._ws.send_json(data)
+    async def send_ready(self, offset: int = 0) -> None:
+        """Sending a ready message with the number of bytes already received and the suggested chunk size."""
+        self.chunk_size = self.chunk_advisor.chunk_size
+
+        if not offset:
+            await self.send_frame(self.frames.ready(self.chunk_size))
+        else:
+            data = ProgressStatus(
+                status=self.status.READY,
+                message=self.status_msg.READY,
+                progress=0,
+                offset=offset,
+                chunk_size=self.chunk_size,
+            )
+            await self.send(data)
+
+        self.chunk_advisor.ready()
         self.state = self.status.READY
 
     @last_activity
     async def send_progress(self, current_size: int, max_size: int) -> None:
-        """Sending the progress of the file upload."""
+        """Sending the progress of the file upload (throttled), with the chunk size if its suggestion changed."""
+        progress = min(100, round(current_size / max_size * 100))
+
+        if not self._is_progress_due(progress):
+            return
+
+        if self.chunk_advisor.chunk_size == self.chunk_size:
+            await self.send_frame(self.frames.uploading[progress])
+        else:
+            self.chunk_size = self.chunk_advisor.chunk_size
+            data = ProgressStatus(
+                status=self.status.UPLOADING,
+                message=self.status_msg.UPLOADING,
+                progress=progress,
+                chunk_size=self.chunk_size,
+            )
+            await self.send(data)
+
+        self.state = self.status.UPLOADING
+        self.last_progress = progress
+        self.last_progress_time = self.last_activity_time
+
+    @last_activity
+    async def send_busy(self, retry_after: int) -> None:
+        """Sending a busy message, the action can be retried after `retry_after` ms."""
         data = ProgressStatus(
-            status=self.status.UPLOADING,
-            message=self.status_msg.UPLOADING,
-            progress=min(100, round(current_size / max_size * 100)),
+            status=self.status.BUSY,
+            message=self.status_msg.BUSY,
+            retry_after=retry_after,
         )
-        await self._ws.send_json(data)
-        self.state = self.status.UPLOADING
+        await self.send(data)
+        self.state = self.status.BUSY
 
     @last_activity
     async def send_success_upload(self, file_name: str) -> None:
@@ -73,7 +185,7 @@ class WebSocketManager:
             file_name=file_name,
             progress=100,
         )
-        await self._ws.send_json(data)
+        await self.send(data)
         self.state = self.status.SUCCESS
 
     @last_activity
@@ -84,46 +196,102 @@ class WebSocketManager:
             message=self.status_msg.SUCCESS_DELETE,
             file_name=file_name,
         )
-        await self._ws.send_json(data)
+        await self.send(data)
         self.state = self.status.SUCCESS
 
     @last_activity
-    async def send_error(self, reason: str | None = None) -> None:
-        """Sending an error message."""
+    async def send_success_check(self, files: list[FileCheck]) -> None:
+        """Sending the results of the check of the files to upload."""
+        data = ProgressStatus(
+            status=self.status.SUCCESS,
+            message=self.status_msg.SUCCESS_CHECK,
+            files=files,
+        )
+        await self.send(data)
+        self.state = self.status.SUCCESS
+
+    async def send_variant(self, file_name: str, variant: str, ready: bool) -> None:
+        """Sending the readiness of a variant of the stored file (in the background, the connection may be closed)."""
         data = ProgressStatus(
-            status=self.status.ERROR,
-            message=reason if reason else self.status_msg.ERROR,
+            status=self.status.VARIANT,
+            message=self.status_msg.VARIANT_READY if ready else self.status_msg.VARIANT_FAILED,
+            file_name=file_name,
+            variant=variant,
         )
-        await self._ws.send_json(data)
+        with suppress(WebSocketDisconnect, RuntimeError, OSError):
+            await self.send(data)
+
+    @last_activity
+    async def send_error(self, reason: str | None = None) -> None:
+        """Sending an error message."""
+        message = reason if reason else self.status_msg.ERROR
+        await self.send_frame(self.frames.message(self.status.ERROR, message))
         self.state = self.status.ERROR
+        upload_metrics.count_status(self.status.ERROR, message)
 
     @last_activity
     async def send_abort(self, reason: str | None = None) -> None:
         """Aborts the file upload with deletion."""
-        data = ProgressStatus(
-            status=self.status.ABORT,
-            message=reason if reason else self.status_msg.ABORT,
-        )
-        await self._ws.send_json(data)
+        message = reason if reason else self.status_msg.ABORT
+        await self.send_frame(self.frames.message(self.status.ABORT, message))
         self.state = self.status.ABORT
+        upload_metrics.count_status(self.status.ABORT, message)
+
+    def start_timeout(self) -> None:
+        """Starts tracking the inactivity of the connection."""
+        timeout_scheduler.register(self)
+
+    def stop_timeout(self) -> None:
+        """Stops tracking the inactivity of the connection."""
+        timeout_scheduler.unregister(self)
 
     async def disconnect_by_timeout(self) -> None:
         """Disconnects the client by timeout."""
-        self.timeout_task.cancel()
+        self.stop_timeout()
+        upload_metrics.count_status(self.status.TIMEOUT, self.status_msg.TIMEOUT)
+
         with suppress(WebSocketException, RuntimeError):
-            data = ProgressStatus(
-                status=self.status.TIMEOUT,
-                message=self.status_msg.TIMEOUT,
-            )
-            await self._ws.send_json(data)
+            await self.send_frame(self.frames.message(self.status.TIMEOUT, self.status_msg.TIMEOUT))
             await self._ws.close()
 
-    async def _set_timeout(self) -> None:
-        """Check for inactivity and close the connection after a timeout"""
-        while True:
-            await sleep(self.settings.DELAY)
-            elapsed_time = round(time() - self.last_activity_time)
+    def _is_progress_due(self, progress: int) -> bool:
+        """Checks if the progress should be sent: on a status change, at 100% or after a step and an interval."""
+        if self.state != self.status.UPLOADING:
+            return True
+
+        if progress >= 100:
+            return self.last_progress < 100
+
+        step_passed = progress - self.last_progress >= self.settings.PROGRESS_STEP
+        interval_passed = self.last_activity_time - self.last_progress_time >= self.settings.PROGRESS_INTERVAL
+        return step_passed and interval_passed
+
+
+class StreamWebSocketManager(WebSocketManager):
+    """Status messages of one file of a multiplexed connection, tagged with its `file_idx`."""
+
+    __slots__ = (
+        "connection",
+        "file_idx",
+        "frames",
+    )
+
+    def __init__(self, websocket: WebSocket, connection: WebSocketManager, file_idx: int) -> None:
+        self.connection = connection
+        self.file_idx = file_idx
+        self.frames = self.tagged_frames(file_idx)
+        super().__init__(websocket)
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def tagged_frames(file_idx: int) -> StatusFrames:
+        """Returns the status messages tagged with the file index, encoded once per index."""
+        return StatusFrames(json_codec, ProgressStatus(file_idx=file_idx))
+
+    async def send_frame(self, frame: str) -> None:
+        """Sending a status message (tagged with the file index), which is also an activity of the connection."""
+        self.connection.last_activity_time = self.last_activity_time
+        await super().send_frame(frame)
 
-            if elapsed_time >= self.settings.TIMEOUT:
-                await self.disconnect_by_timeout()
-                break
+    def start_timeout(self) -> None:
+        """The inactivity is tracked by the connection."""
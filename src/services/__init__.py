@@ -0,0 +1,5 @@
+from .admission import AdmissionController as AdmissionController
+from .executor import CPUExecutor as CPUExecutor
+from .filesystem import AsyncFileSystem as AsyncFileSystem
+from .locks import SessionLock as SessionLock
+from .metrics import Histogram as Histogram
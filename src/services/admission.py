@@ -0,0 +1,92 @@
+from asyncio import Event, wait_for
+from collections import Counter
+from contextlib import suppress
+from random import uniform
+
+from core.config.upload import upload_settings
+
+from .executor import cpu_executor
+
+
+class AdmissionController:
+    """
+    Limits the uploads a worker processes at once.
+
+    An admitted upload reserves its declared size (or the maximum file size)
+    of the in-flight byte budget until it ends. New uploads are rejected
+    while the active uploads, the reserved bytes or the pending CPU jobs
+    are at their caps. A single upload is always admitted on an idle worker.
+    While the worker drains before shutdown, every new upload is rejected.
+    """
+
+    settings = upload_settings
+
+    __slots__ = (
+        "active_uploads",
+        "inflight_bytes",
+        "decisions",
+        "draining",
+        "_idle",
+    )
+
+    def __init__(self) -> None:
+        self.active_uploads = 0
+        self.inflight_bytes = 0
+        self.decisions: Counter[tuple[str, str]] = Counter()
+        self.draining = False
+
+        self._idle = Event()
+        self._idle.set()
+
+    @property
+    def retry_after(self) -> int:
+        """Returns the delay before a retry (ms), with jitter so that rejected clients do not retry at once."""
+        return round(self.settings.BUSY_RETRY_AFTER * uniform(1.0, 1.5))
+
+    def admit(self, size: int) -> bool:
+        """Reserves an upload slot and `size` in-flight bytes, returns False if a cap is reached."""
+        reason = self.check_caps(size)
+
+        if reason is not None:
+            self.decisions["rejected", reason] += 1
+            return False
+
+        self.decisions["admitted", ""] += 1
+        self.active_uploads += 1
+        self.inflight_bytes += size
+        self._idle.clear()
+        return True
+
+    def release(self, size: int) -> None:
+        """Releases the upload slot and the in-flight bytes of an admitted upload."""
+        self.active_uploads -= 1
+        self.inflight_bytes -= size
+
+        if not self.active_uploads:
+            self._idle.set()
+
+    def check_caps(self, size: int) -> str | None:
+        """
+        Returns the reached cap (uploads, bytes or cpu) or None, `draining` while the worker shuts down.
+        A negative size is refused as `size`: it would lower the reserved bytes of the other uploads.
+        """
+        caps = (
+            ("size", size < 0),
+            ("draining", self.draining),
+            ("uploads", 0 < self.settings.MAX_ACTIVE_UPLOADS <= self.active_uploads),
+            ("bytes", self.active_uploads and 0 < self.settings.MAX_INFLIGHT_BYTES < self.inflight_bytes + size),
+            ("cpu", 0 < self.settings.MAX_PENDING_CPU_JOBS <= cpu_executor.pending - cpu_executor.background),
+        )
+        return next((cap for cap, reached in caps if reached), None)
+
+    async def drain(self, timeout: float) -> bool:
+        """Stops admitting uploads and waits for the active ones, returns False if some are still active."""
+        self.draining = True
+
+        with suppress(TimeoutError):
+            await wait_for(self._idle.wait(), timeout)
+
+        return not self.active_uploads
+
+
+admission_controller = AdmissionController()
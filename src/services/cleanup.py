@@ -0,0 +1,269 @@
+import fcntl
+import os
+from asyncio import Queue, Task, create_task, gather, sleep
+from contextlib import suppress
+from itertools import islice
+from logging import getLogger
+from pathlib import Path
+from time import perf_counter, time
+from typing import AsyncIterator, Iterator
+
+from core.config.image import image_settings
+from core.config.upload import upload_settings
+
+from .content import ContentStore
+from .filesystem import filesystem
+from .locks import SessionLock
+
+logger = getLogger("uvicorn.error")
+
+
+class SessionCollector:
+    """
+    Periodically sweeps the storage: deletes the partial files of interrupted
+    uploads that were not resumed in time and prunes the session trees left
+    empty (`{user_id}/{session_id}/...` with nothing but empty directories
+    and the session lock file, removed under the session lock). The content
+    blobs without references are deleted too (see `ContentStore`).
+
+    The directories are read by `os.scandir` in batches of `GC_BATCH_SIZE`
+    entries and at most `GC_CONCURRENCY` sessions are swept at once, every
+    call in the I/O executor. Only one worker (or container) sweeps the
+    storage at a time, see `try_lock`.
+    """
+
+    settings = upload_settings
+    lock_file_name = ".gc.lock"
+
+    __slots__ = (
+        "base_dir",
+        "content_store",
+        "deleted_files",
+        "reclaimed_bytes",
+        "removed_dirs",
+        "last_duration",
+        "_task",
+    )
+
+    def __init__(self, base_dir: Path) -> None:
+        self.base_dir = base_dir
+        self.content_store = ContentStore(base_dir)
+        self.deleted_files = 0
+        self.reclaimed_bytes = 0
+        self.removed_dirs = 0
+        self.last_duration = 0.0  # seconds of the last sweep
+        self._task: Task | None = None
+
+    @property
+    def max_age(self) -> int:
+        """Returns the age of expired partial files (never less than the collection interval)."""
+        return max(self.settings.RESUME_TTL, self.settings.GC_INTERVAL)
+
+    @staticmethod
+    def read_batch(it: Iterator[os.DirEntry[str]], size: int) -> list[os.DirEntry[str]]:
+        """Reads the next entries of the directory (blocking)."""
+        return list(islice(it, size))
+
+    @staticmethod
+    def find_expired(directory: Path, expired: float) -> list[Path]:
+        """Returns the files of the directory modified before the time (blocking)."""
+        paths = []
+
+        with suppress(FileNotFoundError), os.scandir(directory) as it:
+            for entry in it:
+                with suppress(FileNotFoundError):
+                    if entry.stat(follow_symlinks=False).st_mtime < expired:
+                        paths.append(Path(entry.path))
+
+        return paths
+
+    @staticmethod
+    def delete_expired(paths: list[Path], expired: float) -> tuple[int, int]:
+        """Deletes the files still modified before the time (blocking), returns their count and size."""
+        deleted = reclaimed = 0
+
+        for path in paths:
+            with suppress(FileNotFoundError):
+                stat = os.stat(path)
+                if stat.st_mtime < expired:
+                    os.unlink(path)
+                    deleted += 1
+                    reclaimed += stat.st_size
+
+        return deleted, reclaimed
+
+    @staticmethod
+    def find_empty_dirs(session_dir: Path, expired: float) -> list[Path] | None:
+        """
+        Returns the subdirectories of the session if all of them are empty and the session holds nothing else
+        but the lock file, None if the session is in use (blocking).
+        """
+        empty_dirs = []
+
+        with os.scandir(session_dir) as it:
+            for entry in it:
+                if entry.name == SessionLock.file_name:
+                    continue
+                # A recently modified directory may be in use by a starting upload
+                if not entry.is_dir(follow_symlinks=False) or entry.stat().st_mtime >= expired:
+                    return None
+                with os.scandir(entry.path) as children:
+                    if next(children, None) is not None:
+                        return None
+                empty_dirs.append(Path(entry.path))
+
+        return empty_dirs
+
+    @classmethod
+    def find_prunable_dirs(cls, session_dir: Path, expired: float) -> list[Path] | None:
+        """Returns the empty directories of the session if it can be pruned, None otherwise (blocking)."""
+        with suppress(FileNotFoundError):
+            if os.stat(session_dir).st_mtime < expired:
+                return cls.find_empty_dirs(session_dir, expired)
+
+        return None
+
+    def try_lock(self) -> int | None:
+        """Locks the storage for this sweep, returns the lock descriptor or None if it is swept by another worker."""
+        try:
+            fd = os.open(self.base_dir / self.lock_file_name, os.O_RDWR | os.O_CREAT, 0o644)
+        except FileNotFoundError:
+            return None
+
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    def start(self) -> None:
+        """Starts the collection task."""
+        if self._task is None:
+            self._task = create_task(self._run())
+
+    def stop(self) -> None:
+        """Stops the collection task."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def scan_dirs(self, directory: Path) -> AsyncIterator[Path]:
+        """Yields the subdirectories of the directory (but the hidden ones), read in batches in the I/O executor."""
+        try:
+            it = await filesystem.run("scandir", os.scandir, directory)
+        except FileNotFoundError:
+            return
+
+        try:
+            while batch := await filesystem.run("scandir", self.read_batch, it, self.settings.GC_BATCH_SIZE):
+                for entry in batch:
+                    if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False):
+                        yield Path(entry.path)
+        finally:
+            it.close()
+
+    async def sweep(self, sessions: Queue[Path | None], expired: float) -> None:
+        """Sweeps the queued sessions until the end of the queue."""
+        while (session_dir := await sessions.get()) is not None:
+            try:
+                await self.sweep_session(session_dir, expired)
+            except (OSError, ValueError) as e:  # ValueError if the session stays locked
+                logger.warning(f"Failed to sweep the session {session_dir}: {e}")
+
+    async def sweep_session(self, session_dir: Path, expired: float) -> None:
+        """Deletes the expired partial files of the session, then prunes the session if it is left empty."""
+        await self.delete_partial_files(session_dir, expired)
+
+        if await filesystem.run("gc", self.find_prunable_dirs, session_dir, expired) is not None:
+            await self.prune_session(session_dir, expired)
+
+    async def delete_partial_files(self, session_dir: Path, expired: float) -> None:
+        """
+        Deletes the expired partial files of the session. They are checked again under the session lock, an upload
+        claims a partial file under the lock too (see `BufferedFileWriter.claim`).
+        """
+        paths = await filesystem.run("gc", self.find_expired, session_dir / self.settings.PARTIAL_DIR, expired)
+        if not paths:
+            return
+
+        async with SessionLock(session_dir):
+            deleted, reclaimed = await filesystem.run("gc", self.delete_expired, paths, expired)
+
+        self.deleted_files += deleted
+        self.reclaimed_bytes += reclaimed
+
+    async def prune_session(self, session_dir: Path, expired: float) -> None:
+        """
+        Removes the empty session tree with its lock file. It is checked again under the session lock, a lock file
+        deleted by a worker that does not hold it would let two workers lock the session at once.
+        """
+        async with SessionLock(session_dir):
+            empty_dirs = await filesystem.run("gc", self.find_prunable_dirs, session_dir, expired)
+            if empty_dirs is not None:
+                self.removed_dirs += await filesystem.remove_empty_dirs(
+                    *empty_dirs,
+                    session_dir,
+                    session_dir.parent,  # user dir
+                    ignored=frozenset({SessionLock.file_name}),
+                )
+
+    async def collect(self) -> None:
+        """Sweeps all the sessions and content blobs of the storage."""
+        expired = time() - self.max_age
+        concurrency = self.settings.GC_CONCURRENCY
+        sessions: Queue[Path | None] = Queue(self.settings.GC_BATCH_SIZE)
+        sweepers = [create_task(self.sweep(sessions, expired)) for _ in range(concurrency)]
+
+        try:
+            async for user_dir in self.scan_dirs(self.base_dir):
+                async for session_dir in self.scan_dirs(user_dir):
+                    await sessions.put(session_dir)
+
+            for _ in range(concurrency):
+                await sessions.put(None)
+            await gather(*sweepers)
+        finally:
+            for sweeper in sweepers:
+                sweeper.cancel()
+
+        async for blob_dir in self.scan_dirs(self.content_store.blob_dir):
+            deleted, reclaimed = await filesystem.run("gc", self.content_store.delete_orphans, blob_dir, expired)
+            self.deleted_files += deleted
+            self.reclaimed_bytes += reclaimed
+
+    async def _run(self) -> None:
+        while True:
+            await sleep(self.settings.GC_INTERVAL)
+            try:
+                await self._collect_locked()
+            except Exception:
+                logger.exception("Failed to sweep the storage")
+
+    async def _collect_locked(self) -> None:
+        """Sweeps the storage unless another worker does it, logs the reclaimed files, bytes and dirs."""
+        if (fd := await filesystem.run("gc", self.try_lock)) is None:
+            return
+
+        deleted, reclaimed, removed = self.deleted_files, self.reclaimed_bytes, self.removed_dirs
+        start = perf_counter()
+        try:
+            await self.collect()
+        finally:
+            self.last_duration = perf_counter() - start
+            await filesystem.run("gc", os.close, fd)
+
+        deleted, reclaimed, removed = (
+            self.deleted_files - deleted,
+            self.reclaimed_bytes - reclaimed,
+            self.removed_dirs - removed,
+        )
+        log = logger.info if deleted or removed else logger.debug
+        log(
+            f"Storage swept in {self.last_duration:.2f}s: "
+            f"deleted {deleted} expired partial files and orphan blobs ({reclaimed} bytes), "
+            f"removed {removed} empty directories"
+        )
+
+
+session_collector = SessionCollector(image_settings.BASE_DIR)
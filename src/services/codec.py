@@ -0,0 +1,33 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library is used without it
+    orjson = None  # type: ignore[assignment]
+
+
+class JSONCodec:
+    """Encodes the status messages with orjson if it is installed, otherwise with the standard library."""
+
+    __slots__ = ("name",)
+
+    def __init__(self) -> None:
+        self.name = "orjson" if orjson is not None else "json"
+
+    @staticmethod
+    def encode_std(data: Any) -> str:
+        """Encodes the data as compact JSON, the same way as `WebSocket.send_json`."""
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+    @staticmethod
+    def encode_orjson(data: Any) -> str:
+        """Encodes the data as compact JSON with orjson."""
+        return orjson.dumps(data).decode()
+
+    def encode(self, data: Any) -> str:
+        """Encodes the data as compact JSON text."""
+        return self.encode_orjson(data) if orjson is not None else self.encode_std(data)
+
+
+json_codec = JSONCodec()
@@ -0,0 +1,160 @@
+import hashlib
+import os
+from contextlib import suppress
+from pathlib import Path
+
+from core.config.upload import upload_settings
+
+from .filesystem import filesystem
+
+
+class ContentStore:
+    """
+    Stores the uploaded files once per content (SHA-256 digest).
+
+    With `CONTENT_STORE` enabled, the first upload of some content becomes
+    the blob `{CONTENT_STORE_DIR}/{digest[:2]}/{digest}` under the base
+    directory and every stored file with the same content is a hard link to
+    it, so the link count of the blob is the number of references (plus
+    one). The digest is recorded in an extended attribute of the blob, which
+    its links share, so deleting a file finds its blob without reading it.
+    When the last reference is deleted the blob is deleted too, the blobs
+    left without references by a crash are deleted by the storage sweeps
+    (see `SessionCollector`). Without it, the files are only moved with
+    their digest recorded, which the session manifests read.
+
+    A blob deleted while another upload links to it loses no data, the
+    other file keeps the content and only the deduplication of later
+    uploads of that content is lost.
+    """
+
+    settings = upload_settings
+    read_size = 1024 * 1024
+    digest_attribute = "user.content.sha256"
+
+    __slots__ = ("blob_dir",)
+
+    def __init__(self, base_dir: Path) -> None:
+        self.blob_dir = base_dir / self.settings.CONTENT_STORE_DIR
+
+    @property
+    def enabled(self) -> bool:
+        """Returns True if the uploaded files are stored by content."""
+        return self.settings.CONTENT_STORE
+
+    @staticmethod
+    def delete_orphans(directory: Path, expired: float) -> tuple[int, int]:
+        """Deletes the blobs of the directory without references modified before the time (blocking)."""
+        deleted = reclaimed = 0
+
+        with suppress(FileNotFoundError), os.scandir(directory) as it:
+            for entry in it:
+                with suppress(FileNotFoundError):
+                    stat = entry.stat(follow_symlinks=False)
+                    if stat.st_nlink == 1 and stat.st_mtime < expired:
+                        os.unlink(entry.path)
+                        deleted += 1
+                        reclaimed += stat.st_size
+
+        return deleted, reclaimed
+
+    @staticmethod
+    def new_digest() -> "hashlib._Hash":
+        """Returns the digest to compute while the file is written."""
+        return hashlib.sha256()
+
+    @classmethod
+    def hash_file(cls, path: Path, digest: "hashlib._Hash", size: int | None = None) -> "hashlib._Hash":
+        """Updates the digest with the first `size` bytes of the file, the whole file by default (blocking)."""
+        with open(path, "rb", buffering=0) as file:
+            remaining = size
+            while remaining is None or remaining > 0:
+                block = file.read(cls.read_size if remaining is None else min(cls.read_size, remaining))
+                if not block:
+                    break
+                digest.update(block)
+                if remaining is not None:
+                    remaining -= len(block)
+        return digest
+
+    @classmethod
+    def read_digest(cls, path: Path) -> str:
+        """Returns the digest recorded when the content was stored, hashes the file if there is none (blocking)."""
+        return cls.recorded_digest(path) or cls.hash_file(path, hashlib.sha256()).hexdigest()
+
+    @classmethod
+    def record_digest(cls, path: Path, digest: str) -> None:
+        """Records the digest of the content in an extended attribute of the file, if supported (blocking)."""
+        with suppress(AttributeError, OSError):  # read by hashing the file then
+            os.setxattr(path, cls.digest_attribute, digest.encode())
+
+    @classmethod
+    def recorded_digest(cls, path: Path | str) -> str | None:
+        """Returns the digest recorded when the content was stored, None if there is none (blocking)."""
+        with suppress(AttributeError, OSError):  # stored without extended attributes
+            return os.getxattr(path, cls.digest_attribute).decode()
+        return None
+
+    @classmethod
+    def _move(cls, src: Path, digest: str, dst: Path) -> bool:
+        """Records the digest of the file and moves it to `dst` (blocking)."""
+        cls.record_digest(src, digest)
+        os.replace(src, dst)
+        return False
+
+    def blob_path(self, digest: str) -> Path:
+        """Returns the path of the blob of the content."""
+        return self.blob_dir / digest[:2] / digest
+
+    async def store(self, src: Path, digest: str, dst: Path) -> bool:
+        """
+        Moves the file to `dst` with its digest recorded (as a link to its content blob if
+        files are stored by content), returns True if the content was already stored.
+        """
+        if not self.enabled:
+            return await filesystem.run("rename", self._move, src, digest, dst)
+        return await filesystem.run("link", self._store, src, digest, dst)
+
+    async def unlink(self, path: Path) -> bool:
+        """Deletes the file and the blob it references (if no other file does), returns False if it does not exist."""
+        with suppress(FileNotFoundError):
+            await filesystem.run("unlink", self._unlink, path)
+            return True
+        return False
+
+    def _store(self, src: Path, digest: str, dst: Path) -> bool:
+        """Moves the file to `dst` as a link to the blob of its content (blocking), returns True if it existed."""
+        blob = self.blob_path(digest)
+        link = src.with_name(f"{src.name}.link")
+
+        with suppress(FileNotFoundError):
+            os.unlink(link)
+
+        try:
+            os.link(blob, link)
+        except FileNotFoundError:
+            os.makedirs(blob.parent, exist_ok=True)
+            self.record_digest(src, digest)
+            try:
+                os.link(src, blob)  # the first copy of the content becomes the blob
+            except FileExistsError:
+                return self._store(src, digest, dst)  # stored by another upload meanwhile
+
+            os.replace(src, dst)
+            return False
+
+        os.replace(link, dst)
+        os.unlink(src)
+        return True
+
+    def _unlink(self, path: Path) -> None:
+        """Deletes the file and, if it is the last reference to a blob, the blob (blocking)."""
+        stat = os.stat(path)
+
+        if stat.st_nlink == 2:
+            blob = self.blob_path(self.read_digest(path))
+            with suppress(FileNotFoundError):
+                if os.stat(blob).st_ino == stat.st_ino:
+                    os.unlink(blob)
+
+        os.unlink(path)
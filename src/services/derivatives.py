@@ -0,0 +1,183 @@
+import os
+from asyncio import Queue, Task, create_task
+from collections import Counter
+from contextlib import suppress
+from logging import getLogger
+from pathlib import Path
+from typing import Awaitable, Callable, NamedTuple
+
+from PIL import Image, ImageOps
+
+from core.config.image import image_settings
+from validators.codecs import load_codecs
+
+from .executor import cpu_executor
+from .filesystem import filesystem
+
+logger = getLogger("uvicorn.error")
+
+# Sends the readiness of a variant of the stored file: variant name, True if it is ready (False if it failed)
+Notify = Callable[[str, bool], Awaitable[None]]
+
+
+class Variant(NamedTuple):
+    name: str  # directory of the variant in the session, next to "original"
+    file_format: str
+    size: int  # the longest side, px
+    quality: int
+
+    @property
+    def extension(self) -> str:
+        """Returns the file extension of the variant format."""
+        return "jpg" if self.file_format == "jpeg" else self.file_format
+
+
+class DerivativePipeline:
+    """
+    Renders the configured variants of the stored images in the background.
+
+    Every stored image is queued (a bounded queue: the connection waits for
+    a free slot before its next action) and `DERIVATIVE_CONCURRENCY` tasks
+    render the queued images in the CPU executor. An image is decoded once
+    for all its variants, at a reduced scale where the format allows it,
+    oriented by its EXIF and resized from the largest variant down to the
+    smallest. The variants are written without metadata (but the color
+    profile) to `{user_id}/{session_id}/{variant}/{stem}.{ext}` and the
+    readiness of each one is sent to the client.
+    """
+
+    settings = image_settings
+    formats = frozenset({"jpeg", "webp", "png"})
+    reserved_names = frozenset({"original"})
+
+    __slots__ = (
+        "variants",
+        "rendered",
+        "_jobs",
+        "_workers",
+    )
+
+    def __init__(self) -> None:
+        self.variants = self.parse_variants(self.settings.DERIVATIVES)
+        self.rendered: Counter[tuple[str, str]] = Counter()  # by variant and result
+        self._jobs: Queue[tuple[Path, Notify]] = Queue(self.settings.DERIVATIVE_QUEUE_SIZE)
+        self._workers: list[Task] = []
+
+    @property
+    def enabled(self) -> bool:
+        """Returns True if variants of the stored images are rendered."""
+        return bool(self.variants)
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of stored images waiting for their variants."""
+        return self._jobs.qsize()
+
+    @staticmethod
+    def variant_path(source: Path, variant: Variant) -> Path:
+        """Returns the path of the variant of the stored file, in the session next to the files directory."""
+        return source.parent.parent / variant.name / f"{source.stem}.{variant.extension}"
+
+    @classmethod
+    def parse_variants(cls, spec: str) -> tuple[Variant, ...]:
+        """Parses the variants setting, e.g. `thumb=webp:320,web=jpeg:1600:85`."""
+        variants = []
+
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            name, _, options = item.partition("=")
+            fmt, size, *quality = options.lower().split(":")
+
+            if not name.isidentifier() or name in cls.reserved_names or fmt not in cls.formats:
+                raise ValueError(f"Invalid derivative variant: {item}")
+
+            quality = quality or [str(cls.settings.DERIVATIVE_QUALITY)]
+            variants.append(Variant(name, fmt, int(size), int(quality[0])))
+
+        return tuple(variants)
+
+    @classmethod
+    def render(cls, source: Path, variants: tuple[Variant, ...]) -> None:
+        """Renders the variants of the image (blocking), the variants of a deleted image are deleted."""
+        load_codecs()
+        largest = max(variant.size for variant in variants)
+
+        with Image.open(source) as img:
+            img.draft("RGB", (largest, largest))  # JPEG is decoded at the smallest scale not below the largest size
+            image = ImageOps.exif_transpose(img)
+
+        image.info = {"icc_profile": icc} if (icc := image.info.get("icc_profile")) else {}
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+
+        for variant in sorted(variants, key=lambda item: item.size, reverse=True):
+            image.thumbnail((variant.size, variant.size))
+            cls.save(image, cls.variant_path(source, variant), variant)
+
+        if not source.exists():
+            cls.delete(source, variants)
+
+    @classmethod
+    def save(cls, image: Image.Image, path: Path, variant: Variant) -> None:
+        """Writes the variant (blocking) under a temporary name first, so that a variant file is always complete."""
+        if variant.file_format == "jpeg" and image.mode == "RGBA":
+            image = image.convert("RGB")
+
+        os.makedirs(path.parent, exist_ok=True)
+        temp_path = path.with_name(f".{path.name}.tmp")
+        image.save(temp_path, variant.file_format, quality=variant.quality, icc_profile=image.info.get("icc_profile"))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def delete(cls, source: Path, variants: tuple[Variant, ...]) -> None:
+        """Deletes the variants of the file (blocking)."""
+        for variant in variants:
+            with suppress(FileNotFoundError):
+                os.unlink(cls.variant_path(source, variant))
+
+    def start(self) -> None:
+        """Starts the rendering tasks, if there are variants to render."""
+        if self.enabled and not self._workers:
+            self._workers = [create_task(self._run()) for _ in range(self.settings.DERIVATIVE_CONCURRENCY)]
+
+    def stop(self) -> None:
+        """Stops the rendering tasks, the queued images are left without variants."""
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+
+    async def submit(self, source: Path, notify: Notify) -> None:
+        """Queues the stored image for rendering, waits for a free slot if the queue is full."""
+        if self.enabled:
+            await self._jobs.put((source, notify))
+
+    async def remove(self, source: Path) -> None:
+        """Deletes the variants of the stored file and their directories left empty."""
+        if not self.enabled:
+            return
+
+        await filesystem.run("unlink", self.delete, source, self.variants)
+        for variant in self.variants:
+            await filesystem.remove_empty_dirs(self.variant_path(source, variant).parent)
+
+    async def _run(self) -> None:
+        while True:
+            source, notify = await self._jobs.get()
+            try:
+                await cpu_executor.run(self.render, source, self.variants, background=True)
+            except FileNotFoundError:
+                continue  # deleted before its turn
+            except (ValueError, OSError) as e:
+                logger.warning(f"Failed to render the variants of {source.name}: {e}")
+                ready = False
+            except Exception:
+                logger.exception(f"Failed to render the variants of {source.name}")
+                ready = False
+            else:
+                ready = True
+
+            for variant in self.variants:
+                self.rendered[variant.name, "ready" if ready else "failed"] += 1
+                await notify(variant.name, ready)
+
+
+derivative_pipeline = DerivativePipeline()
@@ -0,0 +1,169 @@
+import math
+import os
+from asyncio import (
+    AbstractEventLoop,
+    Semaphore,
+    Task,
+    create_task,
+    gather,
+    get_running_loop,
+    to_thread,
+    wait_for,
+    wrap_future,
+)
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from functools import partial
+from logging import getLogger
+from multiprocessing import get_context
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, TypeVar
+
+from core.config.executor import executor_settings
+from enums import ExecutorType, FileStatusMessage
+
+T = TypeVar("T")
+
+logger = getLogger("uvicorn.error")
+
+CGROUP_V2_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+CGROUP_V1_CPU_DIR = Path("/sys/fs/cgroup/cpu")
+
+
+def cgroup_cpu_quota() -> float | None:
+    """Returns the CPU quota of the container (cgroup v2 or v1) in CPUs, None if it is unlimited."""
+    try:
+        if CGROUP_V2_CPU_MAX.exists():
+            quota, period = CGROUP_V2_CPU_MAX.read_text().split()
+        else:
+            quota = (CGROUP_V1_CPU_DIR / "cpu.cfs_quota_us").read_text().strip()
+            period = (CGROUP_V1_CPU_DIR / "cpu.cfs_period_us").read_text().strip()
+    except (OSError, ValueError):
+        return None
+
+    if quota in ("max", "-1"):
+        return None
+
+    return int(quota) / int(period)
+
+
+def available_cpus() -> int:
+    """Returns the number of CPUs the process may use (affinity mask and container quota)."""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    quota = cgroup_cpu_quota()
+
+    return max(1, min(cpus, math.ceil(quota))) if quota else cpus
+
+
+class CPUExecutor:
+    """Runs CPU-bound jobs (image decoding, hashing) outside the event loop."""
+
+    settings = executor_settings
+    status_msg = FileStatusMessage
+
+    __slots__ = (
+        "_executor",
+        "_semaphore",
+        "_warmup",
+        "pending",
+        "background",
+    )
+
+    def __init__(self) -> None:
+        self._executor: Executor | None = None
+        self._semaphore = Semaphore(self.max_workers + self.settings.CPU_QUEUE_SIZE)
+        self._warmup: Task | None = None
+        self.pending = 0
+        self.background = 0  # pending jobs that no upload waits for, not counted by the admission control
+
+    @property
+    def max_workers(self) -> int:
+        """Returns the number of workers (available CPUs by default)."""
+        if self.settings.CPU_WORKERS > 0:
+            return self.settings.CPU_WORKERS
+
+        return available_cpus()
+
+    @property
+    def executor(self) -> Executor:
+        """Returns the executor, creating it on first use."""
+        if self._executor is None:
+            self._executor = self._create_executor()
+        return self._executor
+
+    async def run(self, func: Callable[..., T], *args: Any, background: bool = False) -> T:
+        """
+        Runs the function in the executor within the job timeout (a timed out job keeps its slot until it ends).
+        A background job (e.g. a rendering after the upload) is not counted by the admission control.
+        """
+        try:
+            return await wait_for(self._submit(func, args, background), self.settings.CPU_JOB_TIMEOUT or None)
+        except TimeoutError:
+            raise ValueError(self.status_msg.PROCESSING_TIMEOUT)
+
+    def warmup(self, func: Callable[[], Any]) -> None:
+        """Starts the workers and runs the function in them in the background (if the warm-up is enabled)."""
+        if self.settings.CPU_WARMUP and self._warmup is None:
+            self._warmup = create_task(self._run_warmup(func))
+
+    async def shutdown(self) -> None:
+        """Cancels queued jobs and waits for the running ones to finish."""
+        if self._warmup is not None:
+            self._warmup.cancel()
+            self._warmup = None
+
+        if self._executor is None:
+            return
+
+        executor, self._executor = self._executor, None
+        await to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def _run_warmup(self, func: Callable[[], Any]) -> None:
+        """Runs the function as many times as there are workers, so that (most likely) each of them runs it once."""
+        start = perf_counter()
+        await gather(*(self.run(func) for _ in range(self.max_workers)), return_exceptions=True)
+        logger.info(f"CPU executor warmed up in {perf_counter() - start:.2f}s")
+
+    async def _submit(self, func: Callable[..., T], args: tuple[Any, ...], background: bool) -> T:
+        """Submits the job once there is a free slot in the queue, the slot is held until the job ends in the pool."""
+        await self._semaphore.acquire()
+        self.pending += 1
+        self.background += background
+        future: Future[T] | None = None
+
+        try:
+            future = self.executor.submit(func, *args)
+            # A timed out job cannot be stopped once it runs, so its slot is freed by the pool rather than the caller
+            future.add_done_callback(partial(self._job_done, get_running_loop(), background))
+            return await wrap_future(future)
+        except BrokenExecutor:
+            logger.error("CPU executor is broken. It will be recreated on the next job.")
+            self._executor = None
+            raise
+        finally:
+            if future is None:
+                self._release(background)
+
+    def _job_done(self, loop: AbstractEventLoop, background: bool, future: Future) -> None:
+        """Frees the slot of the ended (or cancelled) job, called in the thread that completed it."""
+        with suppress(RuntimeError):  # the loop is closed
+            loop.call_soon_threadsafe(self._release, background)
+
+    def _release(self, background: bool) -> None:
+        self.pending -= 1
+        self.background -= background
+        self._semaphore.release()
+
+    def _create_executor(self) -> Executor:
+        """Creates a process pool or falls back to a thread pool."""
+        if self.settings.CPU_EXECUTOR == ExecutorType.PROCESS:
+            try:
+                return ProcessPoolExecutor(self.max_workers, mp_context=get_context("spawn"))
+            except (ImportError, NotImplementedError, OSError) as e:
+                logger.warning(f"Process pool is unavailable: {e}. Falling back to the thread pool.")
+
+        return ThreadPoolExecutor(self.max_workers, thread_name_prefix="cpu-executor")
+
+
+cpu_executor = CPUExecutor()
@@ -0,0 +1,166 @@
+import logging
+import os
+
+from core.config.log import LOGGING, QueuedHandler
+
+from .admission import admission_controller
+from .cleanup import session_collector
+from .derivatives import derivative_pipeline
+from .executor import cpu_executor
+from .filesystem import filesystem
+from .metrics import Histogram, upload_metrics
+from .monitor import loop_monitor
+from .profiler import upload_profiler
+from .timeout import timeout_scheduler
+
+
+class MetricsExporter:
+    """
+    Renders the application metrics in the Prometheus text exposition format.
+
+    Every worker process exports its own metrics and any of them answers a
+    scrape of `/metrics`, so each sample has a `worker` label with the
+    process id. Rates are left to the queries, e.g.
+    `sum(rate(upload_received_bytes_total[1m]))`.
+    """
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    __slots__ = ()
+
+    @staticmethod
+    def format_labels(labels: dict[str, str]) -> str:
+        """Returns the label set, e.g. `{stage="write"}`."""
+        if not labels:
+            return ""
+
+        pairs = ",".join(f'{name}="{value}"' for name, value in labels.items())
+        return f"{{{pairs}}}"
+
+    @staticmethod
+    def queued_handlers() -> dict[str, QueuedHandler]:
+        """Returns the queued log handlers of the configured loggers by name."""
+        return {
+            str(handler.name): handler
+            for name in LOGGING["loggers"]
+            for handler in logging.getLogger(name).handlers
+            if isinstance(handler, QueuedHandler)
+        }
+
+    @staticmethod
+    def add_label(line: str, label: str) -> str:
+        """Returns the sample line with the label added (comment lines as is)."""
+        if line.startswith("#"):
+            return line
+
+        name, value = line.rsplit(" ", 1)
+        if name.endswith("}"):
+            return f"{name[:-1]},{label}}} {value}"
+        return f"{name}{{{label}}} {value}"
+
+    @classmethod
+    def format_histogram(cls, name: str, histogram: Histogram, labels: dict[str, str]) -> list[str]:
+        """Returns the cumulative bucket, sum and count samples of the histogram."""
+        lines = []
+        cumulative = 0
+
+        for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{cls.format_labels({**labels, 'le': str(bound)})} {cumulative}")
+
+        lines.append(f"{name}_sum{cls.format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{cls.format_labels(labels)} {histogram.count}")
+        return lines
+
+    def render(self) -> str:
+        """Returns the current values of all metrics."""
+        lines = [
+            "# HELP websocket_active_connections Open WebSocket connections.",
+            "# TYPE websocket_active_connections gauge",
+            f"websocket_active_connections {len(timeout_scheduler)}",
+            "# HELP upload_received_bytes_total Bytes of file chunks received.",
+            "# TYPE upload_received_bytes_total counter",
+            f"upload_received_bytes_total {upload_metrics.received_bytes}",
+            "# HELP upload_stage_duration_seconds Duration of the upload stages.",
+            "# TYPE upload_stage_duration_seconds histogram",
+        ]
+
+        for stage, histogram in upload_metrics.stage_histograms.items():
+            lines += self.format_histogram("upload_stage_duration_seconds", histogram, {"stage": stage})
+
+        lines += [
+            "# HELP upload_status_total Sent abort, timeout and error statuses by reason.",
+            "# TYPE upload_status_total counter",
+        ]
+        for (status, reason), count in sorted(upload_metrics.statuses.items()):
+            lines.append(f"upload_status_total{self.format_labels({'status': status, 'reason': reason})} {count}")
+
+        lines += [
+            "# HELP upload_active Uploads admitted and in progress.",
+            "# TYPE upload_active gauge",
+            f"upload_active {admission_controller.active_uploads}",
+            "# HELP upload_inflight_bytes Bytes reserved by the uploads in progress.",
+            "# TYPE upload_inflight_bytes gauge",
+            f"upload_inflight_bytes {admission_controller.inflight_bytes}",
+            "# HELP upload_admission_total Admission decisions, rejections by the reached cap.",
+            "# TYPE upload_admission_total counter",
+        ]
+        for (decision, reason), count in sorted(admission_controller.decisions.items()):
+            labels = {"decision": decision, "reason": reason} if reason else {"decision": decision}
+            lines.append(f"upload_admission_total{self.format_labels(labels)} {count}")
+
+        lines += [
+            "# HELP executor_pending_jobs Jobs queued or running in the executors.",
+            "# TYPE executor_pending_jobs gauge",
+            f'executor_pending_jobs{{executor="cpu"}} {cpu_executor.pending}',
+            f'executor_pending_jobs{{executor="io"}} {filesystem.pending}',
+            "# HELP filesystem_operation_duration_seconds Duration of the filesystem calls, including the queue wait.",
+            "# TYPE filesystem_operation_duration_seconds histogram",
+        ]
+        for operation, histogram in sorted(filesystem.histograms.items()):
+            lines += self.format_histogram("filesystem_operation_duration_seconds", histogram, {"operation": operation})
+
+        lines += [
+            "# HELP derivative_queued_images Stored images waiting for the rendering of their variants.",
+            "# TYPE derivative_queued_images gauge",
+            f"derivative_queued_images {derivative_pipeline.pending}",
+            "# HELP derivative_variants_total Rendered variants of the stored images by result.",
+            "# TYPE derivative_variants_total counter",
+        ]
+        for (variant, result), count in sorted(derivative_pipeline.rendered.items()):
+            labels = {"variant": variant, "result": result}
+            lines.append(f"derivative_variants_total{self.format_labels(labels)} {count}")
+
+        lines += [
+            "# HELP gc_deleted_files_total Expired partial files and orphan blobs deleted by the storage sweeps.",
+            "# TYPE gc_deleted_files_total counter",
+            f"gc_deleted_files_total {session_collector.deleted_files}",
+            "# HELP gc_reclaimed_bytes_total Bytes of the files deleted by the storage sweeps.",
+            "# TYPE gc_reclaimed_bytes_total counter",
+            f"gc_reclaimed_bytes_total {session_collector.reclaimed_bytes}",
+            "# HELP gc_removed_dirs_total Empty session directories removed by the storage sweeps.",
+            "# TYPE gc_removed_dirs_total counter",
+            f"gc_removed_dirs_total {session_collector.removed_dirs}",
+            "# HELP gc_last_sweep_duration_seconds Duration of the last storage sweep of this worker.",
+            "# TYPE gc_last_sweep_duration_seconds gauge",
+            f"gc_last_sweep_duration_seconds {session_collector.last_duration}",
+            "# HELP event_loop_lag_seconds Delay of the event loop wake-ups.",
+            "# TYPE event_loop_lag_seconds histogram",
+            *self.format_histogram("event_loop_lag_seconds", loop_monitor.lag, {}),
+            "# HELP event_loop_blocked_total Event loop lags longer than the threshold, logged with the blocking code.",
+            "# TYPE event_loop_blocked_total counter",
+            f"event_loop_blocked_total {loop_monitor.blocked}",
+            "# HELP upload_profiles_total Profiles of slow uploads written to the log directory.",
+            "# TYPE upload_profiles_total counter",
+            f"upload_profiles_total {upload_profiler.dumped}",
+            "# HELP log_dropped_records_total Log records dropped because the queue of the handler was full.",
+            "# TYPE log_dropped_records_total counter",
+        ]
+        for name, handler in sorted(self.queued_handlers().items()):
+            lines.append(f"log_dropped_records_total{self.format_labels({'handler': name})} {handler.dropped}")
+
+        worker = f'worker="{os.getpid()}"'
+        return "\n".join(self.add_label(line, worker) for line in lines) + "\n"
+
+
+metrics_exporter = MetricsExporter()
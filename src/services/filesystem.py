@@ -0,0 +1,139 @@
+import os
+from asyncio import get_running_loop, to_thread
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from logging import getLogger
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, TypeVar
+
+from core.config.executor import executor_settings
+
+from .metrics import Histogram
+
+T = TypeVar("T")
+
+logger = getLogger("uvicorn.error")
+
+
+class AsyncFileSystem:
+    """
+    Runs blocking filesystem calls in a dedicated thread pool.
+
+    Every call is timed from submission to completion, so the latency
+    histograms of the operations include the time spent waiting for a free
+    worker when the storage is slow.
+    """
+
+    settings = executor_settings
+
+    __slots__ = (
+        "_executor",
+        "histograms",
+        "pending",
+    )
+
+    def __init__(self) -> None:
+        self._executor: ThreadPoolExecutor | None = None
+        self.histograms: dict[str, Histogram] = {}
+        self.pending = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Returns the executor, creating it on first use."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.settings.IO_WORKERS, thread_name_prefix="io-executor")
+        return self._executor
+
+    @staticmethod
+    def _list_ignored(directory: Path, ignored: frozenset[str]) -> list[str] | None:
+        """Returns the ignored entries of the directory, None if it has other entries (blocking)."""
+        found = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name not in ignored:
+                    return None
+                found.append(entry.name)
+        return found
+
+    @staticmethod
+    def _read(path: Path, size: int) -> bytes:
+        """Returns up to `size` bytes from the start of the file (blocking)."""
+        with open(path, "rb") as stream:
+            return stream.read(size)
+
+    @classmethod
+    def _remove_empty_dirs(cls, directories: tuple[Path, ...], ignored: frozenset[str]) -> int:
+        """
+        Removes the directories (with the ignored files) in order until a non-empty one is found (blocking),
+        returns the number of removed directories.
+        """
+        removed = 0
+        for directory in directories:
+            try:
+                names = cls._list_ignored(directory, ignored)
+                if names is None:
+                    break
+                for name in names:
+                    os.unlink(directory / name)
+                directory.rmdir()
+                removed += 1
+            except FileNotFoundError:
+                continue
+            except OSError:
+                break
+        return removed
+
+    async def run(self, operation: str, func: Callable[..., T], *args: Any) -> T:
+        """Runs the blocking function in the executor and records its latency."""
+        start = perf_counter()
+        self.pending += 1
+        try:
+            return await get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+            elapsed = perf_counter() - start
+            self.histograms.setdefault(operation, Histogram()).observe(elapsed)
+
+            if elapsed >= self.settings.IO_SLOW_OPERATION:
+                logger.warning(f"Slow filesystem operation '{operation}': {elapsed:.3f}s")
+
+    async def mkdir(self, path: Path) -> None:
+        """Creates the directory with its parents."""
+        await self.run("mkdir", os.makedirs, path, 0o777, True)
+
+    async def stat(self, path: Path) -> os.stat_result | None:
+        """Returns the status of the file or None if it does not exist."""
+        with suppress(FileNotFoundError):
+            return await self.run("stat", os.stat, path)
+        return None
+
+    async def read(self, path: Path, size: int) -> bytes:
+        """Returns up to `size` bytes from the start of the file."""
+        return await self.run("read", self._read, path, size)
+
+    async def unlink(self, path: Path) -> bool:
+        """Deletes the file, returns False if it does not exist."""
+        with suppress(FileNotFoundError):
+            await self.run("unlink", os.unlink, path)
+            return True
+        return False
+
+    async def rename(self, src: Path, dst: Path) -> None:
+        """Renames the file (atomically within the filesystem)."""
+        await self.run("rename", os.rename, src, dst)
+
+    async def remove_empty_dirs(self, *directories: Path, ignored: frozenset[str] = frozenset()) -> int:
+        """Removes the directories in order until a non-empty one is found (the ignored files do not count)."""
+        return await self.run("rmdir", self._remove_empty_dirs, directories, ignored)
+
+    async def shutdown(self) -> None:
+        """Waits for the running calls to finish and stops the executor."""
+        if self._executor is None:
+            return
+
+        executor, self._executor = self._executor, None
+        await to_thread(executor.shutdown, wait=True)
+
+
+filesystem = AsyncFileSystem()
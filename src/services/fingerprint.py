@@ -0,0 +1,184 @@
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable
+
+import numpy as np
+
+# Stored files are named `{file_idx}_{hash}{suffix}`, see `BaseFileManager.rename_file`
+FILE_NAME_PATTERN = re.compile(r"^(\d+)_([0-9a-f]{16})(?:\.|$)")
+
+# Record of a file in the fingerprint store, 64 bytes
+FINGERPRINT_DTYPE = np.dtype(
+    [
+        ("dhash", "<u8"),
+        ("phash", "<u8"),
+        ("sha256", "V32"),
+        ("file_size", "<u8"),
+        ("path_offset", "<u8"),  # of the path in the path table
+    ]
+)
+
+
+class FingerprintIndex:
+    """Packed 64-bit perceptual hashes of the files stored in a session directory."""
+
+    __slots__ = (
+        "file_indices",
+        "hashes",
+    )
+
+    def __init__(self, entries: Iterable[tuple[int, int]] = ()) -> None:
+        pairs = list(entries)
+        self.file_indices = np.array([file_idx for file_idx, _ in pairs], dtype=np.int64)
+        self.hashes = np.array([file_hash for _, file_hash in pairs], dtype=np.uint64)
+
+    @staticmethod
+    def parse_file_name(file_name: str) -> tuple[int, int] | None:
+        """Returns the file index and hash encoded in the stored file name."""
+        if match := FILE_NAME_PATTERN.match(file_name):
+            return int(match.group(1)), int(match.group(2), 16)
+        return None
+
+    def add(self, file_idx: int, file_hash: int) -> None:
+        """Adds the file hash to the index."""
+        if (file_idx, file_hash) in self:
+            return
+
+        self.file_indices = np.append(self.file_indices, np.int64(file_idx))
+        self.hashes = np.append(self.hashes, np.uint64(file_hash))
+
+    def remove(self, file_idx: int, file_hash: int) -> None:
+        """Removes the file hash from the index."""
+        keep = (self.file_indices != file_idx) | (self.hashes != np.uint64(file_hash))
+        self.file_indices = self.file_indices[keep]
+        self.hashes = self.hashes[keep]
+
+    def has_duplicate(self, file_idx: int, file_hash: int, min_distance: int) -> bool:
+        """Checks if any file with another index is closer than `min_distance` bits to the hash."""
+        if not len(self):
+            return False
+
+        distances = np.bitwise_count(self.hashes ^ np.uint64(file_hash))
+        return bool(np.any((distances < min_distance) & (self.file_indices != file_idx)))
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __contains__(self, entry: tuple[int, int]) -> bool:
+        file_idx, file_hash = entry
+        return bool(np.any((self.file_indices == file_idx) & (self.hashes == np.uint64(file_hash))))
+
+
+class FingerprintStore:
+    """
+    Fingerprints of the stored files on disk: an array of packed records and a path table.
+
+    `fingerprints.bin` holds the records (`FINGERPRINT_DTYPE`) and can be
+    memory-mapped as a NumPy array, `paths.txt` holds the paths of the
+    files relative to the base directory, one per line, in the order of the
+    records. `index.json` is the checkpoint: the committed number of records
+    and size of the path table (anything written after it is discarded on
+    resume) and the parameters of the hashes.
+    """
+
+    records_name = "fingerprints.bin"
+    paths_name = "paths.txt"
+    meta_name = "index.json"
+
+    __slots__ = (
+        "directory",
+        "meta",
+        "_records",
+        "_paths",
+        "_count",
+        "_paths_size",
+    )
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self.meta: dict[str, Any] = {}
+        self._records: BinaryIO | None = None
+        self._paths: BinaryIO | None = None
+        self._count = 0
+        self._paths_size = 0
+
+    @property
+    def count(self) -> int:
+        """Returns the number of records."""
+        return self._count
+
+    def read_meta(self) -> dict[str, Any]:
+        """Returns the last checkpoint, empty if there is none."""
+        try:
+            meta: dict[str, Any] = json.loads((self.directory / self.meta_name).read_text())
+        except FileNotFoundError:
+            return {}
+        return meta
+
+    def load(self) -> tuple[np.ndarray, list[str]]:
+        """Returns the records (memory-mapped) and the paths of the last checkpoint."""
+        meta = self.read_meta()
+        count = meta.get("count", 0)
+        if not count:
+            return np.empty(0, FINGERPRINT_DTYPE), []
+
+        records = np.memmap(self.directory / self.records_name, FINGERPRINT_DTYPE, "r", shape=(count,))
+        with open(self.directory / self.paths_name, "rb") as file:
+            paths = file.read(meta["paths_size"]).decode().splitlines()
+        return records, paths
+
+    def open(self, params: dict[str, Any], rebuild: bool = False) -> list[str]:
+        """
+        Opens the store for appending from the last checkpoint (from scratch on rebuild or if the parameters
+        differ), returns the paths of the files already indexed.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta = {} if rebuild else self.read_meta()
+        if meta.get("params") != params:
+            meta = {}
+
+        self.meta = {"params": params, "count": meta.get("count", 0), "paths_size": meta.get("paths_size", 0)}
+        self._count, self._paths_size = self.meta["count"], self.meta["paths_size"]
+
+        self._records = open(self.directory / self.records_name, "ab+")
+        self._paths = open(self.directory / self.paths_name, "ab+")
+        self._records.truncate(self._count * FINGERPRINT_DTYPE.itemsize)
+        self._paths.truncate(self._paths_size)
+
+        self._paths.seek(0)
+        return self._paths.read().decode().splitlines()
+
+    def append(self, records: np.ndarray, paths: list[str]) -> None:
+        """Appends the records (without their path offsets) of the files with the paths."""
+        if self._records is None or self._paths is None:
+            raise RuntimeError("The fingerprint store is not open")
+
+        table = [f"{path}\n".encode() for path in paths]
+        sizes = np.fromiter(map(len, table), np.uint64, len(table))
+        records["path_offset"] = self._paths_size + np.cumsum(sizes) - sizes
+
+        self._records.write(records.tobytes())
+        self._paths.write(b"".join(table))
+        self._count += len(records)
+        self._paths_size += int(sizes.sum())
+
+    def checkpoint(self, **info: Any) -> None:
+        """Flushes the appended records and commits them with the information (e.g. the completion)."""
+        for stream in (self._records, self._paths):
+            if stream is not None:
+                stream.flush()
+                os.fsync(stream.fileno())
+
+        self.meta.update(info, count=self._count, paths_size=self._paths_size)
+        temp_path = self.directory / f".{self.meta_name}.tmp"
+        temp_path.write_text(json.dumps(self.meta, indent=2))
+        os.replace(temp_path, self.directory / self.meta_name)
+
+    def close(self) -> None:
+        """Closes the files, the records appended after the last checkpoint are discarded on resume."""
+        for stream in (self._records, self._paths):
+            if stream is not None:
+                stream.close()
+        self._records = self._paths = None
@@ -0,0 +1,115 @@
+import fcntl
+import os
+from asyncio import Lock, sleep
+from pathlib import Path
+from random import getrandbits
+from struct import Struct
+from time import monotonic
+from weakref import WeakValueDictionary
+
+from core.config.upload import upload_settings
+from enums import FileStatusMessage
+
+from .filesystem import filesystem
+
+
+class SessionLock:
+    """
+    Serializes the changes of the files stored in a session across connections and worker processes.
+
+    Connections of a worker wait on an asyncio lock, workers wait on a POSIX
+    record lock of the `.lock` file in the session directory (supported by NFS
+    and released if the worker dies). The file holds the version of the
+    session, replaced on every change, so a worker knows when its cached
+    state of the session is stale.
+    """
+
+    file_name = ".lock"
+    version_format = Struct(">Q")
+    settings = upload_settings
+    status_msg = FileStatusMessage
+
+    _locks: "WeakValueDictionary[Path, Lock]" = WeakValueDictionary()
+
+    __slots__ = (
+        "path",
+        "version",
+        "changed",
+        "_lock",
+        "_fd",
+    )
+
+    def __init__(self, session_dir: Path) -> None:
+        self.path = session_dir / self.file_name
+        self.version = 0
+        self.changed = False
+
+        self._lock = self._locks.setdefault(session_dir, Lock())
+        self._fd: int | None = None
+
+    @classmethod
+    def _try_acquire(cls, path: Path) -> tuple[int, int] | None:
+        """Opens and locks the file, returns its descriptor and the version, None if it is locked (blocking)."""
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+        except FileNotFoundError:
+            os.makedirs(path.parent, exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # The file is deleted with an empty session directory, a lock of a deleted file guards nothing
+            if os.fstat(fd).st_ino != os.stat(path).st_ino:
+                raise FileNotFoundError(path)
+            data = os.pread(fd, cls.version_format.size, 0)
+        except (BlockingIOError, PermissionError, FileNotFoundError):
+            os.close(fd)
+            return None
+
+        version = cls.version_format.unpack(data)[0] if len(data) == cls.version_format.size else 0
+        return fd, version
+
+    @classmethod
+    def _release(cls, fd: int, version: int | None) -> None:
+        """Writes the new version (if any) and closes the file, which releases the lock (blocking)."""
+        try:
+            if version is not None:
+                os.pwrite(fd, cls.version_format.pack(version), 0)
+        finally:
+            os.close(fd)
+
+    def change(self) -> int:
+        """Replaces the version of the session (written on release), returns the new version."""
+        self.version = getrandbits(64)
+        self.changed = True
+        return self.version
+
+    async def __aenter__(self) -> "SessionLock":
+        await self._lock.acquire()
+        try:
+            await self._acquire_file_lock()
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        fd, self._fd = self._fd, None
+        try:
+            if fd is not None:
+                await filesystem.run("unlock", self._release, fd, self.version if self.changed else None)
+        finally:
+            self._lock.release()
+
+    async def _acquire_file_lock(self) -> None:
+        """Polls the file lock with a backoff, raises a validation error after the lock timeout."""
+        deadline = monotonic() + self.settings.SESSION_LOCK_TIMEOUT
+        delay = 0.005
+
+        while (acquired := await filesystem.run("lock", self._try_acquire, self.path)) is None:
+            if monotonic() >= deadline:
+                raise ValueError(self.status_msg.SESSION_LOCKED)
+            await sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+        self._fd, self.version = acquired
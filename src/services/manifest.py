@@ -0,0 +1,163 @@
+import os
+import re
+from collections import Counter, OrderedDict
+from contextlib import suppress
+from pathlib import Path
+from time import monotonic
+
+from core.config.cache import cache_settings
+
+from .content import ContentStore
+from .filesystem import filesystem
+from .fingerprint import FingerprintIndex
+
+FILE_IDX_PATTERN = re.compile(r"^(\d+)_")
+
+
+class SessionManifest:
+    """
+    State of the files stored in a session: their sizes, the SHA-256 digests
+    of their content (if recorded), their indexes and the fingerprint index of their hashes.
+    """
+
+    __slots__ = (
+        "files",
+        "digests",
+        "contents",
+        "file_idxs",
+        "total_bytes",
+        "fingerprints",
+        "version",
+        "expires_at",
+    )
+
+    def __init__(self, files: dict[str, int] | None = None, digests: dict[str, str] | None = None) -> None:
+        self.files = files or {}
+        self.digests = digests or {}  # file name -> digest
+        self.contents = {digest: file_name for file_name, digest in self.digests.items()}
+        # File index -> number of stored files
+        self.file_idxs = Counter(idx for idx in map(self.parse_file_idx, self.files) if idx is not None)
+        self.total_bytes = sum(self.files.values())
+        self.fingerprints = FingerprintIndex(filter(None, map(FingerprintIndex.parse_file_name, self.files)))
+        self.version: int | None = None  # version of the session the manifest was built or updated at
+        self.expires_at = 0.0
+
+    @property
+    def file_count(self) -> int:
+        """Returns the number of stored files."""
+        return len(self.files)
+
+    @property
+    def file_idx_count(self) -> int:
+        """Returns the number of file indexes with stored files."""
+        return len(self.file_idxs)
+
+    @staticmethod
+    def parse_file_idx(file_name: str) -> int | None:
+        """Returns the file index encoded in the stored file name."""
+        if match := FILE_IDX_PATTERN.match(file_name):
+            return int(match.group(1))
+        return None
+
+    def add(self, file_name: str, size: int, digest: str | None = None) -> None:
+        """Adds the stored file (its digest and its hash, if the name has one) to the manifest."""
+        if file_name not in self.files and (file_idx := self.parse_file_idx(file_name)) is not None:
+            self.file_idxs[file_idx] += 1
+        self.total_bytes += size - self.files.get(file_name, 0)
+        self.files[file_name] = size
+
+        if digest is not None:
+            self.digests[file_name] = digest
+            self.contents[digest] = file_name
+        if entry := FingerprintIndex.parse_file_name(file_name):
+            self.fingerprints.add(*entry)
+
+    def remove(self, file_name: str) -> None:
+        """Removes the stored file (its digest and its hash) from the manifest."""
+        if (size := self.files.pop(file_name, None)) is None:
+            return
+
+        self.total_bytes -= size
+        if (file_idx := self.parse_file_idx(file_name)) is not None:
+            self.file_idxs[file_idx] -= 1
+            if not self.file_idxs[file_idx]:
+                del self.file_idxs[file_idx]
+        if (digest := self.digests.pop(file_name, None)) and self.contents.get(digest) == file_name:
+            del self.contents[digest]
+        if entry := FingerprintIndex.parse_file_name(file_name):
+            self.fingerprints.remove(*entry)
+
+    def find_content(self, digest: str) -> str | None:
+        """Returns the name of a stored file with the content, if there is one."""
+        return self.contents.get(digest)
+
+    def copy(self) -> "SessionManifest":
+        """Returns a copy of the manifest, to be updated without changing the manifest."""
+        return SessionManifest(dict(self.files), dict(self.digests))
+
+
+class SessionManifestCache:
+    """
+    Per-session manifests with TTL and LRU eviction, rebuilt from the files directory on a miss.
+
+    Other workers store files in the same sessions, so a manifest is also
+    rebuilt when the session version (see `SessionLock`) differs from the
+    version it was built or last updated at.
+    """
+
+    settings = cache_settings
+
+    __slots__ = ("_manifests",)
+
+    def __init__(self) -> None:
+        self._manifests: OrderedDict[Path, SessionManifest] = OrderedDict()
+
+    @staticmethod
+    def scan(file_dir: Path) -> tuple[dict[str, int], dict[str, str]]:
+        """Returns the sizes and the recorded digests of the files stored in the directory by name (blocking)."""
+        files: dict[str, int] = {}
+        digests: dict[str, str] = {}
+
+        with suppress(FileNotFoundError), os.scandir(file_dir) as it:
+            for entry in it:
+                with suppress(FileNotFoundError):
+                    files[entry.name] = entry.stat().st_size
+                    if digest := ContentStore.recorded_digest(entry.path):
+                        digests[entry.name] = digest
+
+        return files, digests
+
+    @classmethod
+    def build(cls, file_dir: Path) -> SessionManifest:
+        """Builds the manifest of the files stored in the directory (blocking)."""
+        return SessionManifest(*cls.scan(file_dir))
+
+    async def get(self, file_dir: Path, version: int | None = None) -> SessionManifest:
+        """Returns the manifest of the directory, rebuilding it if it is missing, expired or of another version."""
+        now = monotonic()
+        manifest = self._manifests.get(file_dir)
+
+        if manifest is None or manifest.expires_at < now or manifest.version != version:
+            manifest = self._manifests[file_dir] = await filesystem.run("scandir", self.build, file_dir)
+            manifest.version = version
+
+        manifest.expires_at = now + self.settings.SESSION_MANIFEST_TTL
+        self._manifests.move_to_end(file_dir)
+        self._evict(now)
+
+        return manifest
+
+    def __len__(self) -> int:
+        return len(self._manifests)
+
+    def _evict(self, now: float) -> None:
+        """Evicts expired manifests and the least recently used ones above the size limit."""
+        while self._manifests:
+            oldest = next(iter(self._manifests.values()))
+            if oldest.expires_at >= now and len(self._manifests) <= self.settings.SESSION_MANIFEST_MAX_SESSIONS:
+                break
+            self._manifests.popitem(last=False)
+
+
+# Keyed by the files directory `{BASE_DIR}/{user_id}/{session_id}/original` of the session
+session_manifests = SessionManifestCache()
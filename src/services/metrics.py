@@ -0,0 +1,88 @@
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Iterable, Iterator
+
+from enums import FileStatusMessage, WebSocketStatusMessage
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Latency histogram with fixed upper bounds (seconds), the last bucket counts the larger values."""
+
+    __slots__ = (
+        "buckets",
+        "counts",
+        "count",
+        "sum",
+    )
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Records the value."""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction: float) -> float:
+        """Returns the upper bound of the bucket holding the quantile (infinity above the last bucket)."""
+        rank = fraction * self.count
+        seen = 0
+
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank and seen:
+                return bound
+
+        return float("inf") if self.count else 0.0
+
+
+class UploadMetrics:
+    """
+    Process-wide upload counters and per-stage latency histograms.
+
+    Stages: `receive` (waiting for the chunks), `write` (buffered writes),
+    `verify` (image decoding and hashing, done in one pass), `unique`
+    (checks against the stored files) and `rename` (moving the file into place).
+    """
+
+    stages = ("receive", "write", "verify", "unique", "rename")
+    reasons = frozenset(FileStatusMessage) | frozenset(WebSocketStatusMessage)
+
+    __slots__ = (
+        "received_bytes",
+        "stage_histograms",
+        "statuses",
+    )
+
+    def __init__(self) -> None:
+        self.received_bytes = 0
+        self.stage_histograms = {stage: Histogram() for stage in self.stages}
+        self.statuses: Counter[tuple[str, str]] = Counter()
+
+    def observe_stage(self, stage: str, seconds: float, timings: dict[str, float] | None = None) -> None:
+        """Records the duration of the upload stage (also in the timings of the upload, if given)."""
+        self.stage_histograms[stage].observe(seconds)
+        if timings is not None:
+            timings[stage] = seconds
+
+    @contextmanager
+    def measure(self, stage: str, timings: dict[str, float] | None = None) -> Iterator[None]:
+        """Records the duration of the block as the upload stage (if it succeeds)."""
+        start = perf_counter()
+        yield
+        self.observe_stage(stage, perf_counter() - start, timings)
+
+    def count_status(self, status: str, reason: str | None) -> None:
+        """Counts the sent abort/timeout/error status, free-form reasons (validation errors) are counted as other."""
+        self.statuses[status, reason if reason in self.reasons else "other"] += 1
+
+
+upload_metrics = UploadMetrics()
@@ -0,0 +1,117 @@
+import sys
+from asyncio import Task, create_task, sleep
+from logging import getLogger
+from pathlib import Path
+from threading import Event, Thread, get_ident
+from time import perf_counter
+from types import FrameType
+
+from core.config.monitor import monitor_settings
+
+from .metrics import Histogram
+
+logger = getLogger("uvicorn.error")
+
+SOURCE_DIR = Path(__file__).resolve().parents[1]
+
+
+class LoopMonitor:
+    """
+    Measures the event loop lag and reports the code blocking the loop.
+
+    A task sleeps `LOOP_LAG_INTERVAL` and records how late it wakes up. A
+    watchdog thread checks every half of `LOOP_BLOCKED_THRESHOLD` if the
+    task is late by more than the threshold: the loop is then blocked (or
+    saturated) and the stack of the loop thread is taken, so the warning
+    logged when the task wakes up names the running coroutine and function,
+    e.g. `ImageFileManager.validate_stored_files <- BaseFileManager.commit_file`.
+    """
+
+    settings = monitor_settings
+    stack_depth = 6  # frames of the application in the reports
+
+    __slots__ = (
+        "lag",
+        "blocked",
+        "_deadline",
+        "_blocked",
+        "_loop_thread",
+        "_stopped",
+        "_task",
+    )
+
+    def __init__(self) -> None:
+        self.lag = Histogram()
+        self.blocked = 0  # lags reported with the blocking stack
+
+        self._deadline = 0.0  # when the lag task should wake up
+        self._blocked: tuple[float, str] | None = None  # deadline missed and the stack of the loop thread
+        self._loop_thread = 0
+        self._stopped = Event()
+        self._task: Task | None = None
+
+    @staticmethod
+    def frame_name(frame: FrameType, line: bool = True) -> str:
+        """Returns the qualified name of the function and its file, relative to the sources if it is ours."""
+        path = Path(frame.f_code.co_filename)
+        if path.is_relative_to(SOURCE_DIR):
+            path = path.relative_to(SOURCE_DIR)
+        location = f"{path}:{frame.f_lineno}" if line else str(path)
+        return f"{frame.f_code.co_qualname} ({location})"
+
+    @classmethod
+    def describe_stack(cls, frame: FrameType | None) -> str:
+        """Returns the innermost frames of the application (and the frame running, if not ours)."""
+        names: list[str] = []
+
+        while frame is not None and len(names) < cls.stack_depth:
+            if not names or Path(frame.f_code.co_filename).is_relative_to(SOURCE_DIR):
+                names.append(cls.frame_name(frame))
+            frame = frame.f_back
+
+        return " <- ".join(names) or "unknown"
+
+    def start(self) -> None:
+        """Starts the lag task and the watchdog thread (in the event loop thread)."""
+        if self._task is not None or not self.settings.LOOP_LAG_INTERVAL:
+            return
+
+        self._loop_thread = get_ident()
+        self._deadline = perf_counter() + self.settings.LOOP_LAG_INTERVAL
+        self._stopped.clear()
+        self._task = create_task(self._run())
+
+        if self.settings.LOOP_BLOCKED_THRESHOLD:
+            Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self) -> None:
+        """Stops the lag task and the watchdog thread."""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        interval = self.settings.LOOP_LAG_INTERVAL
+
+        while True:
+            deadline = self._deadline = perf_counter() + interval
+            await sleep(interval)
+            lag = max(0.0, perf_counter() - deadline)
+            self.lag.observe(lag)
+
+            # A stack taken for an earlier deadline (after the task woke up) is stale
+            if self._blocked is not None and self._blocked[0] == deadline:
+                self.blocked += 1
+                logger.warning(f"Event loop blocked for {lag:.3f}s, running: {self._blocked[1]}")
+
+    def _watch(self) -> None:
+        threshold = self.settings.LOOP_BLOCKED_THRESHOLD
+
+        while not self._stopped.wait(threshold / 2):
+            deadline = self._deadline
+            if perf_counter() - deadline > threshold and (self._blocked is None or self._blocked[0] != deadline):
+                self._blocked = (deadline, self.describe_stack(sys._current_frames().get(self._loop_thread)))
+
+
+loop_monitor = LoopMonitor()
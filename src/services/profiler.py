@@ -0,0 +1,192 @@
+import json
+import sys
+from asyncio import AbstractEventLoop, Task, current_task, get_running_loop
+from collections import Counter
+from logging import getLogger
+from pathlib import Path
+from random import random
+from threading import Event, Lock, Thread, get_ident
+from time import perf_counter, time_ns
+from types import FrameType
+from typing import Any
+
+from core.config.log import logging_settings
+from core.config.monitor import monitor_settings
+
+from .filesystem import filesystem
+from .monitor import LoopMonitor
+
+logger = getLogger("uvicorn.error")
+
+
+class StageTimings(dict[str, float]):
+    """Durations of the upload stages (seconds) that also keeps when every stage ended."""
+
+    __slots__ = ("start", "timeline")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.start = perf_counter()
+        self.timeline: list[tuple[str, float, float]] = []  # stage, end and duration, seconds
+
+    def __setitem__(self, stage: str, seconds: float) -> None:
+        super().__setitem__(stage, seconds)
+        self.timeline.append((stage, perf_counter() - self.start, seconds))
+
+
+class UploadProfile:
+    """Stage timeline and stack samples of one upload."""
+
+    __slots__ = (
+        "task",
+        "timings",
+        "samples",
+        "stacks",
+    )
+
+    def __init__(self, task: Task | None) -> None:
+        self.task = task
+        self.timings = StageTimings()
+        self.samples = 0  # stack samples taken during the upload
+        self.stacks: Counter[str] = Counter()  # folded stacks of the samples running the upload
+
+    @property
+    def duration(self) -> float:
+        """Returns the seconds since the upload started."""
+        return perf_counter() - self.timings.start
+
+    def to_dict(self, context: dict[str, Any]) -> dict[str, Any]:
+        """Returns the profile to dump: the upload context, the stage timeline and the folded stacks."""
+        return {
+            **context,
+            "duration_ms": round(self.duration * 1000, 3),
+            "timeline": [
+                {"stage": stage, "end_ms": round(end * 1000, 3), "duration_ms": round(seconds * 1000, 3)}
+                for stage, end, seconds in self.timings.timeline
+            ],
+            "samples": self.samples,
+            "stacks": [f"{stack} {count}" for stack, count in self.stacks.most_common()],
+        }
+
+
+class UploadProfiler:
+    """
+    Profiles a sample of the uploads and dumps the ones slower than `PROFILE_THRESHOLD`.
+
+    `PROFILE_SAMPLE_RATE` of the uploads get a profile: their stages are
+    timed on a timeline and, while any profile is open, a thread samples the
+    stack of the event loop thread every `PROFILE_INTERVAL`. The samples
+    taken while the task of a profiled upload runs are added to its stacks
+    (folded, for flame graphs), the time the upload waits for the client,
+    the executors or the storage shows up on the timeline only. A profiled
+    upload taking longer than the threshold is written as JSON to
+    `PROFILE_DIR` in the log directory.
+
+    With the threshold at 0 nothing is sampled and no thread is started.
+    """
+
+    settings = monitor_settings
+    profile_dir = logging_settings.LOG_PATH / monitor_settings.PROFILE_DIR
+
+    __slots__ = (
+        "dumped",
+        "_profiles",
+        "_lock",
+        "_active",
+        "_stopped",
+        "_loop",
+        "_loop_thread",
+    )
+
+    def __init__(self) -> None:
+        self.dumped = 0
+        self._profiles: dict[Task | None, UploadProfile] = {}
+        self._lock = Lock()
+        self._active = Event()  # set while a profile is open
+        self._stopped = Event()
+        self._loop: AbstractEventLoop | None = None
+        self._loop_thread = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Returns True if the uploads are profiled."""
+        return self.settings.PROFILE_THRESHOLD > 0 and self._loop is not None
+
+    @staticmethod
+    def fold_stack(frame: FrameType | None) -> str:
+        """Returns the stack of the frame as a folded line, the outermost function first."""
+        names: list[str] = []
+        while frame is not None:
+            names.append(LoopMonitor.frame_name(frame, line=False))
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    @staticmethod
+    def write(path: Path, data: dict[str, Any]) -> None:
+        """Writes the profile (blocking)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(data, indent=2, default=str))
+
+    def start(self) -> None:
+        """Starts the sampling thread (in the event loop thread) if the uploads are profiled."""
+        if self._loop is not None or self.settings.PROFILE_THRESHOLD <= 0:
+            return
+
+        self._loop = get_running_loop()
+        self._loop_thread = get_ident()
+        self._stopped.clear()
+        Thread(target=self._sample, name="upload-profiler", daemon=True).start()
+
+    def stop(self) -> None:
+        """Stops the sampling thread."""
+        self._stopped.set()
+        self._active.set()
+        self._loop = None
+
+    def open(self) -> UploadProfile | None:
+        """Opens the profile of the upload run by the current task if it is sampled."""
+        if not self.enabled or random() >= self.settings.PROFILE_SAMPLE_RATE:
+            return None
+
+        profile = UploadProfile(current_task())
+        with self._lock:
+            self._profiles[profile.task] = profile
+            self._active.set()
+        return profile
+
+    async def close(self, profile: UploadProfile, context: dict[str, Any]) -> None:
+        """Closes the profile, dumps it if the upload was slow."""
+        with self._lock:
+            self._profiles.pop(profile.task, None)
+            if not self._profiles:
+                self._active.clear()
+
+        if (duration := profile.duration) < self.settings.PROFILE_THRESHOLD:
+            return
+
+        path = self.profile_dir / f"{time_ns()}_{context['user_id']}_{context['session_id']}.json"
+        try:
+            await filesystem.run("profile", self.write, path, profile.to_dict(context))
+        except OSError as e:
+            logger.warning(f"Failed to write the upload profile {path}: {e}")
+            return
+
+        self.dumped += 1
+        logger.warning(f"Slow upload of {context['file_name']} ({duration:.3f}s) profiled to {path}", extra=context)
+
+    def _sample(self) -> None:
+        interval = self.settings.PROFILE_INTERVAL
+
+        while self._active.wait() and not self._stopped.wait(interval):
+            loop = self._loop
+            task = current_task(loop) if loop is not None else None
+            frame = sys._current_frames().get(self._loop_thread)
+
+            with self._lock:
+                for profile in self._profiles.values():
+                    profile.samples += 1
+                if frame is not None and (running := self._profiles.get(task)) is not None:
+                    running.stacks[self.fold_stack(frame)] += 1
+
+
+upload_profiler = UploadProfiler()
@@ -0,0 +1,95 @@
+from time import perf_counter
+
+from core.config.websocket import websocket_settings
+from enums import FileStatusMessage
+
+
+class ChunkAdvisor:
+    """
+    Measures the throughput and round-trip time of a connection and suggests the chunk size to the client.
+
+    The suggestion is what the client sends in `CHUNK_INTERVAL` (or in one
+    round trip, if longer), rounded up to a power of two within
+    `CHUNK_SIZE_MIN`..`CHUNK_SIZE_MAX`: large enough for the per-chunk work
+    (receive, checks, progress, write hop) to be negligible, small enough
+    to keep the buffers and the progress granularity small. The round trip
+    is the time from the READY message to the first chunk.
+
+    The suggestion is advice only: chunks of any size up to `CHUNK_SIZE_CAP`
+    are accepted, so clients sending small fixed-size chunks keep working.
+    """
+
+    settings = websocket_settings
+    status_msg = FileStatusMessage
+
+    window = 0.5  # seconds of chunks per throughput sample
+    smoothing = 0.3  # weight of a new sample in the moving averages
+
+    __slots__ = (
+        "chunk_size",
+        "throughput",
+        "rtt",
+        "_ready_time",
+        "_window_start",
+        "_window_bytes",
+        "_last_time",
+    )
+
+    def __init__(self) -> None:
+        self.chunk_size = self.clamp(self.settings.CHUNK_SIZE)
+        self.throughput = 0.0  # bytes per second
+        self.rtt = 0.0  # seconds
+
+        self._ready_time: float | None = None
+        self._window_start: float | None = None
+        self._window_bytes = 0
+        self._last_time = 0.0
+
+    @classmethod
+    def clamp(cls, size: float) -> int:
+        """Returns the power of two not less than the size, within the range of the suggested sizes."""
+        size = max(cls.settings.CHUNK_SIZE_MIN, min(cls.settings.CHUNK_SIZE_MAX, int(size)))
+        return min(1 << (size - 1).bit_length(), cls.settings.CHUNK_SIZE_MAX)
+
+    @classmethod
+    def average(cls, average: float, sample: float) -> float:
+        """Returns the moving average updated with the sample (the sample if there is no average yet)."""
+        return sample if not average else average + cls.smoothing * (sample - average)
+
+    def ready(self) -> None:
+        """Starts measuring the chunks of the next file, the chunks of the previous file left are a sample too."""
+        if self._window_start is not None and self._window_bytes:
+            self.update(self._window_bytes, self._last_time - self._window_start)
+
+        self._ready_time = perf_counter()
+        self._window_start = None
+
+    def check_size(self, size: int) -> None:
+        """Checks if the chunk size is acceptable."""
+        if self.settings.CHUNK_SIZE_CAP and size > self.settings.CHUNK_SIZE_CAP:
+            raise ValueError(self.status_msg.INVALID_CHUNK_SIZE)
+
+    def observe(self, size: int) -> None:
+        """Checks the size of the received chunk and updates the measurements and the suggested chunk size."""
+        self.check_size(size)
+        now = perf_counter()
+
+        if self._window_start is None:
+            # The first chunk only opens the window, it was sent before the measured interval
+            if self._ready_time is not None:
+                self.rtt = self.average(self.rtt, now - self._ready_time)
+            self._window_start, self._window_bytes = now, 0
+            return
+
+        self._window_bytes += size
+        self._last_time = now
+
+        if now - self._window_start >= self.window:
+            self.update(self._window_bytes, now - self._window_start)
+            self._window_start, self._window_bytes = now, 0
+
+    def update(self, received: int, elapsed: float) -> None:
+        """Updates the throughput with the bytes received in the time and the suggested chunk size."""
+        if elapsed > 0:
+            self.throughput = self.average(self.throughput, received / elapsed)
+            self.chunk_size = self.clamp(self.throughput * max(self.settings.CHUNK_INTERVAL, self.rtt))
@@ -0,0 +1,100 @@
+from asyncio import Task, create_task, get_running_loop, sleep
+from heapq import heappop, heappush
+from itertools import count
+from time import time
+from typing import Protocol
+
+from core.config.websocket import websocket_settings
+
+
+class TimeoutTarget(Protocol):
+    last_activity_time: float
+
+    async def disconnect_by_timeout(self) -> None:
+        """Disconnects the client by timeout."""
+
+
+class TimeoutScheduler:
+    """
+    Process-wide inactivity timer for WebSocket connections.
+
+    Deadlines are kept in a heap driven by a single task. Activity only
+    updates `last_activity_time` of the connection, an expired heap entry
+    is re-pushed with the actual deadline when it is popped.
+    """
+
+    settings = websocket_settings
+
+    __slots__ = (
+        "_heap",
+        "_connections",
+        "_counter",
+        "_task",
+        "_disconnects",
+    )
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int, TimeoutTarget]] = []
+        self._connections: set[TimeoutTarget] = set()
+        self._counter = count()
+        self._task: Task | None = None
+        self._disconnects: set[Task] = set()
+
+    def register(self, connection: TimeoutTarget) -> None:
+        """Starts tracking the inactivity of the connection."""
+        self._connections.add(connection)
+        self._push(connection, connection.last_activity_time + self.settings.TIMEOUT)
+
+        if self._task is None or self._task.done() or self._task.get_loop() is not get_running_loop():
+            self._task = create_task(self._run())
+
+    def unregister(self, connection: TimeoutTarget) -> None:
+        """Stops tracking the connection (its heap entry is dropped when popped)."""
+        self._connections.discard(connection)
+
+    def shutdown(self) -> None:
+        """Stops the timer task."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        self._heap.clear()
+        self._connections.clear()
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def _push(self, connection: TimeoutTarget, deadline: float) -> None:
+        heappush(self._heap, (deadline, next(self._counter), connection))
+
+    def _expire(self, now: float) -> None:
+        """Disconnects the connections whose deadline has passed, re-pushes the active ones."""
+        while self._heap and self._heap[0][0] <= now:
+            _, _, connection = heappop(self._heap)
+
+            if connection not in self._connections:
+                continue
+
+            deadline = connection.last_activity_time + self.settings.TIMEOUT
+            if deadline > now:
+                self._push(connection, deadline)
+                continue
+
+            self._connections.discard(connection)
+            task = create_task(connection.disconnect_by_timeout())
+            self._disconnects.add(task)
+            task.add_done_callback(self._disconnects.discard)
+
+    async def _run(self) -> None:
+        """Wakes up at the nearest deadline, but not more often than once per `DELAY` seconds."""
+        while self._connections:
+            now = time()
+            self._expire(now)
+
+            delay = self._heap[0][0] - now if self._heap else self.settings.TIMEOUT
+            await sleep(max(delay, self.settings.DELAY))
+
+        self._heap.clear()
+
+
+timeout_scheduler = TimeoutScheduler()
@@ -0,0 +1,196 @@
+import hashlib
+import os
+from contextlib import suppress
+from pathlib import Path
+from time import time
+from types import TracebackType
+from typing import Self
+
+from core.config.upload import upload_settings
+
+from .content import ContentStore
+from .filesystem import filesystem
+
+
+class BufferedFileWriter:
+    """
+    Writes received chunks to a staging file in large aligned blocks.
+
+    Chunks are gathered in memory and written once `WRITE_BUFFER_SIZE`
+    bytes are buffered, so each write ends on a `WRITE_ALIGNMENT` boundary
+    of the file. A declared file size can be preallocated. On exit the rest
+    of the buffer is written and the file is truncated to the written size,
+    so the file size is the offset to resume an interrupted upload from.
+
+    A preallocated file has the declared size until it is closed, so the
+    written size is recorded in an extended attribute after every write
+    (the file is not preallocated where they are not supported). If the
+    worker dies before the file is closed, the upload is resumed from the
+    recorded size and the file is truncated to it.
+
+    If a digest is given it is updated with the written data in the I/O
+    executor (with the part of the file already written on resume).
+    """
+
+    settings = upload_settings
+    size_attribute = "user.upload.written"
+
+    __slots__ = (
+        "path",
+        "offset",
+        "size",
+        "digest",
+        "_fd",
+        "_buffer",
+        "_preallocated",
+    )
+
+    def __init__(
+        self, path: Path, offset: int = 0, size: int | None = None, digest: "hashlib._Hash | None" = None
+    ) -> None:
+        self.path = path
+        self.offset = offset  # bytes written to the file
+        self.size = size
+        self.digest = digest
+
+        self._fd: int | None = None
+        self._buffer = bytearray()
+        self._preallocated = False
+
+    @property
+    def position(self) -> int:
+        """Returns the number of bytes received (written and buffered)."""
+        return self.offset + len(self._buffer)
+
+    @classmethod
+    def claim(cls, path: Path, max_age: float) -> int:
+        """
+        Marks the partial file as in use, so that the storage sweeps keep it (blocking), returns its written size
+        if it is younger than `max_age` (the offset to resume from), 0 otherwise.
+        """
+        try:
+            stat = os.stat(path)
+            os.utime(path)
+        except FileNotFoundError:
+            return 0
+
+        return cls.written_size(path, stat.st_size) if time() - stat.st_mtime < max_age else 0
+
+    @classmethod
+    def written_size(cls, path: Path, size: int) -> int:
+        """Returns the written part of the partial file of the size (blocking), less if it is preallocated."""
+        try:
+            return min(size, int(os.getxattr(path, cls.size_attribute)))
+        except (AttributeError, OSError, ValueError):  # not preallocated (or no extended attributes)
+            return size
+
+    @classmethod
+    def _write(cls, fd: int, view: memoryview, offset: int, digest: "hashlib._Hash | None", record: bool) -> None:
+        """Writes all the data at the offset, updates the digest with it and records the written size (blocking)."""
+        if digest is not None:
+            digest.update(view)
+
+        while view:
+            written = os.pwrite(fd, view, offset)
+            view = view[written:]
+            offset += written
+
+        if record:
+            os.setxattr(fd, cls.size_attribute, str(offset).encode())
+
+    @classmethod
+    def _preallocate(cls, fd: int, size: int) -> None:
+        """Allocates the size, once the written size can be recorded (blocking)."""
+        os.setxattr(fd, cls.size_attribute, b"0")
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            os.removexattr(fd, cls.size_attribute)
+            raise
+
+    @classmethod
+    def _truncate(cls, fd: int, size: int) -> None:
+        """Truncates the file to the written size, which no longer needs to be recorded (blocking)."""
+        os.ftruncate(fd, size)
+        with suppress(AttributeError, OSError):
+            os.removexattr(fd, cls.size_attribute)
+
+    async def open(self) -> None:
+        """Opens the file (truncates it to the offset of a resumed upload) and preallocates the declared size."""
+        flags = os.O_WRONLY | os.O_CREAT | (0 if self.offset else os.O_TRUNC)
+        self._fd = await filesystem.run("open", os.open, self.path, flags, 0o644)
+
+        if self.offset:
+            # Drops the rest of a preallocated file left open by a dead worker
+            await filesystem.run("truncate", self._truncate, self._fd, self.offset)
+
+        if self.digest is not None and self.offset:
+            await filesystem.run("hash", ContentStore.hash_file, self.path, self.digest, self.offset)
+
+        if self.size and not self.offset and self.settings.PREALLOCATE and hasattr(os, "posix_fallocate"):
+            with suppress(OSError):
+                await filesystem.run("fallocate", self._preallocate, self._fd, self.size)
+                self._preallocated = True
+
+    async def write(self, chunk: bytes) -> None:
+        """Buffers the chunk, writes the aligned part of the buffer once it is full."""
+        if not self._buffer and len(chunk) >= self.settings.WRITE_BUFFER_SIZE:
+            # A large chunk is written without copying it to the buffer
+            size = self._aligned_size(len(chunk))
+            await self._write_at_offset(memoryview(chunk)[:size])
+            self._buffer += memoryview(chunk)[size:]
+            return
+
+        self._buffer += chunk
+
+        if len(self._buffer) >= self.settings.WRITE_BUFFER_SIZE:
+            await self.flush(self._aligned_size(len(self._buffer)))
+
+    async def flush(self, size: int | None = None) -> None:
+        """Writes `size` bytes of the buffer (the whole buffer by default)."""
+        size = len(self._buffer) if size is None else size
+
+        if size <= 0 or self._fd is None:
+            return
+
+        # The written part is not copied, only the unaligned tail moves to a new buffer
+        data, self._buffer = self._buffer, self._buffer[size:]
+        await self._write_at_offset(memoryview(data)[:size])
+
+    async def close(self) -> None:
+        """Writes the rest of the buffer, drops unused preallocated space and closes the file."""
+        if self._fd is None:
+            return
+
+        fd = self._fd
+        try:
+            await self.flush()
+            if self._preallocated:
+                await filesystem.run("truncate", self._truncate, fd, self.offset)
+        finally:
+            self._fd = None
+            await filesystem.run("close", os.close, fd)
+
+    def _aligned_size(self, size: int) -> int:
+        """Returns how many of `size` bytes following the offset end on an alignment boundary."""
+        alignment = self.settings.WRITE_ALIGNMENT
+        return (self.offset + size) // alignment * alignment - self.offset
+
+    async def _write_at_offset(self, view: memoryview) -> None:
+        if self._fd is None:
+            raise ValueError("I/O operation on closed file")
+
+        await filesystem.run("write", self._write, self._fd, view, self.offset, self.digest, self._preallocated)
+        self.offset += len(view)
+
+    async def __aenter__(self) -> Self:
+        await self.open()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.close()
@@ -1,2 +1,3 @@
 from .base import BaseFileValidator as BaseFileValidator
+from .dimensions import DimensionSniffer as DimensionSniffer
 from .image import ImageFileValidator as ImageFileValidator
@@ -1,7 +1,11 @@
-from pathlib import Path
+from functools import cached_property
 
 from core.config.defaults import DEFAULTS
 from enums import FileStatusMessage
+from services.manifest import SessionManifest
+
+from .dimensions import Dimensions, DimensionSniffer
+from .signatures import SIGNATURES, Signature, detect_format
 
 
 class BaseFileValidator:
@@ -9,6 +13,8 @@ class BaseFileValidator:
     allowed_formats = DEFAULTS.ALLOWED_FORMATS
     max_files = DEFAULTS.MAX_FILE_COUNT
     max_size = DEFAULTS.MAX_FILE_SIZE
+    max_megapixels = DEFAULTS.MAX_MEGAPIXELS
+    dimensions_scan_limit = DEFAULTS.DIMENSIONS_SCAN_LIMIT
 
     status_msg = FileStatusMessage
 
@@ -17,20 +23,41 @@ class BaseFileValidator:
         """Returns the maximum file size in bytes."""
         return self.max_size * DEFAULTS.BYTES
 
-    def validate_header(self, data: bytes) -> None:
-        """Checks if the first bytes of the file are valid."""
-        if self.allowed_formats == "*":
-            return
+    @cached_property
+    def signatures(self) -> tuple[tuple[str, Signature], ...]:
+        """Returns the signatures of the allowed formats (of all known formats if any format is allowed)."""
+        formats = SIGNATURES if self.allowed_formats == "*" else self.allowed_formats
+        return tuple((fmt, ranges) for fmt in formats for ranges in SIGNATURES.get(fmt, ()))
+
+    @classmethod
+    def check_dimensions(cls, dimensions: Dimensions | None) -> None:
+        """Checks if the image dimensions (if known) exceed the megapixel limit (if any)."""
+        if cls.max_megapixels and dimensions and dimensions[0] * dimensions[1] > cls.max_megapixels * 1_000_000:
+            raise ValueError(cls.status_msg.IMAGE_TOO_LARGE)
+
+    def validate_header(self, data: bytes) -> str | None:
+        """Checks if the first bytes of the file are valid, returns the detected format."""
+        fmt = detect_format(data, self.signatures)
 
-        if not any(getattr(self, f"is_{fmt}")(data) for fmt in self.allowed_formats):
+        if fmt is None and self.allowed_formats != "*":
             raise ValueError(self.status_msg.INVALID_FILE_FORMAT)
 
-    def check_size_limits(self, current_size: int) -> None:
-        """Checks if the file size has been exceeded."""
+        return fmt
+
+    def create_sniffer(self, fmt: str | None) -> DimensionSniffer | None:
+        """Returns a reader of the dimensions of the format, if they are limited and can be read."""
+        if self.max_megapixels == 0:
+            return None
+        return DimensionSniffer.for_format(fmt, self.dimensions_scan_limit)
+
+    def check_size_limits(self, current_size: int, declared_size: int | None = None) -> None:
+        """Checks if the file size (or the size declared by the client, if any) has been exceeded."""
         if self.max_size_bytes != 0 and current_size > self.max_size_bytes:
             raise ValueError(self.status_msg.FILE_SIZE_EXCEEDED)
+        if declared_size is not None and current_size > declared_size:
+            raise ValueError(self.status_msg.FILE_SIZE_EXCEEDED)
 
-    def check_upload_limits(self, file_dir: Path) -> None:
-        """Checks if the upload file limits have been exceeded."""
-        if self.max_files != 0 and len(list(file_dir.iterdir())) > self.max_files:
+    def check_upload_limits(self, manifest: SessionManifest, file_idx: int) -> None:
+        """Checks if the file would exceed the upload file limits (a file replacing a stored index would not)."""
+        if self.max_files != 0 and file_idx not in manifest.file_idxs and manifest.file_idx_count >= self.max_files:
             raise ValueError(self.status_msg.UPLOAD_LIMIT_EXCEEDED)
@@ -0,0 +1,33 @@
+from functools import cache
+
+from PIL import Image
+
+
+@cache
+def load_codecs() -> None:
+    """
+    Loads the image codecs and the hashing library (once per process).
+
+    The HEIF plugin, the Pillow plugins and `imagehash` (with NumPy) are only
+    needed where images are decoded, so they are loaded by the CPU executor
+    workers on first use (or on warm-up), not on the start of the server.
+    """
+    import imagehash  # noqa: F401
+    from pillow_heif import register_heif_opener  # type: ignore
+
+    register_heif_opener()
+    Image.init()
+
+
+def image_hash(img: Image.Image) -> str:
+    """Returns the difference hash of the image as 16 hex digits."""
+    from imagehash import dhash
+
+    return str(dhash(img))
+
+
+def perceptual_hash(img: Image.Image) -> str:
+    """Returns the perceptual (DCT) hash of the image as 16 hex digits."""
+    from imagehash import phash
+
+    return str(phash(img))
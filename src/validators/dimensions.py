@@ -0,0 +1,216 @@
+from struct import error as StructError
+from struct import unpack_from
+from typing import Callable, Generator
+
+# A parser yields the number of bytes it needs next (negative to skip them) and receives them,
+# it returns (width, height) or None if the dimensions cannot be read
+Dimensions = tuple[int, int]
+Parser = Generator[int, bytes, Dimensions | None]
+BoxReader = Generator[int, bytes, tuple[bytes, int, int]]
+
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+JPEG_STANDALONE_MARKERS = frozenset({0x01, *range(0xD0, 0xD8)})
+JPEG_NO_SOF_MARKERS = frozenset({0xD9, 0xDA})  # end of image, start of scan
+
+
+def read_jpeg_marker() -> Generator[int, bytes, int | None]:
+    """Reads the next marker (skipping its fill bytes), returns None if the data is not at a marker."""
+    if (yield 1) != b"\xff":
+        return None
+
+    marker = (yield 1)[0]
+    while marker == 0xFF:  # fill bytes
+        marker = (yield 1)[0]
+
+    return marker
+
+
+def parse_jpeg() -> Parser:
+    """Reads the dimensions from the first SOFn segment, other segments are skipped."""
+    dimensions = None
+
+    if (yield 2) == b"\xff\xd8":
+        while (marker := (yield from read_jpeg_marker())) is not None and marker not in JPEG_NO_SOF_MARKERS:
+            if marker in JPEG_STANDALONE_MARKERS:
+                continue
+
+            (length,) = unpack_from(">H", (yield 2))
+            if marker in JPEG_SOF_MARKERS:
+                height, width = unpack_from(">HH", (yield 5), 1)
+                dimensions = width, height
+                break
+
+            yield -max(length - 2, 0)
+
+    return dimensions
+
+
+def parse_png() -> Parser:
+    """Reads the dimensions from the IHDR chunk, which follows the signature."""
+    header = yield 24
+    if header[12:16] != b"IHDR":
+        return None
+
+    width, height = unpack_from(">II", header, 16)
+    return width, height
+
+
+def parse_webp() -> Parser:
+    """Reads the dimensions from the first chunk (VP8, VP8L or VP8X)."""
+    header = yield 30
+    chunk_type = header[12:16]
+    dimensions = None
+
+    if chunk_type == b"VP8 ":
+        width, height = unpack_from("<HH", header, 26)
+        dimensions = width & 0x3FFF, height & 0x3FFF
+    elif chunk_type == b"VP8L":
+        bits = int.from_bytes(header[21:25], "little")
+        dimensions = (bits & 0x3FFF) + 1, (bits >> 14 & 0x3FFF) + 1
+    elif chunk_type == b"VP8X":
+        dimensions = int.from_bytes(header[24:27], "little") + 1, int.from_bytes(header[27:30], "little") + 1
+
+    return dimensions
+
+
+def read_box_header() -> BoxReader:
+    """Reads an ISOBMFF box header, returns the box type, the header and the payload sizes."""
+    header = yield 8
+    size, box_type = unpack_from(">I4s", header)
+
+    if size == 1:
+        (size,) = unpack_from(">Q", (yield 8))
+        return box_type, 16, max(size - 16, 0)
+
+    if size == 0:  # the box extends to the end of the file
+        return box_type, 8, 1 << 62
+
+    return box_type, 8, max(size - 8, 0)
+
+
+def find_box(box_type: bytes, limit: int) -> Generator[int, bytes, int | None]:
+    """Skips the sibling boxes up to the box of the type within `limit` bytes, returns its payload size."""
+    while limit >= 8:
+        found, header_size, payload_size = yield from read_box_header()
+        limit -= header_size + payload_size
+
+        if found == box_type:
+            return payload_size
+
+        yield -payload_size
+
+    return None
+
+
+def parse_heif() -> Parser:
+    """Reads the largest image spatial extents (`ispe`) of the item properties: meta > iprp > ipco > ispe."""
+    meta_size = yield from find_box(b"meta", 1 << 62)
+    if meta_size is None:
+        return None
+
+    yield 4  # version and flags of the full box
+    iprp_size = yield from find_box(b"iprp", meta_size - 4)
+    if iprp_size is None:
+        return None
+
+    size = yield from find_box(b"ipco", iprp_size)
+    extents = []
+
+    while size is not None and size >= 8:
+        box_type, header_size, payload_size = yield from read_box_header()
+        size -= header_size + payload_size
+
+        if box_type == b"ispe":
+            extents.append(unpack_from(">II", (yield payload_size), 4))
+        else:
+            yield -payload_size
+
+    return max(extents, key=lambda extent: extent[0] * extent[1], default=None)
+
+
+class DimensionSniffer:
+    """
+    Reads the image dimensions from the header while the file is received.
+
+    Chunks are fed as they arrive and only the bytes a parser asks for are
+    kept, skipped segments and boxes are never buffered. Parsing stops once
+    the dimensions are read, or after `scan_limit` bytes of the file.
+    """
+
+    parsers: dict[str, Callable[[], Parser]] = {
+        "jpeg": parse_jpeg,
+        "png": parse_png,
+        "webp": parse_webp,
+        "heic": parse_heif,
+        "heif": parse_heif,
+    }
+    max_read = 64 * 1024
+
+    __slots__ = (
+        "dimensions",
+        "scan_limit",
+        "_parser",
+        "_request",
+        "_buffer",
+        "_start",
+        "_position",
+    )
+
+    def __init__(self, parser: Parser, scan_limit: int) -> None:
+        self.dimensions: Dimensions | None = None
+        self.scan_limit = scan_limit
+
+        self._parser = parser
+        self._request = next(parser)
+        self._buffer = bytearray()
+        self._start = 0  # parsed bytes at the start of the buffer
+        self._position = 0  # parsed bytes of the file
+
+    @classmethod
+    def for_format(cls, fmt: str | None, scan_limit: int) -> "DimensionSniffer | None":
+        """Returns a sniffer for the format or None if the format is not supported."""
+        parser = cls.parsers.get(fmt or "")
+        return cls(parser(), scan_limit) if parser else None
+
+    def feed(self, chunk: bytes) -> bool:
+        """Parses the chunk, returns True once the dimensions are read or cannot be read."""
+        parsed = self._start
+        del self._buffer[:parsed]
+        self._buffer += chunk
+        self._start = 0
+
+        done = False
+
+        while not done and (data := self._take()) is not None:
+            try:
+                self._request = self._parser.send(data)
+            except StopIteration as result:
+                self.dimensions = result.value
+                done = True
+            except (StructError, IndexError):  # malformed header, left to the image decoder
+                done = True
+            else:
+                if self._position > self.scan_limit or self._request > self.max_read:
+                    self._parser.close()
+                    done = True
+
+        return done
+
+    def _take(self) -> bytes | None:
+        """Takes the requested bytes from the buffer, returns None while more bytes are needed."""
+        available = len(self._buffer) - self._start
+
+        if self._request < 0:
+            skipped = min(-self._request, available)
+            self._start += skipped
+            self._position += skipped
+            self._request += skipped
+            return None if self._request else b""
+
+        if available < self._request:
+            return None
+
+        start, end = self._start, self._start + self._request
+        self._start = end
+        self._position += self._request
+        return bytes(self._buffer[start:end])
@@ -1,15 +1,13 @@
-import re
 from pathlib import Path
 
-from imagehash import ImageHash, hex_to_hash
 from PIL import Image, UnidentifiedImageError
-from pillow_heif import register_heif_opener  # type: ignore
 
 from core.config.image import image_settings
+from services.executor import cpu_executor
+from services.manifest import SessionManifest
 
 from .base import BaseFileValidator
-
-register_heif_opener()
+from .codecs import image_hash, load_codecs
 
 
 class ImageFileValidator(BaseFileValidator):
@@ -17,44 +15,47 @@ class ImageFileValidator(BaseFileValidator):
     allowed_formats = image_settings.ALLOWED_FORMATS
     max_files = image_settings.MAX_FILE_COUNT
     max_size = image_settings.MAX_FILE_SIZE
-
-    @staticmethod
-    def is_heic(chunk: bytes) -> bool:
-        sequence = (b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx", b"hevm", b"hevs")
-        return chunk[4:8] == b"ftyp" and chunk[8:12] in sequence
-
-    @staticmethod
-    def is_heif(chunk: bytes) -> bool:
-        sequence = (b"mif1", b"msf1")
-        return chunk[4:8] == b"ftyp" and chunk[8:12] in sequence
-
-    @staticmethod
-    def is_jpeg(chunk: bytes) -> bool:
-        return chunk.startswith(b"\xff\xd8") or chunk[6:10] in (b"JFIF", b"Exif")
-
-    @staticmethod
-    def is_png(chunk: bytes) -> bool:
-        return chunk.startswith(b"\x89PNG\r\n\x1a\n")
-
-    @staticmethod
-    def is_webp(chunk: bytes) -> bool:
-        return chunk.startswith(b"RIFF") and chunk[8:12] == b"WEBP"
-
-    async def validate_image(self, file_path: Path | str) -> None:
-        """Checks if the file is an image_uploader."""
+    max_megapixels = image_settings.MAX_MEGAPIXELS
+
+    hash_decode_size = image_settings.HASH_DECODE_SIZE
+    min_hash_distance = 10
+
+    @classmethod
+    def reduce_image(cls, img: Image.Image) -> None:
+        """Decodes the image at the reduced scale of the hashes (blocking)."""
+        # JPEG is decoded at 1/2..1/8 scale (luminance only), which still reads the whole primary image.
+        # Other formats are fully decoded first (for HEIF, draft would only decode an embedded thumbnail,
+        # so a corrupt primary image would pass), then reduced by an integer factor before resizing
+        if img.format == "JPEG":
+            img.draft("L", (cls.hash_decode_size, cls.hash_decode_size))
+        else:
+            img.load()
+        img.thumbnail((cls.hash_decode_size, cls.hash_decode_size))
+
+    @classmethod
+    def inspect_image(cls, file_path: Path | str) -> str:
+        """Checks if the file is an image and generates its hash in a single reduced-scale decode (blocking)."""
+        load_codecs()
         try:
-            with Image.open(file_path) as img:
-                img.verify()
-        except (UnidentifiedImageError, OSError):
-            raise ValueError(self.status_msg.INVALID_FILE_FORMAT)
-
-    async def validate_unique(self, file_path: Path, file_idx: int, file_hash: ImageHash) -> None:
-        """Checks if the file is unique."""
-        data = [
-            (int(match.group(1)), match.group(2))
-            for file in file_path.parent.iterdir()
-            if (match := re.match(r"^(\d+)_([^.]+)", file.name)) and file != file_path
-        ]
-
-        if not all(i == file_idx or file_hash - hex_to_hash(h) >= 10 for i, h in data):
+            img = Image.open(file_path)
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+            raise ValueError(cls.status_msg.INVALID_FILE_FORMAT)
+
+        with img:
+            # The dimensions are not always read while the file streams in (resumed uploads, headers
+            # past the scan limit), so they are checked again before the image is decoded
+            cls.check_dimensions(img.size)
+            try:
+                cls.reduce_image(img)
+                return image_hash(img)
+            except (Image.DecompressionBombError, OSError, ValueError):  # the HEIF decoder raises ValueError
+                raise ValueError(cls.status_msg.INVALID_FILE_FORMAT)
+
+    async def validate_image(self, file_path: Path | str) -> str:
+        """Checks if the file is an image_uploader and returns its hash."""
+        return await cpu_executor.run(self.inspect_image, file_path)
+
+    def validate_unique(self, manifest: SessionManifest, file_idx: int, file_hash: str) -> None:
+        """Checks if the file is unique among the files stored in the session."""
+        if manifest.fingerprints.has_duplicate(file_idx, int(file_hash, 16), self.min_hash_distance):
             raise ValueError(self.status_msg.UNIQUE_FILE)
@@ -0,0 +1,34 @@
+# File signatures by format: any of the alternatives matches if all its byte ranges hold one of the values
+Signature = tuple[tuple[int, int, frozenset[bytes]], ...]
+
+HEIC_BRANDS = (b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx", b"hevm", b"hevs")
+HEIF_BRANDS = (b"mif1", b"msf1")
+
+
+def signature(*ranges: tuple[int, tuple[bytes, ...]]) -> Signature:
+    """Compiles the (offset, values) ranges of a signature, the values of a range have the same length."""
+    return tuple((offset, offset + len(values[0]), frozenset(values)) for offset, values in ranges)
+
+
+SIGNATURES: dict[str, tuple[Signature, ...]] = {
+    "jpeg": (
+        signature((0, (b"\xff\xd8",))),
+        signature((6, (b"JFIF", b"Exif"))),
+    ),
+    "png": (signature((0, (b"\x89PNG\r\n\x1a\n",))),),
+    "webp": (signature((0, (b"RIFF",)), (8, (b"WEBP",))),),
+    "heic": (signature((4, (b"ftyp",)), (8, HEIC_BRANDS)),),
+    "heif": (signature((4, (b"ftyp",)), (8, HEIF_BRANDS)),),
+}
+
+
+def detect_format(data: bytes, signatures: tuple[tuple[str, Signature], ...]) -> str | None:
+    """Returns the format of the first matching signature (plain loops, this runs for every upload)."""
+    for fmt, ranges in signatures:
+        for start, end, values in ranges:
+            if data[start:end] not in values:
+                break
+        else:
+            return fmt
+
+    return None
@@ -0,0 +1,151 @@
+"""
+Benchmark: server CPU time per uploaded MB across client chunk sizes.
+
+Starts the application with uvicorn in this process, with `BASE_DIR` and
+`LOG_PATH` pointed at a temporary directory, and uploads the same files
+from a client process with every chunk size. The CPU time of this process
+(event loop and I/O threads, the image decoding runs in the CPU executor
+processes and is not counted) is divided by the uploaded megabytes, so the
+per-chunk overhead (receive, checks, progress, write hop) shows up as the
+difference between the chunk sizes. The chunk size suggested by the server
+at the end of every round is reported too.
+
+Usage (from the project root):
+    PYTHONPATH=src python -m tests.benchmarks.bench_chunks --chunk-sizes 4 16 64 256 1024 --output chunks.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from uuid import uuid4
+
+import uvicorn
+from fastapi import FastAPI
+from websockets.asyncio.client import connect
+
+from .bench_upload import TERMINAL_STATUSES, send_chunks
+from .corpus import generate_corpus
+
+
+async def upload_files(url: str, files: list[tuple[Path, bytes]], uploads: int, chunk_size: int) -> dict:
+    """Uploads the files one by one over one connection, returns the uploaded bytes and the last suggestion."""
+    uploaded = 0
+    suggested = None
+
+    async with connect(url, max_size=None) as ws:
+        for number in range(uploads):
+            file_path, data = files[number % len(files)]
+            action = {
+                "action": "upload",
+                "file_idx": 0,
+                "file_name": file_path.name,
+                "user_id": str(uuid4()),
+                "session_id": str(uuid4()),
+            }
+            await ws.send(json.dumps(action))
+            message = json.loads(await ws.recv())
+            suggested = message.get("chunk_size", suggested)
+
+            sender = asyncio.create_task(send_chunks(ws, data, chunk_size))
+            while message["status"] not in TERMINAL_STATUSES:
+                message = json.loads(await ws.recv())
+                suggested = message.get("chunk_size", suggested)
+            sender.cancel()
+
+            if message["status"] != "success":
+                raise RuntimeError(f"Upload failed with chunk size {chunk_size}: {message}")
+            uploaded += len(data)
+
+    return {"uploaded_bytes": uploaded, "suggested_chunk_size": suggested}
+
+
+def run_client(url: str, paths: list[Path], uploads: int, chunk_size: int) -> dict:
+    """Runs the uploads in the client process."""
+    files = [(path, path.read_bytes()) for path in paths]
+    return asyncio.run(upload_files(url, files, uploads, chunk_size))
+
+
+async def run_rounds(app: FastAPI, paths: list[Path], args: argparse.Namespace) -> list[dict]:
+    """Serves the application and runs a round of uploads for every chunk size."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    url = f"ws://127.0.0.1:{port}/image/upload"
+    loop = asyncio.get_running_loop()
+    rounds = []
+
+    with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+        # Warm-up: the codecs, the executors and the client process are started before the measured rounds
+        await loop.run_in_executor(pool, run_client, url, paths, len(paths), args.chunk_sizes[-1] * 1024)
+
+        for chunk_size in args.chunk_sizes:
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            result = await loop.run_in_executor(pool, run_client, url, paths, args.uploads, chunk_size * 1024)
+            cpu_time, wall_time = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+            megabytes = result["uploaded_bytes"] / 1024**2
+            rounds.append(
+                {
+                    "chunk_size_kb": chunk_size,
+                    "uploaded_mb": megabytes,
+                    "cpu_ms_per_mb": cpu_time * 1000 / megabytes,
+                    "mb_per_second": megabytes / wall_time,
+                    "suggested_chunk_size_kb": (result["suggested_chunk_size"] or 0) // 1024,
+                }
+            )
+
+    server.should_exit = True
+    await serving
+    return rounds
+
+
+def report(rounds: list[dict]) -> None:
+    print(f"{'chunk KB':>9}{'MB':>8}{'CPU ms/MB':>11}{'MB/s':>9}{'suggested KB':>14}")
+    for result in rounds:
+        print(
+            f"{result['chunk_size_kb']:>9}{result['uploaded_mb']:>8.1f}{result['cpu_ms_per_mb']:>11.2f}"
+            f"{result['mb_per_second']:>9.1f}{result['suggested_chunk_size_kb']:>14}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[4, 16, 64, 256, 1024], help="KB")
+    parser.add_argument("--uploads", type=int, default=20, help="uploads per chunk size")
+    parser.add_argument("--formats", nargs="+", default=["jpeg", "png"])
+    parser.add_argument("--sizes", nargs="+", type=float, default=[2.0, 4.5], help="file sizes, MB")
+    parser.add_argument("--corpus", type=Path, default=Path(tempfile.gettempdir()) / "file-receiver-corpus")
+    parser.add_argument("--output", type=Path, help="save the results as JSON")
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.corpus, args.formats, [int(size * 1024**2) for size in args.sizes])
+
+    with tempfile.TemporaryDirectory(prefix="file-receiver-bench-") as base_dir:
+        # The settings are read on import, so the application is imported after the environment is set
+        os.environ["BASE_DIR"] = base_dir
+        os.environ["LOG_PATH"] = str(Path(base_dir) / "logs")
+        from main import app
+
+        rounds = asyncio.run(run_rounds(app, paths, args))
+
+    report(rounds)
+
+    if args.output:
+        args.output.write_text(json.dumps({"arguments": vars(args), "rounds": rounds}, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: validation + perceptual hashing of uploaded images.
+
+Compares the previous two-open path (`Image.verify()` followed by a full
+decode for `dhash`) with the single-pass reduced-scale decode used by
+`ImageFileValidator.inspect_image`. Each run happens in a fresh process,
+so CPU time and peak RSS are not affected by earlier runs.
+
+Usage (from the project root):
+    PYTHONPATH=src python -m tests.benchmarks.bench_image_decode --formats jpeg heic --count 5
+"""
+
+import argparse
+import json
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from multiprocessing import get_context
+from pathlib import Path
+from statistics import mean
+
+from imagehash import dhash
+from PIL import Image
+
+from validators import ImageFileValidator
+from validators.codecs import load_codecs
+
+from .corpus import generate_corpus
+
+
+def two_open(file_path: Path) -> str:
+    """The previous path: verify, then reopen and fully decode for the hash."""
+    with Image.open(file_path) as img:
+        img.verify()
+    return str(dhash(Image.open(file_path)))
+
+
+def single_pass(file_path: Path) -> str:
+    return ImageFileValidator.inspect_image(file_path)
+
+
+METHODS = {"two_open": two_open, "single_pass": single_pass}
+
+
+def peak_rss_kb() -> int:
+    """Returns the peak RSS of the process (VmHWM on Linux)."""
+    with suppress(OSError):
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def reset_peak_rss() -> None:
+    """Resets the peak RSS to the current RSS (Linux only, ru_maxrss survives exec otherwise)."""
+    with suppress(OSError):
+        Path("/proc/self/clear_refs").write_text("5")
+
+
+def measure(method: str, file_path: Path) -> dict:
+    """Runs one method on one file and returns its CPU time and peak RSS growth."""
+    load_codecs()
+    reset_peak_rss()
+    rss_before = peak_rss_kb()
+    cpu_before = time.process_time()
+
+    image_hash = METHODS[method](file_path)
+
+    return {
+        "cpu_ms": (time.process_time() - cpu_before) * 1000,
+        "peak_rss_mb": (peak_rss_kb() - rss_before) / 1024,
+        "hash": str(image_hash),
+    }
+
+
+def run(paths: list[Path], repeat: int) -> dict:
+    results: dict = {}
+
+    for path in paths:
+        fmt = path.name.split("_", 1)[0]
+        for method in METHODS:
+            samples = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                    samples.append(pool.submit(measure, method, path).result())
+            entry = results.setdefault(fmt, {}).setdefault(method, {"cpu_ms": [], "peak_rss_mb": [], "hashes": []})
+            entry["cpu_ms"].extend(sample["cpu_ms"] for sample in samples)
+            entry["peak_rss_mb"].extend(sample["peak_rss_mb"] for sample in samples)
+            entry["hashes"].append(samples[0]["hash"])
+
+    return results
+
+
+def report(results: dict) -> None:
+    print(f"{'format':<8}{'method':<14}{'cpu ms':>10}{'peak rss MB':>14}{'max hash distance':>20}")
+    for fmt, methods in results.items():
+        for method, entry in methods.items():
+            distance = max(
+                _hex_distance(left, right) for left, right in zip(entry["hashes"], methods["two_open"]["hashes"])
+            )
+            print(
+                f"{fmt:<8}{method:<14}{mean(entry['cpu_ms']):>10.1f}{mean(entry['peak_rss_mb']):>14.1f}{distance:>20}"
+            )
+
+
+def _hex_distance(left: str, right: str) -> int:
+    return bin(int(left, 16) ^ int(right, 16)).count("1")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", default=["jpeg", "png", "webp", "heic"])
+    parser.add_argument("--size", type=float, default=5.0, help="target file size, MB")
+    parser.add_argument("--count", type=int, default=3, help="files per format")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per file and method")
+    parser.add_argument("--corpus", type=Path, default=Path(tempfile.gettempdir()) / "file-receiver-corpus")
+    parser.add_argument("--output", type=Path, help="save the results as JSON")
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.corpus, args.formats, [int(args.size * 1024 * 1024)], args.count)
+    results = run(paths, args.repeat)
+    report(results)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Microbenchmark: CPU time per WebSocket message.
+
+- encoding of the status messages: a `ProgressStatus` dict encoded with the
+  standard library (as `send_json` does), with the optional orjson codec and
+  the pre-encoded frames of `WebSocketManager`
+- parsing of an action: `json.loads` + `UploadData(**data)` against
+  `UploadData.model_validate_json` (pydantic-core JSON parser)
+- a whole send through a connected Starlette WebSocket (the ASGI send does
+  nothing), `send_json` of a dict against `send_frame` of a pre-encoded frame
+
+Usage (from the project root):
+    PYTHONPATH=src python -m tests.benchmarks.bench_messages --output messages.json
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Coroutine, MutableMapping
+from uuid import uuid4
+
+from starlette.websockets import WebSocket
+
+from api.schemas import ProgressStatus, UploadData
+from enums import FileStatusMessage, WebSocketStatus, WebSocketStatusMessage
+from managers.websocket import WebSocketManager
+from services.codec import json_codec, orjson
+
+MESSAGES = {
+    "ready": ProgressStatus(
+        status=WebSocketStatus.READY, message=WebSocketStatusMessage.READY, progress=0, offset=0, chunk_size=256 * 1024
+    ),
+    "uploading": ProgressStatus(
+        status=WebSocketStatus.UPLOADING, message=WebSocketStatusMessage.UPLOADING, progress=50
+    ),
+    "abort": ProgressStatus(status=WebSocketStatus.ABORT, message=FileStatusMessage.UNIQUE_FILE),
+    "success": ProgressStatus(
+        status=WebSocketStatus.SUCCESS,
+        message=WebSocketStatusMessage.SUCCESS_UPLOAD,
+        file_name="3_d3332a94548a9945.jpg",
+        progress=100,
+    ),
+}
+
+
+def per_call(func: Callable[[], Any], number: int) -> float:
+    """Returns the best time of one call, µs."""
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def frame_of(name: str) -> Callable[[], str] | None:
+    """Returns the way the manager gets the frame of the message without encoding it, if there is one."""
+    frames = WebSocketManager.frames
+    lookups: dict[str, Callable[[], str]] = {
+        "ready": lambda: frames.ready(256 * 1024),
+        "uploading": lambda: frames.uploading[50],
+        "abort": lambda: frames.message(WebSocketStatus.ABORT, FileStatusMessage.UNIQUE_FILE),
+    }
+    return lookups.get(name)
+
+
+def bench_encode(number: int) -> dict:
+    """Returns the time to build and encode every message, µs."""
+    results = {}
+
+    for name, message in MESSAGES.items():
+
+        def build() -> ProgressStatus:
+            return ProgressStatus(**message)  # type: ignore[typeddict-item]
+
+        entry = {"json": per_call(lambda: json_codec.encode_std(build()), number)}
+        if orjson is not None:
+            entry["orjson"] = per_call(lambda: json_codec.encode_orjson(build()), number)
+        if (lookup := frame_of(name)) is not None:
+            entry["frame"] = per_call(lookup, number)
+
+        results[name] = entry
+
+    return results
+
+
+def bench_decode(number: int) -> dict:
+    """Returns the time to parse and validate an upload action, µs."""
+    text = json.dumps(
+        {
+            "action": "upload",
+            "file_idx": 3,
+            "file_name": "IMG_0001.HEIC",
+            "user_id": str(uuid4()),
+            "session_id": str(uuid4()),
+            "file_size": 4_718_592,
+        }
+    )
+    return {
+        "json_loads_model": per_call(lambda: UploadData(**json.loads(text)), number),
+        "model_validate_json": per_call(lambda: UploadData.model_validate_json(text), number),
+    }
+
+
+async def measure_async(func: Callable[[], Coroutine[Any, Any, None]], number: int) -> float:
+    """Returns the mean time of one awaited call, µs."""
+    start = time.perf_counter()
+    for _ in range(number):
+        await func()
+    return (time.perf_counter() - start) / number * 1e6
+
+
+async def bench_websocket(number: int) -> dict:
+    """Returns the time of one progress message sent through a connected Starlette WebSocket, µs."""
+
+    async def receive() -> dict:
+        return {"type": "websocket.connect"}
+
+    async def send(message: MutableMapping[str, Any]) -> None:
+        pass
+
+    ws = WebSocket({"type": "websocket", "path": "/image/upload", "headers": []}, receive, send)
+    await ws.accept()
+    manager = WebSocketManager(ws)
+
+    try:
+        return {
+            "send_json": await measure_async(lambda: ws.send_json(ProgressStatus(**MESSAGES["uploading"])), number),
+            "send_frame": await measure_async(lambda: manager.send_frame(manager.frames.uploading[50]), number),
+        }
+    finally:
+        manager.stop_timeout()
+
+
+def report(results: dict) -> None:
+    print(f"{'encode (µs)':<14}{'json':>8}{'orjson':>8}{'frame':>8}")
+    for name, entry in results["encode_us"].items():
+        columns = "".join(
+            f"{entry[codec]:>8.2f}" if codec in entry else f"{'-':>8}" for codec in ("json", "orjson", "frame")
+        )
+        print(f"  {name:<12}{columns}")
+
+    print(f"{'decode (µs)':<24}")
+    for name, value in results["decode_us"].items():
+        print(f"  {name:<22}{value:>8.2f}")
+
+    print(f"{'websocket (µs)':<24}")
+    for name, value in results["websocket_us"].items():
+        print(f"  {name:<22}{value:>8.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=100_000, help="calls per measurement")
+    parser.add_argument("--output", type=Path, help="save the results as JSON")
+    args = parser.parse_args()
+
+    results = {
+        "codec": json_codec.name,
+        "encode_us": bench_encode(args.number),
+        "decode_us": bench_decode(args.number // 10),
+        "websocket_us": asyncio.run(bench_websocket(args.number)),
+    }
+    report(results)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark: cold start of the service (scale from zero).
+
+- import time of the application module (`main`) in a fresh interpreter
+- time from the start of a server process to the first accepted WebSocket
+- time of the first upload on that connection (image codecs loaded by the
+  warm-up in the background or, with `--no-warmup`, by the first upload)
+
+Every run starts a new server process with `BASE_DIR` and `LOG_PATH` pointed
+at a temporary directory. The medians are compared with the thresholds and
+the benchmark exits with status 1 if one is exceeded, to catch regressions.
+
+Usage (from the project root):
+    PYTHONPATH=src python -m tests.benchmarks.bench_startup --repeat 5 --output startup.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from statistics import median
+from uuid import uuid4
+
+from websockets.asyncio.client import connect
+
+from .bench_upload import upload_file
+from .corpus import generate_corpus
+
+IMPORT_SCRIPT = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+
+def measure_import(env: dict) -> float:
+    """Returns the import time of the application module in a fresh interpreter, seconds."""
+    result = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], env=env, capture_output=True, text=True, check=True)
+    return float(result.stdout)
+
+
+async def measure_server(env: dict, file_path: Path) -> tuple[float, float]:
+    """Starts a server, returns the time to the first accepted WebSocket and the time of the first upload."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    url = f"ws://127.0.0.1:{port}/image/upload"
+    command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, env=env)
+    try:
+        while True:
+            try:
+                ws = await connect(url, max_size=None, open_timeout=None)
+                break
+            except OSError:
+                await asyncio.sleep(0.005)
+
+        first_websocket = time.perf_counter() - start
+
+        start = time.perf_counter()
+        status = await upload_file(ws, file_path, file_path.read_bytes(), str(uuid4()), 64 * 1024)
+        first_upload = time.perf_counter() - start
+        await ws.close()
+
+        if status != "success":
+            raise RuntimeError(f"The first upload failed: {status}")
+    finally:
+        process.terminate()
+        process.wait()
+
+    return first_websocket, first_upload
+
+
+def run(file_path: Path, args: argparse.Namespace) -> dict:
+    samples: dict[str, list[float]] = {"import_ms": [], "first_websocket_ms": [], "first_upload_ms": []}
+
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory(prefix="file-receiver-bench-") as base_dir:
+            env = {
+                **os.environ,
+                "BASE_DIR": base_dir,
+                "LOG_PATH": str(Path(base_dir) / "logs"),
+                "CPU_WARMUP": str(not args.no_warmup).lower(),
+            }
+            samples["import_ms"].append(measure_import(env) * 1000)
+
+            first_websocket, first_upload = asyncio.run(measure_server(env, file_path))
+            samples["first_websocket_ms"].append(first_websocket * 1000)
+            samples["first_upload_ms"].append(first_upload * 1000)
+
+    return {name: {"median": median(values), "max": max(values)} for name, values in samples.items()}
+
+
+def check_thresholds(results: dict, args: argparse.Namespace) -> list[str]:
+    """Returns the measurements whose median exceeds its threshold."""
+    thresholds = {
+        "import_ms": args.max_import_ms,
+        "first_websocket_ms": args.max_first_websocket_ms,
+        "first_upload_ms": args.max_first_upload_ms,
+    }
+    return [
+        f"{name}: {results[name]['median']:.0f} > {threshold:.0f}"
+        for name, threshold in thresholds.items()
+        if threshold and results[name]["median"] > threshold
+    ]
+
+
+def report(results: dict) -> None:
+    print(f"{'':<22}{'median ms':>11}{'max ms':>10}")
+    for name, values in results.items():
+        print(f"{name:<22}{values['median']:>11.0f}{values['max']:>10.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="server starts")
+    parser.add_argument("--format", default="heic", help="format of the first uploaded image")
+    parser.add_argument("--size", type=float, default=2.0, help="size of the first uploaded image, MB")
+    parser.add_argument("--no-warmup", action="store_true", help="disable the CPU executor warm-up")
+    parser.add_argument("--max-import-ms", type=float, default=500, help="0 - not checked")
+    parser.add_argument("--max-first-websocket-ms", type=float, default=2000, help="0 - not checked")
+    parser.add_argument("--max-first-upload-ms", type=float, default=0, help="0 - not checked")
+    parser.add_argument("--corpus", type=Path, default=Path(tempfile.gettempdir()) / "file-receiver-corpus")
+    parser.add_argument("--output", type=Path, help="save the results as JSON")
+    args = parser.parse_args()
+
+    file_path = generate_corpus(args.corpus, [args.format], [int(args.size * 1024**2)])[0]
+    results = run(file_path, args)
+    report(results)
+
+    if args.output:
+        args.output.write_text(json.dumps({"arguments": vars(args), "results": results}, indent=2, default=str))
+
+    if exceeded := check_thresholds(results, args):
+        sys.exit(f"Startup time regression: {', '.join(exceeded)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: inactivity timeouts of idle WebSocket connections.
+
+Compares the previous approach (one asyncio task per connection waking up
+every `DELAY` seconds) with the shared `TimeoutScheduler`. For every
+connection count it reports the memory allocated for the timers and the
+CPU time the event loop spends on them over an idle window.
+
+Usage (from the project root):
+    PYTHONPATH=src python -m tests.benchmarks.bench_timeouts --connections 1000 10000 50000
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+from core.config.websocket import websocket_settings
+from services.timeout import TimeoutScheduler
+
+
+class IdleConnection:
+
+    __slots__ = ("last_activity_time", "task")
+
+    def __init__(self) -> None:
+        self.last_activity_time = time.time()
+        self.task: asyncio.Task | None = None
+
+    async def disconnect_by_timeout(self) -> None:
+        """Idle connections are never expected to time out during the benchmark."""
+
+
+async def legacy_timeout(connection: IdleConnection) -> None:
+    """The previous per-connection timeout loop (`WebSocketManager._set_timeout`)."""
+    while True:
+        await asyncio.sleep(websocket_settings.DELAY)
+        if round(time.time() - connection.last_activity_time) >= websocket_settings.TIMEOUT:
+            await connection.disconnect_by_timeout()
+            break
+
+
+async def run_legacy(connections: list[IdleConnection], window: float) -> tuple[int, float]:
+    tracemalloc.start()
+    for connection in connections:
+        connection.task = asyncio.create_task(legacy_timeout(connection))
+    await asyncio.sleep(0)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    cpu_time = await idle_cpu_time(window)
+
+    for connection in connections:
+        if connection.task:
+            connection.task.cancel()
+    await asyncio.sleep(0)
+
+    return memory, cpu_time
+
+
+async def run_scheduler(connections: list[IdleConnection], window: float) -> tuple[int, float]:
+    scheduler = TimeoutScheduler()
+
+    tracemalloc.start()
+    for connection in connections:
+        scheduler.register(connection)
+    await asyncio.sleep(0)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    cpu_time = await idle_cpu_time(window)
+    scheduler.shutdown()
+
+    return memory, cpu_time
+
+
+async def idle_cpu_time(window: float) -> float:
+    """Returns the CPU time consumed by the process while the loop is otherwise idle."""
+    cpu_before = time.process_time()
+    await asyncio.sleep(window)
+    return time.process_time() - cpu_before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", nargs="+", type=int, default=[1000, 10000, 50000])
+    parser.add_argument("--delay", type=float, default=0.5, help="timer resolution, seconds (DELAY)")
+    parser.add_argument("--window", type=float, default=5.0, help="measured idle window, seconds")
+    parser.add_argument("--output", type=Path, help="save the results as JSON")
+    args = parser.parse_args()
+
+    # Idle connections must stay open during the window
+    websocket_settings.DELAY = args.delay  # type: ignore[assignment]
+    websocket_settings.TIMEOUT = 3600
+
+    results = []
+    print(f"{'connections':>12}{'method':>12}{'memory MB':>12}{'loop cpu %':>12}")
+
+    for total in args.connections:
+        for method, runner in (("tasks", run_legacy), ("scheduler", run_scheduler)):
+            gc.collect()
+            memory, cpu_time = asyncio.run(runner([IdleConnection() for _ in range(total)], args.window))
+            load = cpu_time / args.window * 100
+            results.append({"connections": total, "method": method, "memory_bytes": memory, "loop_cpu_percent": load})
+            print(f"{total:>12}{method:>12}{memory / 1024**2:>12.2f}{load:>12.2f}")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmark: end-to-end uploads through the /image/upload WebSocket.
+
+Starts the application with uvicorn in this process, with `BASE_DIR` and
+`LOG_PATH` pointed at a temporary directory. Concurrent clients speak the
+real protocol (action JSON, binary chunks, `EOF`) from a separate process,
+so the event-loop lag measured here is the lag of the server alone. Every
+upload goes to a new session, so corpus images are never rejected as
+duplicates and the session file limit is not reached.
+
+Reports uploads/s, MB/s, p50/p95/p99 time from the action to the success
+status and the event-loop lag for every number of clients.
+
+Usage (from the project root):
+    PYTHONPATH=src python -m tests.benchmarks.bench_upload --clients 1 8 32 --uploads 20 --output upload.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from statistics import quantiles
+from uuid import uuid4
+
+import uvicorn
+from fastapi import FastAPI
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import ConnectionClosed
+
+from .corpus import generate_corpus
+
+TERMINAL_STATUSES = ("success", "abort", "error", "timeout")
+
+
+async def send_chunks(ws: ClientConnection, data: bytes, chunk_size: int) -> None:
+    for offset in range(0, len(data), chunk_size):
+        end = offset + chunk_size
+        await ws.send(data[offset:end])
+    await ws.send(b"EOF")
+
+
+async def upload_file(ws: ClientConnection, file_path: Path, data: bytes, user_id: str, chunk_size: int) -> str:
+    """Uploads the file over the connection (retrying while the server is busy), returns its final status."""
+    action = {
+        "action": "upload",
+        "file_idx": 0,
+        "file_name": file_path.name,
+        "user_id": user_id,
+        "session_id": str(uuid4()),
+    }
+    while True:
+        await ws.send(json.dumps(action))
+        message = json.loads(await ws.recv())
+        if message["status"] != "busy":
+            break
+        await asyncio.sleep(message["retry_after"] / 1000)
+
+    status: str = message["status"]
+    if status != "ready":
+        return status
+
+    sender = asyncio.create_task(send_chunks(ws, data, chunk_size))
+    try:
+        while status not in TERMINAL_STATUSES:
+            status = json.loads(await ws.recv())["status"]
+    finally:
+        sender.cancel()
+
+    return status
+
+
+async def run_client(url: str, files: list[tuple[Path, bytes]], uploads: int, chunk_size: int) -> list[tuple]:
+    """Uploads the files one by one, reconnects after a failed upload."""
+    results = []
+    user_id = str(uuid4())
+    ws = await connect(url, max_size=None)
+
+    for number in range(uploads):
+        file_path, data = files[number % len(files)]
+        start = time.perf_counter()
+
+        try:
+            status = await upload_file(ws, file_path, data, user_id, chunk_size)
+        except ConnectionClosed:
+            status = "closed"
+
+        results.append((status, time.perf_counter() - start, len(data)))
+
+        if status != "success":
+            await ws.close()
+            ws = await connect(url, max_size=None)
+
+    await ws.close()
+    return results
+
+
+def run_clients(url: str, paths: list[Path], clients: int, uploads: int, chunk_size: int) -> tuple[list[tuple], float]:
+    """Runs the clients concurrently (in the client process), returns the results and the wall time."""
+    files = [(path, path.read_bytes()) for path in paths]
+
+    async def run() -> list[list[tuple]]:
+        # Every client starts from another file of the corpus
+        shifts = (client % len(files) for client in range(clients))
+        return await asyncio.gather(
+            *(run_client(url, files[shift:] + files[:shift], uploads, chunk_size) for shift in shifts)
+        )
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    return [result for client_results in results for result in client_results], time.perf_counter() - start
+
+
+async def monitor_loop_lag(samples: list[float], interval: float = 0.01) -> None:
+    """Records how late the event loop wakes up after a sleep."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - start - interval)
+
+
+def percentiles(samples: list[float]) -> dict:
+    """Returns p50/p95/p99 of the samples in milliseconds."""
+    if len(samples) < 2:
+        samples = samples * 2 or [0.0, 0.0]
+
+    cuts = quantiles(samples, n=100, method="inclusive")
+    return {"p50_ms": cuts[49] * 1000, "p95_ms": cuts[94] * 1000, "p99_ms": cuts[98] * 1000}
+
+
+async def run_load(app: FastAPI, paths: list[Path], args: argparse.Namespace) -> list[dict]:
+    """Serves the application and runs a load round for every number of clients."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    url = f"ws://127.0.0.1:{port}/image/upload"
+    loop = asyncio.get_running_loop()
+    rounds = []
+
+    with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+        for clients in args.clients:
+            lag: list[float] = []
+            monitor = asyncio.create_task(monitor_loop_lag(lag))
+            results, wall_time = await loop.run_in_executor(
+                pool, run_clients, url, paths, clients, args.uploads, args.chunk_size
+            )
+            monitor.cancel()
+
+            succeeded = [(elapsed, size) for status, elapsed, size in results if status == "success"]
+            rounds.append(
+                {
+                    "clients": clients,
+                    "uploads": len(succeeded),
+                    "failures": dict(Counter(status for status, _, _ in results if status != "success")),
+                    "uploads_per_second": len(succeeded) / wall_time,
+                    "mb_per_second": sum(size for _, size in succeeded) / 1024**2 / wall_time,
+                    "time_to_success": percentiles([elapsed for elapsed, _ in succeeded]),
+                    "loop_lag": {**percentiles(lag), "max_ms": max(lag, default=0.0) * 1000},
+                }
+            )
+
+    server.should_exit = True
+    await serving
+    return rounds
+
+
+def report(rounds: list[dict]) -> None:
+    print(
+        f"{'clients':>8}{'uploads':>9}{'failed':>8}{'uploads/s':>11}{'MB/s':>9}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'lag p99 ms':>12}{'lag max ms':>12}"
+    )
+    for result in rounds:
+        latency, lag = result["time_to_success"], result["loop_lag"]
+        print(
+            f"{result['clients']:>8}{result['uploads']:>9}{sum(result['failures'].values()):>8}"
+            f"{result['uploads_per_second']:>11.1f}{result['mb_per_second']:>9.1f}"
+            f"{latency['p50_ms']:>9.1f}{latency['p95_ms']:>9.1f}{latency['p99_ms']:>9.1f}"
+            f"{lag['p99_ms']:>12.1f}{lag['max_ms']:>12.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--uploads", type=int, default=20, help="uploads per client")
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    parser.add_argument("--formats", nargs="+", default=["jpeg", "png", "webp", "heic"])
+    parser.add_argument("--sizes", nargs="+", type=float, default=[0.5, 2.0, 4.5], help="file sizes, MB")
+    parser.add_argument("--corpus", type=Path, default=Path(tempfile.gettempdir()) / "file-receiver-corpus")
+    parser.add_argument("--output", type=Path, help="save the results as JSON")
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.corpus, args.formats, [int(size * 1024**2) for size in args.sizes])
+
+    with tempfile.TemporaryDirectory(prefix="file-receiver-bench-") as base_dir:
+        # The settings are read on import, so the application is imported after the environment is set
+        os.environ["BASE_DIR"] = base_dir
+        os.environ["LOG_PATH"] = str(Path(base_dir) / "logs")
+        from main import app
+
+        rounds = asyncio.run(run_load(app, paths, args))
+
+    report(rounds)
+
+    if args.output:
+        args.output.write_text(json.dumps({"arguments": vars(args), "rounds": rounds}, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Microbenchmarks: the validation steps of an upload.
+
+- `validate_header`: format check of the first chunk, per call
+- `DimensionSniffer`: reading the image dimensions from 64 KB chunks, per file
+- `validate_unique`: near-duplicate search in a cached session manifest, per session size
+- `inspect_image`: the reduced-scale decode and dhash, in this process
+- `validate_image`: the same through the CPU executor (queueing and IPC included)
+
+Usage (from the project root):
+    PYTHONPATH=src python -m tests.benchmarks.bench_validators --output validators.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+import timeit
+from contextlib import suppress
+from pathlib import Path
+from statistics import median
+
+from services.executor import cpu_executor
+from services.manifest import session_manifests
+from validators import ImageFileValidator
+
+from .corpus import generate_corpus
+
+validator = ImageFileValidator()
+
+
+def bench_validate_header(paths: list[Path], number: int) -> dict:
+    """Returns the time of one header check per format (and for an invalid header), ns."""
+    headers = {path.name.split("_", 1)[0]: path.read_bytes()[:12] for path in paths}
+    headers["invalid"] = b"\x00" * 12
+    results = {}
+
+    for fmt, header in headers.items():
+
+        def check(data: bytes = header) -> None:
+            with suppress(ValueError):
+                validator.validate_header(data)
+
+        results[fmt] = min(timeit.repeat(check, number=number, repeat=5)) / number * 1e9
+
+    return results
+
+
+def bench_sniffer(paths: list[Path], number: int, chunk_size: int = 64 * 1024) -> dict:
+    """Returns the time to read the dimensions per file, µs."""
+    results = {}
+
+    for path in paths:
+        with path.open("rb") as stream:
+            chunks = list(iter(lambda: stream.read(chunk_size), b""))
+        fmt = validator.validate_header(chunks[0][:12])
+
+        def sniff() -> None:
+            sniffer = validator.create_sniffer(fmt)
+            for chunk in chunks:
+                if sniffer is None or sniffer.feed(chunk):
+                    break
+
+        results[path.name] = min(timeit.repeat(sniff, number=number, repeat=5)) / number * 1e6
+
+    return results
+
+
+async def bench_validate_unique(session_sizes: list[int], number: int) -> dict:
+    """Returns the time of one uniqueness check per number of stored files, µs."""
+    results = {}
+    rng = random.Random(0)
+
+    for size in session_sizes:
+        with tempfile.TemporaryDirectory() as file_dir:
+            for file_idx in range(size):
+                (Path(file_dir) / f"{file_idx}_{rng.getrandbits(64):016x}.jpg").touch()
+
+            file_hash = f"{rng.getrandbits(64):016x}"
+            await session_manifests.get(Path(file_dir))  # builds the cached manifest
+
+            start = time.perf_counter()
+            for _ in range(number):
+                with suppress(ValueError):
+                    validator.validate_unique(await session_manifests.get(Path(file_dir)), size, file_hash)
+            results[size] = (time.perf_counter() - start) / number * 1e6
+
+    return results
+
+
+async def bench_image_paths(paths: list[Path], repeat: int) -> dict:
+    """Returns the median time of the decode and hash per file, in this process and through the executor, ms."""
+    results: dict = {}
+
+    for path in paths:
+        in_process, executor = [], []
+        await validator.validate_image(path)  # starts the executor workers
+
+        for _ in range(repeat):
+            start = time.perf_counter()
+            validator.inspect_image(path)
+            in_process.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await validator.validate_image(path)
+            executor.append(time.perf_counter() - start)
+
+        results[path.name] = {
+            "inspect_image_ms": median(in_process) * 1000,
+            "validate_image_ms": median(executor) * 1000,
+        }
+
+    return results
+
+
+async def run(paths: list[Path], args: argparse.Namespace) -> dict:
+    try:
+        return {
+            "validate_header_ns": bench_validate_header(paths, args.number),
+            "sniffer_us": bench_sniffer(paths, args.number // 100),
+            "validate_unique_us": await bench_validate_unique(args.session_sizes, args.number // 100),
+            "image": await bench_image_paths(paths, args.repeat),
+        }
+    finally:
+        await cpu_executor.shutdown()
+
+
+def report(results: dict) -> None:
+    print(f"{'validate_header':<24}{'ns':>10}")
+    for fmt, value in results["validate_header_ns"].items():
+        print(f"  {fmt:<22}{value:>10.0f}")
+
+    print(f"{'sniffer (file)':<24}{'µs':>10}")
+    for name, value in results["sniffer_us"].items():
+        print(f"  {name:<22}{value:>10.1f}")
+
+    print(f"{'validate_unique (files)':<24}{'µs':>10}")
+    for size, value in results["validate_unique_us"].items():
+        print(f"  {size:<22}{value:>10.1f}")
+
+    print(f"{'file':<24}{'inspect ms':>12}{'executor ms':>13}")
+    for name, entry in results["image"].items():
+        print(f"  {name:<22}{entry['inspect_image_ms']:>12.1f}{entry['validate_image_ms']:>13.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--formats", nargs="+", default=["jpeg", "png", "webp", "heic"])
+    parser.add_argument("--sizes", nargs="+", type=float, default=[0.5, 4.5], help="file sizes, MB")
+    parser.add_argument("--session-sizes", nargs="+", type=int, default=[10, 100, 1000])
+    parser.add_argument("--number", type=int, default=100_000, help="header checks per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="decodes per file")
+    parser.add_argument("--corpus", type=Path, default=Path(tempfile.gettempdir()) / "file-receiver-corpus")
+    parser.add_argument("--output", type=Path, help="save the results as JSON")
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.corpus, args.formats, [int(size * 1024**2) for size in args.sizes])
+    results = asyncio.run(run(paths, args))
+    report(results)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: write throughput of received upload chunks.
+
+Compares the previous write path (one thread-pool write call per received
+chunk, as `aiofiles` did) with `BufferedFileWriter`, which writes large
+aligned blocks. For every chunk size it reports the throughput of writing
+a file of `--file-size` MB to `--dir` (use a directory on the target
+filesystem, e.g. the EFS mount).
+
+Usage (from the project root):
+    PYTHONPATH=src python -m tests.benchmarks.bench_write --chunk-sizes 4096 65536 1048576 --dir /mnt/efs/tmp
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Coroutine
+
+from services.writer import BufferedFileWriter
+
+
+async def write_legacy(path: Path, chunks: list[bytes]) -> None:
+    """The previous write path: every chunk is written by a separate thread-pool call."""
+    output_file = await asyncio.to_thread(open, path, "wb")
+    try:
+        for chunk in chunks:
+            await asyncio.to_thread(output_file.write, chunk)
+    finally:
+        await asyncio.to_thread(output_file.close)
+
+
+async def write_buffered(path: Path, chunks: list[bytes]) -> None:
+    async with BufferedFileWriter(path, size=sum(map(len, chunks))) as output_file:
+        for chunk in chunks:
+            await output_file.write(chunk)
+
+
+def measure(
+    writer: Callable[[Path, list[bytes]], Coroutine[Any, Any, None]], path: Path, chunks: list[bytes], repeat: int
+) -> float:
+    """Returns the best throughput of the writer, MB/s."""
+    best = 0.0
+    size = sum(map(len, chunks)) / 1024**2
+
+    for _ in range(repeat):
+        path.unlink(missing_ok=True)
+        start = time.perf_counter()
+        asyncio.run(writer(path, chunks))
+        fd = os.open(path, os.O_RDONLY)
+        os.fsync(fd)
+        os.close(fd)
+        best = max(best, size / (time.perf_counter() - start))
+
+    path.unlink(missing_ok=True)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-sizes", nargs="+", type=int, default=[4096, 65536, 1048576])
+    parser.add_argument("--file-size", type=int, default=64, help="written file size, MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dir", type=Path, default=Path(tempfile.gettempdir()))
+    parser.add_argument("--output", type=Path, help="save the results as JSON")
+    args = parser.parse_args()
+
+    path = args.dir / f"bench_write_{os.getpid()}"
+    results = []
+    print(f"{'chunk size':>12}{'method':>12}{'MB/s':>12}")
+
+    for chunk_size in args.chunk_sizes:
+        chunks = [os.urandom(chunk_size)] * (args.file_size * 1024**2 // chunk_size)
+
+        for method, writer in (("per-chunk", write_legacy), ("buffered", write_buffered)):
+            throughput = measure(writer, path, chunks, args.repeat)
+            results.append({"chunk_size": chunk_size, "method": method, "mb_per_second": throughput})
+            print(f"{chunk_size:>12}{method:>12}{throughput:>12.1f}")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Synthetic image corpus for the benchmarks.
+
+Images are a smooth gradient with per-pixel noise, which compresses
+roughly like a camera photo, scaled until the encoded file is close to
+the requested size.
+"""
+
+import io
+from math import sqrt
+from pathlib import Path
+
+from PIL import Image
+from pillow_heif import register_heif_opener  # type: ignore
+
+register_heif_opener()
+
+FORMATS = {
+    "jpeg": ("JPEG", ".jpg", {"quality": 92}),
+    "png": ("PNG", ".png", {}),
+    "webp": ("WEBP", ".webp", {"quality": 90}),
+    "heic": ("HEIF", ".heic", {"quality": 90}),
+}
+
+
+def render_photo(width: int, height: int, seed: int) -> Image.Image:
+    """Renders a photo-like RGB image."""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 48 + seed % 5 * 8)
+    red = Image.blend(gradient, noise, 0.3)
+    green = Image.blend(gradient.rotate(90 + seed * 37 % 180).resize((width, height)), noise, 0.2)
+    blue = Image.blend(noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), 0.6)
+    return Image.merge("RGB", (red, green, blue))
+
+
+def encode(img: Image.Image, fmt: str) -> bytes:
+    """Encodes the image into the given corpus format."""
+    pil_format, _, options = FORMATS[fmt]
+    buffer = io.BytesIO()
+    img.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate_image(fmt: str, target_size: int, seed: int = 0) -> bytes:
+    """Generates an encoded image whose size is close to (and not above) the target size."""
+    width, height = 4032, 3024
+    data = encode(render_photo(width, height, seed), fmt)
+
+    for _ in range(4):
+        if target_size * 0.85 <= len(data) <= target_size:
+            break
+        scale = sqrt(target_size / len(data)) * 0.97
+        width, height = max(16, int(width * scale)), max(16, int(height * scale))
+        data = encode(render_photo(width, height, seed), fmt)
+
+    return data
+
+
+def generate_corpus(directory: Path, formats: list[str], sizes: list[int], count: int = 1) -> list[Path]:
+    """Writes `count` images per format and size into the directory and returns their paths."""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+
+    for fmt in formats:
+        for size in sizes:
+            for seed in range(count):
+                path = directory / f"{fmt}_{size}_{seed}{FORMATS[fmt][1]}"
+                if not path.exists():
+                    path.write_bytes(generate_image(fmt, size, seed))
+                paths.append(path)
+
+    return paths
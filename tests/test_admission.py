@@ -0,0 +1,108 @@
+from uuid import uuid4
+
+import pytest
+from pydantic import ValidationError
+
+from api.schemas import FileCandidate, UploadData
+from services.admission import AdmissionController
+from services.executor import cpu_executor
+from validators.base import BaseFileValidator
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def controller(monkeypatch: pytest.MonkeyPatch) -> AdmissionController:
+    monkeypatch.setattr(AdmissionController.settings, "MAX_ACTIVE_UPLOADS", 2)
+    monkeypatch.setattr(AdmissionController.settings, "MAX_INFLIGHT_BYTES", 100)
+    monkeypatch.setattr(AdmissionController.settings, "MAX_PENDING_CPU_JOBS", 1)
+    monkeypatch.setattr(cpu_executor, "pending", 0)
+    monkeypatch.setattr(cpu_executor, "background", 0)
+    return AdmissionController()
+
+
+def test_admits_below_caps(controller: AdmissionController) -> None:
+    assert controller.admit(40)
+    assert controller.admit(60)
+    assert (controller.active_uploads, controller.inflight_bytes) == (2, 100)
+    assert controller.decisions["admitted", ""] == 2
+
+
+def test_rejects_at_upload_cap(controller: AdmissionController) -> None:
+    controller.admit(1)
+    controller.admit(1)
+    assert controller.check_caps(1) == "uploads"
+    assert not controller.admit(1)
+    assert controller.decisions["rejected", "uploads"] == 1
+
+
+def test_rejects_over_byte_budget(controller: AdmissionController) -> None:
+    controller.admit(80)
+    assert controller.check_caps(21) == "bytes"
+    assert controller.check_caps(20) is None
+
+
+def test_admits_single_upload_over_byte_budget(controller: AdmissionController) -> None:
+    assert controller.admit(1000)
+
+
+def test_rejects_at_cpu_cap(controller: AdmissionController, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(cpu_executor, "pending", 1)
+    assert controller.check_caps(1) == "cpu"
+
+
+def test_background_jobs_are_not_counted(controller: AdmissionController, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(cpu_executor, "pending", 1)
+    monkeypatch.setattr(cpu_executor, "background", 1)
+    assert controller.check_caps(1) is None
+
+
+def test_release_frees_the_reservation(controller: AdmissionController) -> None:
+    controller.admit(80)
+    controller.admit(20)
+    controller.release(80)
+    assert (controller.active_uploads, controller.inflight_bytes) == (1, 20)
+    assert controller.check_caps(80) is None
+
+
+def test_rejects_negative_size(controller: AdmissionController) -> None:
+    assert not controller.admit(-50)
+    assert controller.decisions["rejected", "size"] == 1
+    assert (controller.active_uploads, controller.inflight_bytes) == (0, 0)
+
+
+def test_rejects_while_draining(controller: AdmissionController) -> None:
+    controller.draining = True
+    assert controller.check_caps(1) == "draining"
+
+
+def test_unlimited_caps(controller: AdmissionController, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(AdmissionController.settings, "MAX_ACTIVE_UPLOADS", 0)
+    monkeypatch.setattr(AdmissionController.settings, "MAX_INFLIGHT_BYTES", 0)
+    for _ in range(10):
+        assert controller.admit(1000)
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_active_uploads(controller: AdmissionController) -> None:
+    controller.admit(1)
+    assert not await controller.drain(0.01)
+    controller.release(1)
+    assert await controller.drain(0.01)
+
+
+@pytest.mark.parametrize("schema", [UploadData, FileCandidate])
+def test_negative_declared_size_is_invalid(schema: type[UploadData] | type[FileCandidate]) -> None:
+    data = {"action": "upload", "file_idx": 0, "file_name": "a.jpg", "user_id": uuid4(), "session_id": uuid4()}
+    data.update(sha256="0" * 64, file_size=0)
+    schema.model_validate(data)
+
+    with pytest.raises(ValidationError):
+        schema.model_validate({**data, "file_size": -1})
+
+
+def test_declared_size_is_enforced() -> None:
+    validator = BaseFileValidator()
+    validator.check_size_limits(10, 10)
+    with pytest.raises(ValueError):
+        validator.check_size_limits(11, 10)
@@ -0,0 +1,76 @@
+from typing import AsyncIterator
+
+import pytest
+import pytest_asyncio
+
+from api.schemas import FileCandidate, UploadData
+from enums import FileStatusMessage
+from managers import ImageFileManager
+from services.manifest import SessionManifest
+from services.timeout import timeout_scheduler
+
+pytestmark = pytest.mark.unit
+
+STORED = "0_00000000000000ff.jpg"
+
+
+@pytest_asyncio.fixture(loop_scope="function")
+async def manager(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[ImageFileManager]:
+    monkeypatch.setattr(ImageFileManager.validator, "max_files", 3)
+    yield ImageFileManager(None)  # type: ignore[arg-type]
+    timeout_scheduler.shutdown()
+
+
+def candidate(file_idx: int, sha256: str, file_hash: str | None = None) -> FileCandidate:
+    return FileCandidate(file_idx=file_idx, file_size=10, sha256=sha256 * 64, file_hash=file_hash)
+
+
+def check(manager: ImageFileManager, manifest: SessionManifest, *candidates: FileCandidate) -> list[str]:
+    """Checks the candidates as one batch, returns the stored file name or the message of each."""
+    manager.files = list(candidates)
+    return [result.get("file_name") or result["message"] for result in manager.check_files(manifest)]
+
+
+@pytest.mark.asyncio
+async def test_stored_content_is_found_by_digest(manager: ImageFileManager) -> None:
+    manifest = SessionManifest({STORED: 10}, {STORED: "a" * 64})
+
+    assert check(manager, manifest, candidate(5, "a"), candidate(6, "b")) == [STORED, "Ready to upload"]
+    assert manifest.file_count == 1  # the stored manifest is not changed by the batch
+
+
+@pytest.mark.asyncio
+async def test_duplicates_in_batch_are_rejected(manager: ImageFileManager) -> None:
+    statuses = check(
+        manager,
+        SessionManifest(),
+        candidate(1, "a", "0000000000000f00"),
+        candidate(2, "a"),
+        candidate(3, "b", "0000000000000f01"),
+    )
+    assert statuses == ["Ready to upload", FileStatusMessage.UNIQUE_FILE, FileStatusMessage.UNIQUE_FILE]
+
+
+@pytest.mark.asyncio
+async def test_ready_files_count_toward_the_limit(manager: ImageFileManager) -> None:
+    statuses = check(manager, SessionManifest({STORED: 10}), candidate(1, "a"), candidate(2, "b"), candidate(3, "c"))
+    assert statuses == ["Ready to upload", "Ready to upload", FileStatusMessage.UPLOAD_LIMIT_EXCEEDED]
+
+
+@pytest.mark.asyncio
+async def test_replaced_files_do_not_count_toward_the_limit(manager: ImageFileManager) -> None:
+    manifest = SessionManifest({STORED: 10, "1_": 10, "2_": 10})
+    statuses = check(manager, manifest, candidate(0, "a"), candidate(2, "b"), candidate(3, "c"))
+    assert statuses == ["Ready to upload", "Ready to upload", FileStatusMessage.UPLOAD_LIMIT_EXCEEDED]
+
+
+def test_check_needs_no_file() -> None:
+    data = UploadData.model_validate_json(
+        '{"action": "check", "user_id": "%s", "session_id": "%s"}' % ("0" * 32, "0" * 32)
+    )
+    assert data.files == []
+
+    with pytest.raises(ValueError):
+        UploadData.model_validate_json(
+            '{"action": "upload", "user_id": "%s", "session_id": "%s"}' % ("0" * 32, "0" * 32)
+        )
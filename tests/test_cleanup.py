@@ -0,0 +1,126 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from time import time
+
+import pytest
+
+from services.cleanup import SessionCollector
+from services.locks import SessionLock
+from services.writer import BufferedFileWriter
+from tests.test_locks import HOLD_LOCK
+
+pytestmark = pytest.mark.unit
+
+HOUR = 3600
+
+
+@pytest.fixture
+def session_dir(tmp_path: Path) -> Path:
+    path = tmp_path / "user" / "session"
+    (path / SessionCollector.settings.PARTIAL_DIR).mkdir(parents=True)
+    (path / "original").mkdir()
+    return path
+
+
+def partial_file(session_dir: Path, name: str, age: float, data: bytes = b"data") -> Path:
+    path = session_dir / SessionCollector.settings.PARTIAL_DIR / name
+    path.write_bytes(data)
+    os.utime(path, (time() - age, time() - age))
+    return path
+
+
+def age_tree(path: Path, age: float) -> None:
+    for directory, _, _ in os.walk(path):
+        os.utime(directory, (time() - age, time() - age))
+
+
+def test_finds_expired_files(session_dir: Path) -> None:
+    old = partial_file(session_dir, "0_old.jpg", 2 * HOUR)
+    partial_file(session_dir, "1_new.jpg", 0)
+
+    assert SessionCollector.find_expired(old.parent, time() - HOUR) == [old]
+    assert SessionCollector.find_expired(session_dir / "missing", time() - HOUR) == []
+
+
+def test_claimed_file_is_not_deleted(session_dir: Path) -> None:
+    old = partial_file(session_dir, "0_old.jpg", 2 * HOUR)
+    expired = time() - HOUR
+    paths = SessionCollector.find_expired(old.parent, expired)
+
+    # An upload claims the file between the scan and the delete
+    assert BufferedFileWriter.claim(old, HOUR) == 0
+    assert SessionCollector.delete_expired(paths, expired) == (0, 0)
+    assert old.exists()
+
+
+def test_claim_returns_resume_offset(session_dir: Path) -> None:
+    path = partial_file(session_dir, "0_a.jpg", 60, b"x" * 100)
+
+    assert BufferedFileWriter.claim(path, HOUR) == 100
+    assert BufferedFileWriter.claim(path, 0) == 0
+    assert BufferedFileWriter.claim(path.with_name("missing"), HOUR) == 0
+    assert time() - path.stat().st_mtime < 60
+
+
+@pytest.mark.asyncio
+async def test_deletes_expired_partial_files_under_session_lock(session_dir: Path) -> None:
+    collector = SessionCollector(session_dir.parent.parent)
+    old = partial_file(session_dir, "0_old.jpg", 2 * HOUR)
+    new = partial_file(session_dir, "1_new.jpg", 0)
+
+    await collector.delete_partial_files(session_dir, time() - HOUR)
+
+    assert not old.exists() and new.exists()
+    assert (collector.deleted_files, collector.reclaimed_bytes) == (1, 4)
+    assert (session_dir / SessionLock.file_name).exists()
+
+
+@pytest.mark.asyncio
+async def test_collect_prunes_empty_sessions(session_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(SessionCollector.settings, "RESUME_TTL", HOUR)
+    monkeypatch.setattr(SessionCollector.settings, "GC_INTERVAL", 60)
+    base_dir = session_dir.parent.parent
+    collector = SessionCollector(base_dir)
+    partial_file(session_dir, "0_old.jpg", 2 * HOUR)
+    age_tree(session_dir.parent, 2 * HOUR)
+
+    await collector.collect()
+    assert session_dir.exists()  # the delete has just modified the partial directory
+
+    age_tree(session_dir.parent, 2 * HOUR)
+    await collector.collect()
+    assert not session_dir.parent.exists()
+    assert collector.deleted_files == 1
+
+
+@pytest.mark.asyncio
+async def test_session_locked_by_another_worker_is_not_pruned(
+    session_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(SessionCollector.settings, "SESSION_LOCK_TIMEOUT", 0.2)
+    lock_path = session_dir / SessionLock.file_name
+    lock_path.touch()
+    age_tree(session_dir.parent, 2 * HOUR)
+
+    with subprocess.Popen([sys.executable, "-c", HOLD_LOCK, str(lock_path), "5"], stdout=subprocess.PIPE) as worker:
+        try:
+            assert worker.stdout is not None and worker.stdout.readline() == b"locked\n"
+            with pytest.raises(ValueError):
+                await SessionCollector(session_dir.parent.parent).sweep_session(session_dir, time() - HOUR)
+        finally:
+            worker.kill()
+
+    assert lock_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_collect_keeps_sessions_with_files(session_dir: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(SessionCollector.settings, "RESUME_TTL", HOUR)
+    monkeypatch.setattr(SessionCollector.settings, "GC_INTERVAL", 60)
+    (session_dir / "original" / "0_a.jpg").write_bytes(b"data")
+    age_tree(session_dir.parent, 2 * HOUR)
+
+    await SessionCollector(session_dir.parent.parent).collect()
+    assert (session_dir / "original" / "0_a.jpg").exists()
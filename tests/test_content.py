@@ -0,0 +1,125 @@
+import hashlib
+import os
+import time
+from contextlib import suppress
+from pathlib import Path
+
+import pytest
+
+from services.content import ContentStore
+
+pytestmark = pytest.mark.unit
+
+DATA = b"content" * 100
+DIGEST = hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ContentStore:
+    monkeypatch.setattr(ContentStore.settings, "CONTENT_STORE", True)
+    return ContentStore(tmp_path)
+
+
+def upload(directory: Path, name: str, data: bytes = DATA) -> Path:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f".{name}.partial"
+    path.write_bytes(data)
+    return path
+
+
+@pytest.mark.asyncio
+async def test_first_upload_becomes_the_blob(store: ContentStore, tmp_path: Path) -> None:
+    dst = tmp_path / "session" / "a.jpg"
+
+    assert not await store.store(upload(dst.parent, "a"), DIGEST, dst)
+    assert dst.read_bytes() == DATA
+    assert os.path.samefile(dst, store.blob_path(DIGEST))
+    assert dst.stat().st_nlink == 2
+
+
+@pytest.mark.asyncio
+async def test_links_count_the_references(store: ContentStore, tmp_path: Path) -> None:
+    first, second = tmp_path / "one" / "a.jpg", tmp_path / "two" / "b.jpg"
+    await store.store(upload(first.parent, "a"), DIGEST, first)
+
+    assert await store.store(upload(second.parent, "b"), DIGEST, second)
+    assert not list(second.parent.glob(".*"))  # the uploaded copy and the temporary link are gone
+    assert store.blob_path(DIGEST).stat().st_nlink == 3
+
+    assert await store.unlink(first)
+    assert store.blob_path(DIGEST).stat().st_nlink == 2
+
+    assert await store.unlink(second)
+    assert not store.blob_path(DIGEST).exists()
+
+
+@pytest.mark.asyncio
+async def test_unlink_missing_file(store: ContentStore, tmp_path: Path) -> None:
+    assert not await store.unlink(tmp_path / "missing.jpg")
+
+
+@pytest.mark.asyncio
+async def test_digest_is_recorded_at_link_time(store: ContentStore, tmp_path: Path) -> None:
+    dst = tmp_path / "session" / "a.jpg"
+    await store.store(upload(dst.parent, "a"), DIGEST, dst)
+
+    try:
+        recorded = os.getxattr(dst, store.digest_attribute)
+    except OSError:
+        pytest.skip("no extended attributes on the test filesystem")
+
+    assert recorded == DIGEST.encode()
+    assert ContentStore.read_digest(dst) == DIGEST
+
+
+@pytest.mark.asyncio
+async def test_unlink_hashes_files_stored_without_digest(store: ContentStore, tmp_path: Path) -> None:
+    dst = tmp_path / "session" / "a.jpg"
+    await store.store(upload(dst.parent, "a"), DIGEST, dst)
+    with suppress(OSError):
+        os.removexattr(dst, store.digest_attribute)
+
+    assert ContentStore.read_digest(dst) == DIGEST
+    assert await store.unlink(dst)
+    assert not store.blob_path(DIGEST).exists()
+
+
+@pytest.mark.asyncio
+async def test_blob_replaced_by_other_content_is_kept(store: ContentStore, tmp_path: Path) -> None:
+    dst = tmp_path / "session" / "a.jpg"
+    await store.store(upload(dst.parent, "a"), DIGEST, dst)
+    blob = store.blob_path(DIGEST)
+    os.unlink(blob)
+    os.link(upload(tmp_path / "other", "b", b"other"), blob)
+    os.link(dst, tmp_path / "session" / "b.jpg")  # two references to the file, not to the current blob
+
+    assert await store.unlink(dst)
+    assert blob.exists()
+
+
+@pytest.mark.asyncio
+async def test_digest_is_recorded_without_content_store(
+    store: ContentStore, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(ContentStore.settings, "CONTENT_STORE", False)
+    dst = tmp_path / "session" / "a.jpg"
+
+    assert not await store.store(upload(dst.parent, "a"), DIGEST, dst)
+    assert dst.read_bytes() == DATA
+    assert dst.stat().st_nlink == 1
+    assert not store.blob_dir.exists()
+    assert ContentStore.recorded_digest(dst) in (DIGEST, None)  # None without extended attributes
+
+
+@pytest.mark.asyncio
+async def test_delete_orphans(store: ContentStore, tmp_path: Path) -> None:
+    dst = tmp_path / "session" / "a.jpg"
+    await store.store(upload(dst.parent, "a"), DIGEST, dst)
+    orphan = store.blob_path("ff" * 32)
+    orphan.parent.mkdir(parents=True)
+    orphan.write_bytes(b"orphan")
+
+    assert ContentStore.delete_orphans(orphan.parent, time.time() - 60) == (0, 0)  # too recent
+    assert ContentStore.delete_orphans(orphan.parent, time.time() + 60) == (1, 6)
+    assert ContentStore.delete_orphans(store.blob_path(DIGEST).parent, time.time() + 60) == (0, 0)
+    assert store.blob_path(DIGEST).exists()
@@ -0,0 +1,135 @@
+import io
+from struct import pack
+
+import pytest
+from PIL import Image
+
+from validators.dimensions import DimensionSniffer
+from validators.image import ImageFileValidator
+
+pytestmark = pytest.mark.unit
+
+SCAN_LIMIT = 256 * 1024
+
+
+def encode(file_format: str, size: tuple[int, int] = (123, 45), mode: str = "RGB", **params: object) -> bytes:
+    buffer = io.BytesIO()
+    Image.new(mode, size, "red").save(buffer, file_format, **params)
+    return buffer.getvalue()
+
+
+def box(box_type: bytes, payload: bytes) -> bytes:
+    return pack(">I4s", len(payload) + 8, box_type) + payload
+
+
+def heif(*extents: tuple[int, int]) -> bytes:
+    ipco = b"".join(box(b"ispe", pack(">III", 0, *extent)) for extent in extents)
+    meta = pack(">I", 0) + box(b"hdlr", bytes(25)) + box(b"iprp", box(b"ipco", box(b"pixi", bytes(7)) + ipco))
+    return box(b"ftyp", b"heic\0\0\0\0mif1heic") + box(b"meta", meta)
+
+
+def sniff(data: bytes, file_format: str, chunk_size: int = 1) -> tuple[bool, tuple[int, int] | None]:
+    """Feeds the data in chunks, returns if the sniffer is done and the dimensions read."""
+    sniffer = DimensionSniffer.for_format(file_format, SCAN_LIMIT)
+    assert sniffer is not None
+
+    view = memoryview(data)
+    while view:
+        chunk, view = view[:chunk_size], view[chunk_size:]
+        if sniffer.feed(bytes(chunk)):
+            return True, sniffer.dimensions
+    return False, sniffer.dimensions
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+@pytest.mark.parametrize(
+    ("file_format", "data"),
+    [
+        pytest.param("jpeg", encode("JPEG"), id="jpeg"),
+        pytest.param("jpeg", encode("JPEG", progressive=True, exif=b"Exif\0\0" + bytes(5000)), id="jpeg-exif"),
+        pytest.param("png", encode("PNG"), id="png"),
+        pytest.param("webp", encode("WEBP"), id="webp-vp8"),
+        pytest.param("webp", encode("WEBP", lossless=True), id="webp-vp8l"),
+        pytest.param("webp", encode("WEBP", mode="RGBA"), id="webp-vp8x"),
+    ],
+)
+def test_reads_dimensions(file_format: str, data: bytes, chunk_size: int) -> None:
+    assert sniff(data, file_format, chunk_size) == (True, (123, 45))
+
+
+def test_reads_largest_heif_extents() -> None:
+    assert sniff(heif((64, 48), (4000, 3000)), "heic") == (True, (4000, 3000))
+
+
+def test_heif_without_extents() -> None:
+    assert sniff(heif(), "heic") == (True, None)
+
+
+@pytest.mark.parametrize("file_format", ["jpeg", "png", "webp"])
+def test_truncated_header_waits_for_more_data(file_format: str) -> None:
+    data = encode(file_format.upper())
+    assert sniff(data[:20], file_format) == (False, None)
+
+
+def test_jpeg_without_start_of_image() -> None:
+    assert sniff(b"\xff\xd9" + bytes(100), "jpeg") == (True, None)
+
+
+def test_jpeg_scan_before_frame_header() -> None:
+    assert sniff(b"\xff\xd8\xff\xda" + bytes(100), "jpeg") == (True, None)
+
+
+def test_jpeg_not_at_marker() -> None:
+    assert sniff(b"\xff\xd8\x00\x00" + bytes(100), "jpeg") == (True, None)
+
+
+def test_jpeg_fill_bytes_and_standalone_markers() -> None:
+    data = b"\xff\xd8\xff\xff\xff\xd0\xff\xc0\x00\x11\x08" + pack(">HH", 30, 40) + bytes(20)
+    assert sniff(data, "jpeg") == (True, (40, 30))
+
+
+def test_jpeg_huge_frame_is_read_for_the_megapixel_check() -> None:
+    data = b"\xff\xd8\xff\xc2\x00\x11\x08\xff\xff\xff\xff" + bytes(20)
+    done, dimensions = sniff(data, "jpeg")
+    assert (done, dimensions) == (True, (0xFFFF, 0xFFFF))
+
+    with pytest.raises(ValueError):
+        ImageFileValidator.check_dimensions(dimensions)
+
+
+def test_jpeg_segments_past_scan_limit_stop_sniffing() -> None:
+    segment = b"\xff\xe1\xff\xff" + bytes(0xFFFD)
+    data = b"\xff\xd8" + segment * (SCAN_LIMIT // len(segment) + 2)
+    assert sniff(data, "jpeg", chunk_size=4096) == (True, None)
+
+
+def test_skipped_segments_are_not_buffered() -> None:
+    sniffer = DimensionSniffer.for_format("jpeg", SCAN_LIMIT)
+    assert sniffer is not None
+
+    assert not sniffer.feed(b"\xff\xd8\xff\xe1\xff\xff" + bytes(60000))
+    assert len(sniffer._buffer) - sniffer._start < 100
+
+
+def test_png_without_ihdr() -> None:
+    data = encode("PNG")
+    assert sniff(data[:12] + b"IEND" + data[16:], "png") == (True, None)
+
+
+def test_webp_unknown_chunk() -> None:
+    data = encode("WEBP")
+    assert sniff(data[:12] + b"ALPH" + data[16:], "webp") == (True, None)
+
+
+def test_heif_box_larger_than_read_limit() -> None:
+    meta = pack(">I", 0) + box(b"iprp", box(b"ipco", pack(">I4s", 8 + 1_000_000, b"ispe")))
+    assert sniff(box(b"meta", meta), "heic", chunk_size=4096) == (True, None)
+
+
+def test_heif_truncated_box_header() -> None:
+    assert sniff(box(b"ftyp", b"heic")[:6], "heic") == (False, None)
+
+
+def test_unsupported_format() -> None:
+    assert DimensionSniffer.for_format("gif", SCAN_LIMIT) is None
+    assert DimensionSniffer.for_format(None, SCAN_LIMIT) is None
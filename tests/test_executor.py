@@ -0,0 +1,75 @@
+import asyncio
+import time
+from typing import Iterator
+
+import pytest
+
+from enums import ExecutorType
+from services.executor import CPUExecutor
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def executor(monkeypatch: pytest.MonkeyPatch) -> Iterator[CPUExecutor]:
+    monkeypatch.setattr(CPUExecutor.settings, "CPU_EXECUTOR", ExecutorType.THREAD)
+    monkeypatch.setattr(CPUExecutor.settings, "CPU_WORKERS", 1)
+    monkeypatch.setattr(CPUExecutor.settings, "CPU_QUEUE_SIZE", 0)
+    monkeypatch.setattr(CPUExecutor.settings, "CPU_JOB_TIMEOUT", 1)
+    executor = CPUExecutor()
+    yield executor
+    executor.executor.shutdown(wait=True)
+
+
+async def wait_idle(executor: CPUExecutor) -> None:
+    for _ in range(100):
+        if not executor.pending:
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_runs_job(executor: CPUExecutor) -> None:
+    assert await executor.run(sum, [1, 2, 3]) == 6
+    await wait_idle(executor)
+    assert executor.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_timed_out_job_keeps_its_slot(executor: CPUExecutor, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(CPUExecutor.settings, "CPU_JOB_TIMEOUT", 0.05)
+
+    with pytest.raises(ValueError):
+        await executor.run(time.sleep, 0.3)
+
+    # The job still runs in the pool, the next one waits for it
+    assert executor.pending == 1
+    with pytest.raises(ValueError):
+        await executor.run(sum, [1])
+
+    await asyncio.sleep(0.3)
+    await wait_idle(executor)
+    assert executor.pending == 0
+    assert await executor.run(sum, [1]) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_job_frees_its_slot(executor: CPUExecutor) -> None:
+    with pytest.raises(ZeroDivisionError):
+        await executor.run(divmod, 1, 0)
+
+    await wait_idle(executor)
+    assert executor.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_background_job_is_counted_apart(executor: CPUExecutor, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(CPUExecutor.settings, "CPU_JOB_TIMEOUT", 0.05)
+
+    with pytest.raises(ValueError):
+        await executor.run(time.sleep, 0.2, background=True)
+    assert (executor.pending, executor.background) == (1, 1)
+
+    await asyncio.sleep(0.2)
+    await wait_idle(executor)
+    assert (executor.pending, executor.background) == (0, 0)
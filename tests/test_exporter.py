@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from services.exporter import MetricsExporter
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.mark.parametrize(
+    ("line", "expected"),
+    [
+        ("# TYPE upload_active gauge", "# TYPE upload_active gauge"),
+        ("upload_active 3", 'upload_active{worker="1"} 3'),
+        ('upload_total{reason="Size exceeded"} 2', 'upload_total{reason="Size exceeded",worker="1"} 2'),
+    ],
+)
+def test_add_label(line: str, expected: str) -> None:
+    assert MetricsExporter.add_label(line, 'worker="1"') == expected
+
+
+def test_samples_are_labelled_with_the_worker() -> None:
+    samples = [line for line in MetricsExporter().render().splitlines() if not line.startswith("#")]
+
+    assert samples
+    assert all(f'worker="{os.getpid()}"}} ' in sample for sample in samples)
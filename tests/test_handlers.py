@@ -0,0 +1,30 @@
+from typing import Any, MutableMapping
+
+import pytest
+from starlette.status import WS_1013_TRY_AGAIN_LATER
+from starlette.websockets import WebSocket
+
+from handlers import ImageFileHandler, MultiplexImageFileHandler
+from services.admission import admission_controller
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("handler_class", [ImageFileHandler, MultiplexImageFileHandler])
+async def test_draining_worker_closes_connections(handler_class: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(admission_controller, "draining", True)
+    received = [{"type": "websocket.connect"}]
+    sent: list[MutableMapping[str, Any]] = []
+
+    async def receive() -> dict[str, Any]:
+        return received.pop(0)
+
+    async def send(message: MutableMapping[str, Any]) -> None:
+        sent.append(message)
+
+    await handler_class(WebSocket({"type": "websocket", "path": "/", "headers": []}, receive, send)).accept()
+
+    # Accepted first, a close before the handshake would be an HTTP 403
+    assert [message["type"] for message in sent] == ["websocket.accept", "websocket.close"]
+    assert sent[1]["code"] == WS_1013_TRY_AGAIN_LATER
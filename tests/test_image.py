@@ -0,0 +1,82 @@
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from enums import FileStatusMessage
+from validators.codecs import load_codecs
+from validators.image import ImageFileValidator
+
+pytestmark = pytest.mark.unit
+
+
+def save(tmp_path: Path, file_format: str, size: tuple[int, int]) -> Path:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, file_format)
+    path = tmp_path / f"image.{file_format.lower()}"
+    path.write_bytes(buffer.getvalue())
+    return path
+
+
+@pytest.mark.parametrize("file_format", ["JPEG", "PNG"])
+def test_inspect_image_returns_hash(tmp_path: Path, file_format: str) -> None:
+    file_hash = ImageFileValidator.inspect_image(save(tmp_path, file_format, (300, 200)))
+    assert len(file_hash) == 16
+
+
+@pytest.mark.parametrize("file_format", ["JPEG", "PNG"])
+def test_dimensions_are_checked_before_decoding(
+    tmp_path: Path, file_format: str, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(ImageFileValidator, "max_megapixels", 1)
+    path = save(tmp_path, file_format, (1001, 1000))
+
+    def reduce_image(img: Image.Image) -> None:
+        raise AssertionError("the image is decoded")
+
+    monkeypatch.setattr(ImageFileValidator, "reduce_image", reduce_image)
+    with pytest.raises(ValueError, match=FileStatusMessage.IMAGE_TOO_LARGE):
+        ImageFileValidator.inspect_image(path)
+
+
+def test_dimensions_are_not_limited(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(ImageFileValidator, "max_megapixels", 0)
+    ImageFileValidator.inspect_image(save(tmp_path, "PNG", (1001, 1000)))
+
+
+class RecordedImage:
+    """Records the decoding calls made on an image."""
+
+    def __init__(self, file_format: str) -> None:
+        self.format = file_format
+        self.calls: list[str] = []
+
+    def draft(self, mode: str | None, size: tuple[int, int]) -> None:
+        self.calls.append("draft")
+
+    def load(self) -> None:
+        self.calls.append("load")
+
+    def thumbnail(self, size: tuple[int, int]) -> None:
+        self.calls.append("thumbnail")
+
+
+@pytest.mark.parametrize(
+    ("file_format", "calls"),
+    [("JPEG", ["draft", "thumbnail"]), ("HEIF", ["load", "thumbnail"]), ("PNG", ["load", "thumbnail"])],
+)
+def test_primary_image_is_decoded(file_format: str, calls: list[str]) -> None:
+    img = RecordedImage(file_format)
+    ImageFileValidator.reduce_image(img)  # type: ignore[arg-type]
+    assert img.calls == calls
+
+
+@pytest.mark.parametrize("file_format", ["JPEG", "PNG", "HEIF"])
+def test_truncated_image_is_invalid(tmp_path: Path, file_format: str) -> None:
+    load_codecs()
+    path = save(tmp_path, file_format, (300, 200))
+    path.write_bytes(path.read_bytes()[:-100])
+
+    with pytest.raises(ValueError, match=FileStatusMessage.INVALID_FILE_FORMAT):
+        ImageFileValidator.inspect_image(path)
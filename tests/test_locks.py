@@ -0,0 +1,86 @@
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+from time import monotonic
+
+import pytest
+
+from services.locks import SessionLock
+
+pytestmark = pytest.mark.unit
+
+HOLD_LOCK = """
+import fcntl, os, sys, time
+fd = os.open(sys.argv[1], os.O_RDWR | os.O_CREAT, 0o666)
+fcntl.lockf(fd, fcntl.LOCK_EX)
+print("locked", flush=True)
+time.sleep(float(sys.argv[2]))
+"""
+
+
+@pytest.mark.asyncio
+async def test_version_is_kept_across_locks(tmp_path: Path) -> None:
+    async with SessionLock(tmp_path / "session") as session:
+        assert session.version == 0
+        version = session.change()
+
+    async with SessionLock(tmp_path / "session") as session:
+        assert session.version == version
+
+    async with SessionLock(tmp_path / "session") as session:
+        pass  # unchanged
+
+    async with SessionLock(tmp_path / "session") as session:
+        assert session.version == version
+
+
+@pytest.mark.asyncio
+async def test_connections_of_a_worker_are_serialized(tmp_path: Path) -> None:
+    events: list[str] = []
+
+    async def change(name: str) -> None:
+        async with SessionLock(tmp_path):
+            events.append(f"{name} start")
+            await asyncio.sleep(0.01)
+            events.append(f"{name} end")
+
+    await asyncio.gather(change("a"), change("b"))
+    assert events == ["a start", "a end", "b start", "b end"]
+
+
+@pytest.mark.asyncio
+async def test_lock_held_by_another_worker_times_out(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(SessionLock.settings, "SESSION_LOCK_TIMEOUT", 0.2)
+    path = tmp_path / SessionLock.file_name
+
+    with subprocess.Popen([sys.executable, "-c", HOLD_LOCK, str(path), "5"], stdout=subprocess.PIPE) as worker:
+        try:
+            assert worker.stdout is not None and worker.stdout.readline() == b"locked\n"
+            with pytest.raises(ValueError):
+                async with SessionLock(tmp_path):
+                    pass
+        finally:
+            worker.kill()
+
+    async with SessionLock(tmp_path):  # released when the worker dies
+        pass
+
+
+@pytest.mark.asyncio
+async def test_waits_for_another_worker(tmp_path: Path) -> None:
+    path = tmp_path / SessionLock.file_name
+
+    with subprocess.Popen([sys.executable, "-c", HOLD_LOCK, str(path), "0.2"], stdout=subprocess.PIPE) as worker:
+        assert worker.stdout is not None and worker.stdout.readline() == b"locked\n"
+        start = monotonic()
+        async with SessionLock(tmp_path):
+            assert monotonic() - start >= 0.1
+
+
+@pytest.mark.asyncio
+async def test_creates_missing_session_dir(tmp_path: Path) -> None:
+    async with SessionLock(tmp_path / "user" / "session"):
+        pass
+
+    assert (tmp_path / "user" / "session" / SessionLock.file_name).exists()
@@ -0,0 +1,140 @@
+from pathlib import Path
+
+import pytest
+
+from services import manifest as manifest_module
+from services.content import ContentStore
+from services.manifest import SessionManifest, SessionManifestCache
+
+pytestmark = pytest.mark.unit
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(manifest_module, "monotonic", clock)
+    monkeypatch.setattr(SessionManifestCache.settings, "SESSION_MANIFEST_TTL", 60)
+    monkeypatch.setattr(SessionManifestCache.settings, "SESSION_MANIFEST_MAX_SESSIONS", 2)
+    return clock
+
+
+def files_dir(tmp_path: Path, name: str = "session") -> Path:
+    path = tmp_path / name / "original"
+    path.mkdir(parents=True)
+    return path
+
+
+def test_manifest_tracks_files_and_hashes() -> None:
+    manifest = SessionManifest({"0_00000000000000ff.jpg": 10})
+    manifest.add("1_0000000000000f00.jpg", 5)
+    manifest.add("1_0000000000000f00.jpg", 7)
+
+    assert (manifest.file_count, manifest.total_bytes) == (2, 17)
+    assert (1, 0xF00) in manifest.fingerprints
+
+    manifest.remove("0_00000000000000ff.jpg")
+    manifest.remove("missing.jpg")
+    assert (manifest.file_count, manifest.total_bytes) == (1, 7)
+    assert (0, 0xFF) not in manifest.fingerprints
+
+
+def test_manifest_tracks_file_indexes() -> None:
+    manifest = SessionManifest({"0_00000000000000ff.jpg": 10, "0_0000000000000f00.png": 5})
+    manifest.add("3_", 1)
+    manifest.add("3_", 1)
+
+    assert (manifest.file_idx_count, manifest.file_idxs) == (2, {0: 2, 3: 1})
+    manifest.remove("0_00000000000000ff.jpg")
+    manifest.remove("3_")
+    assert manifest.file_idxs == {0: 1}
+
+
+def test_manifest_tracks_digests() -> None:
+    manifest = SessionManifest({"0_00000000000000ff.jpg": 10}, {"0_00000000000000ff.jpg": "a" * 64})
+    manifest.add("1_0000000000000f00.jpg", 5, "b" * 64)
+    copy = manifest.copy()
+
+    assert manifest.find_content("b" * 64) == "1_0000000000000f00.jpg"
+    manifest.remove("0_00000000000000ff.jpg")
+    assert manifest.find_content("a" * 64) is None
+    assert copy.find_content("a" * 64) == "0_00000000000000ff.jpg"
+
+
+@pytest.mark.asyncio
+async def test_manifest_reads_recorded_digests(tmp_path: Path, clock: Clock) -> None:
+    path = files_dir(tmp_path)
+    (path / "0_00000000000000ff.jpg").write_bytes(b"data")
+    ContentStore.record_digest(path / "0_00000000000000ff.jpg", "a" * 64)
+    if ContentStore.recorded_digest(path / "0_00000000000000ff.jpg") is None:
+        pytest.skip("no extended attributes on the test filesystem")
+
+    manifest = await SessionManifestCache().get(path)
+    assert manifest.find_content("a" * 64) == "0_00000000000000ff.jpg"
+
+
+@pytest.mark.asyncio
+async def test_cached_manifest_is_reused(tmp_path: Path, clock: Clock) -> None:
+    cache = SessionManifestCache()
+    path = files_dir(tmp_path)
+    (path / "0_00000000000000ff.jpg").write_bytes(b"data")
+
+    manifest = await cache.get(path, version=1)
+    (path / "other.jpg").write_bytes(b"x")
+
+    assert manifest.files == {"0_00000000000000ff.jpg": 4}
+    assert await cache.get(path, version=1) is manifest
+
+
+@pytest.mark.asyncio
+async def test_manifest_of_another_version_is_rebuilt(tmp_path: Path, clock: Clock) -> None:
+    cache = SessionManifestCache()
+    path = files_dir(tmp_path)
+    manifest = await cache.get(path, version=1)
+    (path / "0_00000000000000ff.jpg").write_bytes(b"data")
+
+    rebuilt = await cache.get(path, version=2)
+    assert rebuilt is not manifest
+    assert (rebuilt.file_count, rebuilt.version) == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_manifest_expires(tmp_path: Path, clock: Clock) -> None:
+    cache = SessionManifestCache()
+    path = files_dir(tmp_path)
+    manifest = await cache.get(path)
+
+    clock.now += 30
+    assert await cache.get(path) is manifest  # the expiry is extended on every access
+
+    clock.now += 61
+    assert await cache.get(path) is not manifest
+
+
+@pytest.mark.asyncio
+async def test_expired_and_least_recently_used_manifests_are_evicted(tmp_path: Path, clock: Clock) -> None:
+    cache = SessionManifestCache()
+    first, second, third = (files_dir(tmp_path, name) for name in ("one", "two", "three"))
+
+    await cache.get(first)
+    await cache.get(second)
+    await cache.get(first)
+    await cache.get(third)
+    assert len(cache) == 2
+    assert list(cache._manifests) == [first, third]
+
+    clock.now += 61
+    await cache.get(second)
+    assert list(cache._manifests) == [second]
+
+
+@pytest.mark.asyncio
+async def test_missing_directory_is_empty(tmp_path: Path, clock: Clock) -> None:
+    assert (await SessionManifestCache().get(tmp_path / "missing")).file_count == 0
@@ -0,0 +1,184 @@
+import asyncio
+import json
+from asyncio import Event, Queue
+from struct import pack
+from typing import Any, AsyncIterator
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+
+from api.schemas import UploadData
+from enums import FileStatusMessage
+from managers import MultiplexFileManager
+from managers.websocket import StreamWebSocketManager
+from services.timeout import timeout_scheduler
+
+pytestmark = pytest.mark.unit
+
+
+class FakeWebSocket:
+    def __init__(self, *messages: dict[str, Any]) -> None:
+        self.received = list(messages)
+        self.sent: list[dict[str, Any]] = []
+
+    async def receive(self) -> dict[str, Any]:
+        return self.received.pop(0) if self.received else {"type": "websocket.disconnect", "code": 1000}
+
+    async def send_text(self, text: str) -> None:
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000, reason: str | None = None) -> None:
+        pass
+
+
+class FakeStream:
+    """Collects the chunks of a file until it is finished."""
+
+    opened: list["FakeStream"] = []
+
+    def __init__(self, websocket: Any, connection: Any, file_idx: int) -> None:
+        self.opened.append(self)
+        self.file_idx = file_idx
+        self.ws_manager = StreamWebSocketManager(websocket, connection, file_idx)
+        self.chunks: Queue[bytes] = Queue(2)
+        self.receiving = True
+        self.finished = Event()
+        self.disconnected = False
+
+    async def run(self, data: UploadData) -> None:
+        await self.finished.wait()
+
+    async def handle_disconnect(self) -> None:
+        self.disconnected = True
+
+
+@pytest_asyncio.fixture(loop_scope="function")
+async def manager(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[MultiplexFileManager]:
+    monkeypatch.setattr(MultiplexFileManager, "stream_class", FakeStream)
+    monkeypatch.setattr(FakeStream, "opened", [])
+    monkeypatch.setattr(MultiplexFileManager.settings, "MULTIPLEX_MAX_STREAMS", 2)
+    yield MultiplexFileManager(FakeWebSocket())  # type: ignore[arg-type]
+    timeout_scheduler.shutdown()
+
+
+def action(file_idx: int) -> str:
+    return json.dumps(
+        {
+            "action": "upload",
+            "file_idx": file_idx,
+            "file_name": "a.jpg",
+            "user_id": str(uuid4()),
+            "session_id": str(uuid4()),
+        }
+    )
+
+
+def chunk(file_idx: int, payload: bytes) -> bytes:
+    return pack(">I", file_idx) + payload
+
+
+def sent(manager: MultiplexFileManager) -> list[dict[str, Any]]:
+    return manager.ws.sent  # type: ignore[attr-defined,no-any-return]
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_routed_by_file_index(manager: MultiplexFileManager) -> None:
+    await manager.open_stream(action(1))
+    await manager.open_stream(action(70000))
+
+    await manager.dispatch_chunk(chunk(1, b"first"))
+    await manager.dispatch_chunk(chunk(70000, b"second"))
+    await manager.dispatch_chunk(chunk(1, b"EOF"))
+
+    first, second = manager.streams[1], manager.streams[70000]
+    assert [first.chunks.get_nowait() for _ in range(2)] == [b"first", b"EOF"]
+    assert second.chunks.get_nowait() == b"second"
+
+
+@pytest.mark.asyncio
+async def test_stray_chunks_are_dropped(manager: MultiplexFileManager) -> None:
+    await manager.open_stream(action(1))
+    stream = manager.streams[1]
+
+    await manager.dispatch_chunk(b"\x00\x00")  # shorter than the header
+    await manager.dispatch_chunk(chunk(2, b"unknown stream"))
+    stream.receiving = False
+    await manager.dispatch_chunk(chunk(1, b"finished stream"))
+
+    assert stream.chunks.empty()
+
+
+@pytest.mark.asyncio
+async def test_empty_payload_is_a_chunk(manager: MultiplexFileManager) -> None:
+    await manager.open_stream(action(1))
+    await manager.dispatch_chunk(chunk(1, b""))
+
+    assert manager.streams[1].chunks.get_nowait() == b""
+
+
+@pytest.mark.asyncio
+async def test_second_action_of_a_file_is_rejected(manager: MultiplexFileManager) -> None:
+    await manager.open_stream(action(1))
+    await manager.open_stream(action(1))
+
+    assert sent(manager) == [{"status": "abort", "message": FileStatusMessage.STREAM_IN_PROGRESS, "file_idx": 1}]
+
+
+@pytest.mark.asyncio
+async def test_streams_above_limit_are_rejected(manager: MultiplexFileManager) -> None:
+    for file_idx in range(3):
+        await manager.open_stream(action(file_idx))
+
+    assert list(manager.streams) == [0, 1]
+    assert sent(manager) == [{"status": "abort", "message": FileStatusMessage.TOO_MANY_STREAMS, "file_idx": 2}]
+
+
+@pytest.mark.asyncio
+async def test_invalid_action_is_aborted(manager: MultiplexFileManager) -> None:
+    await manager.open_stream('{"action": "upload"}')
+
+    assert not manager.streams
+    assert [message["status"] for message in sent(manager)] == ["abort"]
+    assert "file_idx" not in sent(manager)[0]
+
+
+@pytest.mark.asyncio
+async def test_finished_stream_is_forgotten(manager: MultiplexFileManager) -> None:
+    await manager.open_stream(action(1))
+    manager.streams[1].finished.set()  # type: ignore[attr-defined]
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    assert not manager.streams and not manager.tasks
+    await manager.open_stream(action(1))
+    assert 1 in manager.streams
+
+
+@pytest.mark.asyncio
+async def test_disconnect_interrupts_streams(manager: MultiplexFileManager) -> None:
+    manager.ws.received = [  # type: ignore[attr-defined]
+        {"type": "websocket.receive", "text": action(1)},
+        {"type": "websocket.receive", "bytes": chunk(1, b"data")},
+    ]
+    await manager.handle_action()
+
+    (stream,) = FakeStream.opened
+    assert stream.chunks.get_nowait() == b"data"
+    assert stream.disconnected
+
+
+@pytest.mark.asyncio
+async def test_stream_with_full_queue_is_aborted_alone(manager: MultiplexFileManager) -> None:
+    await manager.open_stream(action(1))
+    await manager.open_stream(action(2))
+    blocked, other = manager.streams[1], manager.streams[2]
+
+    for payload in (b"a", b"b", b"overflow"):
+        await manager.dispatch_chunk(chunk(1, payload))
+    await manager.dispatch_chunk(chunk(2, b"data"))
+
+    assert sent(manager) == [{"status": "abort", "message": FileStatusMessage.STREAM_OVERFLOW, "file_idx": 1}]
+    assert blocked.disconnected and not blocked.receiving  # type: ignore[attr-defined]
+    assert list(manager.streams) == [2]
+    assert other.chunks.get_nowait() == b"data"
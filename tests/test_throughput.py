@@ -0,0 +1,100 @@
+import pytest
+
+from services import throughput
+from services.throughput import ChunkAdvisor
+
+pytestmark = pytest.mark.unit
+
+KB = 1024
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(throughput, "perf_counter", clock)
+    monkeypatch.setattr(ChunkAdvisor.settings, "CHUNK_SIZE", 256 * KB)
+    monkeypatch.setattr(ChunkAdvisor.settings, "CHUNK_SIZE_MIN", 64 * KB)
+    monkeypatch.setattr(ChunkAdvisor.settings, "CHUNK_SIZE_MAX", 1024 * KB)
+    monkeypatch.setattr(ChunkAdvisor.settings, "CHUNK_INTERVAL", 0.1)
+    monkeypatch.setattr(ChunkAdvisor.settings, "CHUNK_SIZE_CAP", 8 * 1024 * KB)
+    return clock
+
+
+def upload(advisor: ChunkAdvisor, clock: Clock, rate: float, chunk_size: int, seconds: float, rtt: float = 0.0) -> None:
+    """Feeds the chunks sent at the rate (bytes per second) for the time after the READY message."""
+    advisor.ready()
+    clock.now += rtt
+    for _ in range(int(seconds * rate / chunk_size)):
+        advisor.observe(chunk_size)
+        clock.now += chunk_size / rate
+
+
+@pytest.mark.parametrize(
+    ("size", "expected"),
+    [(1, 64 * KB), (64 * KB + 1, 128 * KB), (256 * KB, 256 * KB), (10**9, 1024 * KB)],
+)
+def test_clamp(clock: Clock, size: int, expected: int) -> None:
+    assert ChunkAdvisor.clamp(size) == expected
+
+
+def test_initial_suggestion(clock: Clock) -> None:
+    assert ChunkAdvisor().chunk_size == 256 * KB
+
+
+def test_fast_connection_gets_larger_chunks(clock: Clock) -> None:
+    advisor = ChunkAdvisor()
+    upload(advisor, clock, rate=50 * 1024 * KB, chunk_size=256 * KB, seconds=2)
+
+    assert advisor.throughput == pytest.approx(50 * 1024 * KB, rel=0.01)
+    assert advisor.chunk_size == 1024 * KB
+
+
+def test_slow_connection_gets_smaller_chunks(clock: Clock) -> None:
+    advisor = ChunkAdvisor()
+    upload(advisor, clock, rate=500 * KB, chunk_size=16 * KB, seconds=2)
+
+    assert advisor.chunk_size == 64 * KB
+
+
+def test_round_trip_raises_suggestion(clock: Clock) -> None:
+    advisor = ChunkAdvisor()
+    upload(advisor, clock, rate=2 * 1024 * KB, chunk_size=64 * KB, seconds=2, rtt=0.3)
+
+    assert advisor.rtt == pytest.approx(0.3)
+    assert advisor.chunk_size == ChunkAdvisor.clamp(advisor.throughput * 0.3)
+
+
+def test_small_file_is_a_sample_on_next_ready(clock: Clock) -> None:
+    advisor = ChunkAdvisor()
+    upload(advisor, clock, rate=50 * 1024 * KB, chunk_size=256 * KB, seconds=0.1)
+    assert advisor.throughput == 0
+
+    advisor.ready()
+    assert advisor.throughput > 0
+    assert advisor.chunk_size == 1024 * KB
+
+
+def test_small_chunks_are_accepted(clock: Clock) -> None:
+    advisor = ChunkAdvisor()
+    advisor.ready()
+    for _ in range(10):
+        advisor.observe(100)
+
+
+def test_chunks_above_cap_are_rejected(clock: Clock) -> None:
+    advisor = ChunkAdvisor()
+    with pytest.raises(ValueError):
+        advisor.observe(8 * 1024 * KB + 1)
+
+
+def test_cap_disabled(clock: Clock, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(ChunkAdvisor.settings, "CHUNK_SIZE_CAP", 0)
+    ChunkAdvisor().observe(64 * 1024 * KB)
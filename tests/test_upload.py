@@ -0,0 +1,91 @@
+import io
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+import pytest
+import pytest_asyncio
+from PIL import Image
+
+from enums import FileStatusMessage
+from managers import ImageFileManager
+from services.throughput import ChunkAdvisor
+from services.timeout import timeout_scheduler
+
+pytestmark = pytest.mark.unit
+
+
+def jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+JPEG = jpeg()
+JPEG_SIZE = len(JPEG)
+
+
+class FakeWebSocket:
+    def __init__(self, *chunks: bytes) -> None:
+        self.chunks = [*chunks, b"EOF"]
+
+    async def receive_bytes(self) -> bytes:
+        return self.chunks.pop(0)
+
+
+class FakeWebSocketManager:
+    def __init__(self) -> None:
+        self.sent: list[dict[str, Any]] = []
+        self.chunk_advisor = ChunkAdvisor()
+
+    async def send_abort(self, message: str) -> None:
+        self.sent.append({"status": "abort", "message": message})
+
+    async def send_progress(self, current_size: int, max_size: int) -> None:
+        self.sent.append({"status": "uploading", "progress": round(current_size / max_size * 100)})
+
+
+@pytest_asyncio.fixture(loop_scope="function")
+async def manager(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[ImageFileManager]:
+    monkeypatch.setattr(ImageFileManager.content_store, "blob_dir", tmp_path / "blobs")
+    manager = ImageFileManager(None, FakeWebSocketManager())  # type: ignore[arg-type]
+    manager.file_dir = tmp_path / "user" / "session" / "original"
+    manager.file_path = manager.partial_dir / "0_a.jpg"
+    manager.file_path.parent.mkdir(parents=True)
+    manager.file_path.write_bytes(b"data")
+    yield manager
+    timeout_scheduler.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_rejected_upload_is_deleted(manager: ImageFileManager) -> None:
+    with pytest.raises(ValueError):
+        async with manager.discard_rejected():
+            raise ValueError(FileStatusMessage.INVALID_FILE_FORMAT)
+
+    assert not manager.file_path.exists()
+    assert not manager.partial_dir.exists()
+    assert manager.session_dir.exists()  # with its lock file, removed by the storage sweeps
+
+
+@pytest.mark.asyncio
+async def test_abort_keeps_the_file(manager: ImageFileManager) -> None:
+    await manager.abort(ValueError(FileStatusMessage.SESSION_LOCKED))
+
+    sent = manager.ws_manager.sent  # type: ignore[attr-defined]
+    assert sent == [{"status": "abort", "message": FileStatusMessage.SESSION_LOCKED}]
+    assert manager.file_path.exists()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(("file_size", "progress"), [(None, [0, 0]), (JPEG_SIZE, [50, 100])])
+async def test_progress_is_relative_to_the_declared_size(
+    manager: ImageFileManager, file_size: int | None, progress: list[int]
+) -> None:
+    half = JPEG_SIZE // 2
+    manager.ws = FakeWebSocket(JPEG[:half], JPEG[half:])  # type: ignore[assignment]
+    manager.file_size = file_size
+
+    assert await manager.save_file()
+
+    sent = manager.ws_manager.sent  # type: ignore[attr-defined]
+    assert [message["progress"] for message in sent] == progress
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from api.schemas import ProgressStatus
+from enums import FileStatusMessage, WebSocketStatus
+from managers.websocket import StatusFrames, StreamWebSocketManager
+from services.codec import json_codec
+
+pytestmark = pytest.mark.unit
+
+
+def test_frames_match_the_encoded_messages() -> None:
+    frames = StatusFrames(json_codec)
+
+    assert json.loads(frames.uploading[42]) == {"status": "uploading", "message": "Uploading...", "progress": 42}
+    assert json.loads(frames.ready(1024)) == {
+        "status": "ready",
+        "message": "Ready to upload",
+        "progress": 0,
+        "offset": 0,
+        "chunk_size": 1024,
+    }
+    assert frames.message(WebSocketStatus.ABORT, FileStatusMessage.FILE_SIZE_EXCEEDED) == json_codec.encode(
+        ProgressStatus(status=WebSocketStatus.ABORT, message=FileStatusMessage.FILE_SIZE_EXCEEDED)
+    )
+
+
+def test_tagged_frames_have_the_file_index() -> None:
+    frames = StreamWebSocketManager.tagged_frames(7)
+
+    assert json.loads(frames.uploading[100])["file_idx"] == 7
+    assert json.loads(frames.ready(1024))["file_idx"] == 7
+    assert json.loads(frames.message(WebSocketStatus.ERROR, "Error"))["file_idx"] == 7
+    assert StreamWebSocketManager.tagged_frames(7) is frames
+
+
+def test_tagged_messages_are_escaped() -> None:
+    reason = 'Invalid "name"}, {"file_idx": 0'
+    frame = StreamWebSocketManager.tagged_frames(3).message(WebSocketStatus.ABORT, reason)
+
+    assert json.loads(frame) == {"status": "abort", "message": reason, "file_idx": 3}
+
+
+def test_tag_takes_precedence() -> None:
+    frames = StatusFrames(json_codec, ProgressStatus(file_idx=1))
+    assert json.loads(frames.encode(ProgressStatus(status="busy", file_idx=2)))["file_idx"] == 1
@@ -0,0 +1,100 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+from services.writer import BufferedFileWriter
+
+pytestmark = pytest.mark.unit
+
+DATA = bytes(range(256)) * 40
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(BufferedFileWriter.settings, "WRITE_BUFFER_SIZE", 1024)
+    monkeypatch.setattr(BufferedFileWriter.settings, "WRITE_ALIGNMENT", 256)
+    monkeypatch.setattr(BufferedFileWriter.settings, "PREALLOCATE", False)
+
+
+async def write(writer: BufferedFileWriter, data: bytes, chunk_size: int = 300) -> None:
+    for start in range(0, len(data), chunk_size):
+        await writer.write(data[start:][:chunk_size])
+
+
+@pytest.mark.asyncio
+async def test_writes_aligned_blocks(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+
+    async with BufferedFileWriter(path) as writer:
+        await write(writer, DATA[:1500])
+        assert writer.offset % 256 == 0
+        assert writer.position == 1500
+
+    assert path.read_bytes() == DATA[:1500]
+
+
+@pytest.mark.asyncio
+async def test_resumes_from_offset(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    async with BufferedFileWriter(path) as writer:
+        await write(writer, DATA[:1000])
+
+    offset = BufferedFileWriter.written_size(path, path.stat().st_size)
+    digest = hashlib.sha256()
+    async with BufferedFileWriter(path, offset, digest=digest) as writer:
+        await write(writer, DATA[offset:])
+
+    assert offset == 1000
+    assert path.read_bytes() == DATA
+    assert digest.digest() == hashlib.sha256(DATA).digest()
+
+
+@pytest.mark.asyncio
+async def test_new_upload_truncates_the_file(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    path.write_bytes(DATA)
+
+    async with BufferedFileWriter(path) as writer:
+        await write(writer, DATA[:10])
+
+    assert path.read_bytes() == DATA[:10]
+
+
+@pytest.mark.asyncio
+async def test_preallocated_file_is_truncated_on_close(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(BufferedFileWriter.settings, "PREALLOCATE", True)
+    path = tmp_path / "file"
+
+    async with BufferedFileWriter(path, size=len(DATA) * 2) as writer:
+        await write(writer, DATA)
+
+    assert path.read_bytes() == DATA
+    assert BufferedFileWriter.written_size(path, len(DATA)) == len(DATA)
+
+
+@pytest.mark.asyncio
+async def test_resumes_preallocated_file_left_open(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(BufferedFileWriter.settings, "PREALLOCATE", True)
+    path = tmp_path / "file"
+
+    writer = BufferedFileWriter(path, size=len(DATA))
+    await writer.open()
+    if not writer._preallocated:
+        pytest.skip("no fallocate or extended attributes on the test filesystem")
+
+    # The worker dies with the file preallocated: its size is the declared size, not the written one
+    await write(writer, DATA[:2000])
+    assert writer._fd is not None
+    os.close(writer._fd)
+    size = path.stat().st_size
+    offset = BufferedFileWriter.written_size(path, size)
+    assert (size, offset) == (len(DATA), writer.offset)
+
+    async with BufferedFileWriter(path, offset, len(DATA)) as writer:
+        assert path.stat().st_size == offset
+        await write(writer, DATA[offset:])
+
+    assert path.read_bytes() == DATA
+    assert BufferedFileWriter.written_size(path, len(DATA)) == len(DATA)